@@ -45,3 +45,149 @@ def plugin_settings(settings):
         # SCORM packages are extracted into the default storage
         # e.g. /scorm_packages/09c1735eaa57d78fe245868f0e07cf7b/index_lms.html
         settings.STORAGE_SCORM_PATH = "scorm_packages"
+    # Seconds browsers and CDNs can cache the files of SCORM packages. Since
+    # packages are addressed by their md5 their files never change.
+    settings.SCORM_ASSETS_MAX_AGE = getattr(
+        settings, "SCORM_ASSETS_MAX_AGE", 60 * 60 * 24 * 365
+    )
+    # How SCORM package files are delivered: "proxy" streams them through
+    # Django, "x-accel-redirect" and "x-sendfile" let the web server send
+    # them from a filesystem storage, "reverse-proxy" lets nginx proxy them
+    # from an object storage. A dotted path to a custom backend can be used too.
+    settings.SCORM_DELIVERY_BACKEND = getattr(
+        settings, "SCORM_DELIVERY_BACKEND", "proxy"
+    )
+    # Prefix of the nginx internal location used by the X-Accel-Redirect backends
+    settings.SCORM_DELIVERY_INTERNAL_URL = getattr(
+        settings, "SCORM_DELIVERY_INTERNAL_URL", "/scorm-internal/"
+    )
+    # Save gzip (and brotli, if the `brotli` package is installed) variants of
+    # the text files of SCORM packages bigger than SCORM_PRECOMPRESS_MIN_SIZE
+    # bytes at extraction, and serve them to the browsers supporting them
+    settings.SCORM_PRECOMPRESS = getattr(settings, "SCORM_PRECOMPRESS", False)
+    settings.SCORM_PRECOMPRESS_MIN_SIZE = getattr(
+        settings, "SCORM_PRECOMPRESS_MIN_SIZE", 1024
+    )
+    # "extract" extracts the files of SCORM packages to the default storage,
+    # "blobs" extracts them to a content addressed blob store, saving files
+    # shared by several packages once, "zip" stores the package zip only, and
+    # serves its files from a copy cached on the local disk of each node
+    settings.SCORM_STORAGE_MODE = getattr(settings, "SCORM_STORAGE_MODE", "extract")
+    # Directory and size in bytes of the local cache of package zips
+    settings.SCORM_ZIP_CACHE_DIR = getattr(settings, "SCORM_ZIP_CACHE_DIR", None)
+    settings.SCORM_ZIP_CACHE_MAX_SIZE = getattr(
+        settings, "SCORM_ZIP_CACHE_MAX_SIZE", 2 * 1024 * 1024 * 1024
+    )
+    # Directory and size in bytes of the local disk cache of the files of
+    # SCORM packages. The cache is disabled if its size is 0. Files bigger
+    # than SCORM_ASSET_CACHE_MAX_FILE_SIZE bytes are never cached.
+    settings.SCORM_ASSET_CACHE_DIR = getattr(settings, "SCORM_ASSET_CACHE_DIR", None)
+    settings.SCORM_ASSET_CACHE_MAX_SIZE = getattr(
+        settings, "SCORM_ASSET_CACHE_MAX_SIZE", 0
+    )
+    settings.SCORM_ASSET_CACHE_MAX_FILE_SIZE = getattr(
+        settings, "SCORM_ASSET_CACHE_MAX_FILE_SIZE", 50 * 1024 * 1024
+    )
+    # When True the CSS and JS of the XBlock are referenced by content hashed
+    # URLs instead of being inlined in each block fragment
+    settings.SCORM_STATIC_URLS = getattr(settings, "SCORM_STATIC_URLS", False)
+    # Number of package file indexes kept in each process memory
+    settings.SCORM_INDEX_LRU_SIZE = getattr(settings, "SCORM_INDEX_LRU_SIZE", 128)
+    # Number of parsed package manifests kept in each process memory
+    settings.SCORM_MANIFEST_LRU_SIZE = getattr(settings, "SCORM_MANIFEST_LRU_SIZE", 256)
+    # Lifetime in seconds of package file indexes and parsed manifests in the
+    # Django cache
+    settings.SCORM_INDEX_TIMEOUT = getattr(
+        settings, "SCORM_INDEX_TIMEOUT", 60 * 60 * 24 * 7
+    )
+    # Number of "package extracted" markers kept in each process memory
+    settings.SCORM_EXTRACTED_MARKER_LRU_SIZE = getattr(
+        settings, "SCORM_EXTRACTED_MARKER_LRU_SIZE", 1024
+    )
+    # Lifetime in seconds of the same markers in each process memory
+    settings.SCORM_EXTRACTED_MARKER_LRU_TIMEOUT = getattr(
+        settings, "SCORM_EXTRACTED_MARKER_LRU_TIMEOUT", 60
+    )
+    # Lifetime in seconds of the "package extracted" markers stored in the
+    # Django cache. `None` means the markers never expire.
+    settings.SCORM_EXTRACTED_MARKER_TIMEOUT = getattr(
+        settings, "SCORM_EXTRACTED_MARKER_TIMEOUT", 60 * 60 * 24 * 7
+    )
+    # SCORM packages are downloaded from the contentstore before extraction:
+    # packages bigger than this size in bytes are spooled to a temporary file
+    # instead of being kept in memory.
+    settings.SCORM_EXTRACTION_SPOOL_MAX_SIZE = getattr(
+        settings, "SCORM_EXTRACTION_SPOOL_MAX_SIZE", 10 * 1024 * 1024
+    )
+    # Directory of the temporary files. `None` uses the system default.
+    settings.SCORM_EXTRACTION_SPOOL_DIR = getattr(
+        settings, "SCORM_EXTRACTION_SPOOL_DIR", None
+    )
+    # Number of threads uploading the extracted files to the default storage
+    settings.SCORM_EXTRACTION_WORKERS = getattr(settings, "SCORM_EXTRACTION_WORKERS", 8)
+    # Number of times the upload of a single file is retried, and base
+    # delay in seconds between attempts
+    settings.SCORM_EXTRACTION_RETRIES = getattr(settings, "SCORM_EXTRACTION_RETRIES", 3)
+    settings.SCORM_EXTRACTION_RETRY_DELAY = getattr(
+        settings, "SCORM_EXTRACTION_RETRY_DELAY", 0.5
+    )
+    # Extract SCORM packages saved in Studio with a Celery task instead of
+    # blocking the request
+    settings.SCORM_ASYNC_EXTRACTION = getattr(settings, "SCORM_ASYNC_EXTRACTION", False)
+    # Lifetime in seconds of the background extraction status in the Django cache
+    settings.SCORM_EXTRACTION_STATUS_TIMEOUT = getattr(
+        settings, "SCORM_EXTRACTION_STATUS_TIMEOUT", 60 * 60
+    )
+    # A single process at a time extracts a given package. The extraction lock
+    # expires after this timeout in seconds, in case its holder dies.
+    settings.SCORM_EXTRACTION_LOCK_TIMEOUT = getattr(
+        settings, "SCORM_EXTRACTION_LOCK_TIMEOUT", 15 * 60
+    )
+    # Seconds Studio saves wait for a package extracted by someone else before
+    # asking to retry later, and polling interval
+    settings.SCORM_EXTRACTION_LOCK_WAIT = getattr(
+        settings, "SCORM_EXTRACTION_LOCK_WAIT", 5
+    )
+    settings.SCORM_EXTRACTION_LOCK_POLL_INTERVAL = getattr(
+        settings, "SCORM_EXTRACTION_LOCK_POLL_INTERVAL", 0.5
+    )
+    # Milliseconds the SCORM API buffers CMI values set by the content before
+    # sending them to the LMS, unless the content commits them first
+    settings.SCORM_COMMIT_INTERVAL = getattr(settings, "SCORM_COMMIT_INTERVAL", 5000)
+    # When grades are published: "immediate" publishes them as soon as the
+    # content sets a status, "commit" only when the content commits its data
+    # or terminates the session
+    settings.SCORM_GRADE_PUBLISH_MODE = getattr(
+        settings, "SCORM_GRADE_PUBLISH_MODE", "immediate"
+    )
+    # CMI values longer than this number of characters are stored compressed
+    settings.SCORM_CMI_COMPRESSION_THRESHOLD = getattr(
+        settings, "SCORM_CMI_COMPRESSION_THRESHOLD", 1024
+    )
+    # CMI values longer than this number of characters are rejected
+    settings.SCORM_CMI_MAX_VALUE_LENGTH = getattr(
+        settings, "SCORM_CMI_MAX_VALUE_LENGTH", 64000
+    )
+    # Maximum number of interactions stored for each learner
+    settings.SCORM_CMI_MAX_INTERACTIONS = getattr(
+        settings, "SCORM_CMI_MAX_INTERACTIONS", 250
+    )
+    # Maximum number of user states exported by the LMS handler, which
+    # buffers the whole export: bigger exports use `scorm_export`
+    settings.SCORM_EXPORT_HANDLER_MAX_ROWS = getattr(
+        settings, "SCORM_EXPORT_HANDLER_MAX_ROWS", 5000
+    )
+    # Exporter of the XBlock metrics: "noop", "prometheus", "statsd", "test"
+    # or the dotted path of a custom exporter class
+    settings.SCORM_METRICS_EXPORTER = getattr(
+        settings, "SCORM_METRICS_EXPORTER", "noop"
+    )
+    # Address of the statsd server of the "statsd" exporter
+    settings.SCORM_METRICS_STATSD_HOST = getattr(
+        settings, "SCORM_METRICS_STATSD_HOST", "localhost"
+    )
+    settings.SCORM_METRICS_STATSD_PORT = getattr(
+        settings, "SCORM_METRICS_STATSD_PORT", 8125
+    )
+    # Trace the instrumented phases as OpenTelemetry spans, if installed
+    settings.SCORM_METRICS_TRACING = getattr(settings, "SCORM_METRICS_TRACING", False)
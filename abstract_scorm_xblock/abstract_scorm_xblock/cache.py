@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .utils import Counters
+
+
+CACHE_KEY_PREFIX = "abstract_scorm_xblock"
+
+
+class LRUCache(object):
+    """
+    A small thread safe, process local, least recently used cache.
+    Entries expire after `timeout` seconds if given.
+    """
+
+    def __init__(self, maxsize, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        value, expires = self._data[key]
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            raise KeyError(key)
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                return self._get(key)
+            except KeyError:
+                return default
+
+    def set(self, key, value):
+        expires = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            try:
+                self._get(key)
+            except KeyError:
+                return False
+            return True
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalFileCache(object):
+    """
+    A cache of files on the local disk, bounded to `max_size` bytes, which
+    can be shared by all the processes of a node.
+    Files are populated atomically, so readers never see a partial file,
+    and the least recently used ones are evicted when the cache is full.
+    Each process tracks the cache size from the files it adds, and only scans
+    the cache directory when its estimate exceeds `max_size`. Eviction goes
+    down to `LOW_WATERMARK` of `max_size`, which leaves room for the files
+    added by the other processes until they scan the directory in turn.
+    Hits, misses and evictions of the current process are counted in `stats`,
+    and exported as the `metric` counter if given.
+    """
+
+    LOW_WATERMARK = 0.9
+
+    def __init__(self, directory, max_size, metric=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.stats = Counters(metric)
+        # Estimate of the cache size, unknown until the first scan
+        self.size = None
+        self._size_lock = threading.Lock()
+
+    def get_path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()
+        )
+
+    def open_cached(self, path):
+        """
+        Opens the cached file at `path`, or returns None if it's missing
+        """
+        try:
+            cached_file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        # The access time isn't reliable, since filesystems are often
+        # mounted with noatime: the modification time tracks usage
+        os.utime(path)
+        self.stats.increment("hits")
+        return cached_file
+
+    def lock(self, lock_path):
+        """
+        Opens the `lock_path` file and locks it exclusively. The holder of the
+        lock deletes the lock file before releasing it, so a lock acquired on
+        a file deleted meanwhile is retried on the file now at `lock_path`,
+        which other processes lock too.
+        """
+        while True:
+            lock_file = open(lock_path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    def open(self, key, fetch):
+        """
+        Opens the cached file identified by `key` for reading. Missing files
+        are populated by calling `fetch(fileobj)`, which must write the file
+        content to `fileobj`. Concurrent misses of the same file, from any
+        process of the node, wait for a single fetch.
+        """
+        path = self.get_path(key)
+        cached_file = self.open_cached(path)
+        if cached_file is not None:
+            return cached_file
+
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = os.path.join(self.directory, ".lock" + os.path.basename(path))
+        with self.lock(lock_path):
+            try:
+                cached_file = self.open_cached(path)
+                if cached_file is not None:
+                    return cached_file
+                self.stats.increment("misses")
+                with tempfile.NamedTemporaryFile(
+                    dir=self.directory, prefix=".tmp", delete=False
+                ) as tmp_file:
+                    try:
+                        fetch(tmp_file)
+                    except Exception:
+                        os.unlink(tmp_file.name)
+                        raise
+                os.replace(tmp_file.name, path)
+                # Open the file before evicting: if it's evicted right away
+                # by a concurrent process, we can still read it
+                cached_file = open(path, "rb")
+            finally:
+                # Delete the lock file while holding the lock: waiters find
+                # the file once they hold the lock, or lock the new lock file
+                # of a later miss
+                try:
+                    os.unlink(lock_path)
+                except FileNotFoundError:
+                    pass
+        with self._size_lock:
+            if self.size is not None:
+                self.size += os.fstat(cached_file.fileno()).st_size
+            needs_eviction = self.size is None or self.size > self.max_size
+        if needs_eviction:
+            self.evict(keep=path)
+        return cached_file
+
+    def open_storage_file(self, name):
+        """
+        Opens the cached copy of the `name` file of the default storage
+        """
+
+        def fetch(fileobj):
+            with default_storage.open(name) as storage_file:
+                for chunk in storage_file.chunks():
+                    fileobj.write(chunk)
+
+        return self.open(name, fetch)
+
+    def evict(self, keep=None):
+        """
+        Scans the cache directory and, if the cache size exceeds `max_size`,
+        deletes the least recently used files until it's within the low
+        watermark, never deleting the `keep` path
+        """
+        entries = []
+        total_size = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                # Temporary and lock files
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+        target_size = self.max_size
+        if total_size > self.max_size:
+            target_size = self.max_size * self.LOW_WATERMARK
+        for _, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            else:
+                self.stats.increment("evictions")
+            total_size -= size
+        with self._size_lock:
+            self.size = total_size
+
+
+def make_cache_key(*parts):
+    return ":".join((CACHE_KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+
+# Markers expire, so that processes notice packages deleted by
+# `scorm_gc_packages`, which only deletes the markers of the Django cache
+extracted_packages = LRUCache(
+    settings.SCORM_EXTRACTED_MARKER_LRU_SIZE,
+    settings.SCORM_EXTRACTED_MARKER_LRU_TIMEOUT,
+)
+
+
+def is_package_extracted(md5, local=True):
+    """
+    Tells whether the SCORM package identified by `md5` is known to be
+    completely extracted to the default storage.
+    The process local cache is checked first unless `local` is False,
+    then the Django cache.
+    """
+    if local and md5 in extracted_packages:
+        return True
+    if cache.get(make_cache_key("extracted", md5)):
+        extracted_packages.set(md5, True)
+        return True
+    return False
+
+
+def mark_package_extracted(md5):
+    extracted_packages.set(md5, True)
+    cache.set(
+        make_cache_key("extracted", md5),
+        True,
+        settings.SCORM_EXTRACTED_MARKER_TIMEOUT,
+    )
+
+
+def unmark_package_extracted(md5):
+    extracted_packages.delete(md5)
+    cache.delete(make_cache_key("extracted", md5))
+
+
+def mark_blob_in_use(sha256):
+    """
+    Protects a blob saved or reused by an extraction from `scorm_gc_blobs`
+    until the index of the package, which references it, is saved
+    """
+    cache.set(
+        make_cache_key("blob_in_use", sha256),
+        True,
+        settings.SCORM_EXTRACTION_LOCK_TIMEOUT,
+    )
+
+
+def is_blob_in_use(sha256):
+    return bool(cache.get(make_cache_key("blob_in_use", sha256)))
+
+
+def get_extraction_status(md5):
+    return cache.get(make_cache_key("extraction", md5))
+
+
+def set_extraction_status(md5, status):
+    cache.set(
+        make_cache_key("extraction", md5),
+        status,
+        settings.SCORM_EXTRACTION_STATUS_TIMEOUT,
+    )
+
+
+def add_extraction_status(md5, status):
+    """
+    Atomically stores the extraction status of a package, only if none is
+    already stored. Returns `True` if the status has been stored.
+    """
+    return cache.add(
+        make_cache_key("extraction", md5),
+        status,
+        settings.SCORM_EXTRACTION_STATUS_TIMEOUT,
+    )
+
+
+def acquire_extraction_lock(md5):
+    """
+    Tries to acquire the lock allowing to extract the package identified
+    by `md5`. Returns a token to release the lock, or `None` if the lock
+    is held by someone else. The lock expires after
+    `SCORM_EXTRACTION_LOCK_TIMEOUT` seconds in case its holder dies.
+    """
+    token = uuid.uuid4().hex
+    if cache.add(
+        make_cache_key("extraction_lock", md5),
+        token,
+        settings.SCORM_EXTRACTION_LOCK_TIMEOUT,
+    ):
+        return token
+    return None
+
+
+def release_extraction_lock(md5, token):
+    key = make_cache_key("extraction_lock", md5)
+    # Don't release a lock which expired and was acquired by someone else
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+# Local disk cache of the files of SCORM packages, disabled if its size is 0
+asset_cache = (
+    LocalFileCache(
+        settings.SCORM_ASSET_CACHE_DIR
+        or os.path.join(tempfile.gettempdir(), "abstract_scorm_xblock", "assets"),
+        settings.SCORM_ASSET_CACHE_MAX_SIZE,
+        "asset_cache",
+    )
+    if settings.SCORM_ASSET_CACHE_MAX_SIZE
+    else None
+)
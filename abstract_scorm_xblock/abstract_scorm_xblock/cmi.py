@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+Definition of the elements of the SCORM 1.2 and SCORM 2004 CMI data models.
+
+Each edition has a table mapping every element, with element indexes
+replaced by "n", to its access, data type, vocabulary and range. The tables
+drive the validation of the values set by SCORM contents, both in the LMS and
+in the SCORM API, which receives them with `get_cmi_model`, and the error
+codes returned to contents.
+
+https://scorm.com/scorm-explained/technical-scorm/run-time/run-time-reference/
+"""
+import functools
+import re
+from collections import namedtuple
+
+from .constants import ScormVersions
+
+
+READ_ONLY = "r"
+WRITE_ONLY = "w"
+READ_WRITE = "rw"
+
+SCORM_12_EDITION = "1.2"
+SCORM_2004_EDITION = "2004"
+
+# A value is valid if it's part of the vocabulary, or if it matches the type
+# pattern and is within range. Elements without type nor vocabulary accept any
+# value. The smallest permitted maximums (SPM) of the specification are only
+# the lengths that the LMS must at least support, and contents often exceed
+# them: values are kept up to the `max_length` given to `check_cmi_set`.
+CMIElement = namedtuple(
+    "CMIElement",
+    ["access", "type", "vocabulary", "minimum", "maximum"],
+    defaults=[None, None, None, None],
+)
+
+# Patterns of the data types, compatible with the JavaScript RegExp syntax
+CMI_TYPES = {
+    "identifier": r"^\S*$",
+    "integer": r"^-?\d+$",
+    "decimal": r"^-?(\d+\.?\d*|\.\d+)$",
+    "time": r"^\d{2}:\d{2}:\d{2}(\.\d{1,2})?$",
+    "timespan": r"^\d{2,4}:\d{2}:\d{2}(\.\d{1,2})?$",
+    "timestamp": (
+        r"^\d{4}(-\d{2}(-\d{2}(T\d{2}(:\d{2}(:\d{2}(\.\d{1,2})?)?)?"
+        r"(Z|[+-]\d{2}(:\d{2})?)?)?)?)?$"
+    ),
+    "duration": (
+        r"^P(?=\d|T\d)(\d+Y)?(\d+M)?(\d+D)?(T(?=\d)(\d+H)?(\d+M)?(\d+(\.\d{1,2})?S)?)?$"
+    ),
+}
+CMI_TYPE_PATTERNS = {name: re.compile(pattern) for name, pattern in CMI_TYPES.items()}
+
+KEYWORD = CMIElement(READ_ONLY)
+KEYWORD_RE = re.compile(r"\._(children|count|version)$")
+INDEX_RE = re.compile(r"\.\d+\.")
+
+SCORM_12_STATUSES = ("passed", "completed", "failed", "incomplete", "browsed")
+SCORM_12_SCORE = CMIElement(READ_WRITE, "decimal", ("",), 0, 100)
+
+SCORM_12_ELEMENTS = {
+    "cmi._children": KEYWORD,
+    "cmi.core._children": KEYWORD,
+    "cmi.core.student_id": CMIElement(READ_ONLY),
+    "cmi.core.student_name": CMIElement(READ_ONLY),
+    "cmi.core.lesson_location": CMIElement(READ_WRITE),
+    "cmi.core.credit": CMIElement(READ_ONLY),
+    # "not attempted" can't be set by contents
+    "cmi.core.lesson_status": CMIElement(READ_WRITE, vocabulary=SCORM_12_STATUSES),
+    "cmi.core.entry": CMIElement(READ_ONLY),
+    "cmi.core.score._children": KEYWORD,
+    "cmi.core.score.raw": SCORM_12_SCORE,
+    "cmi.core.score.max": SCORM_12_SCORE,
+    "cmi.core.score.min": SCORM_12_SCORE,
+    "cmi.core.total_time": CMIElement(READ_ONLY),
+    "cmi.core.lesson_mode": CMIElement(READ_ONLY),
+    "cmi.core.exit": CMIElement(
+        WRITE_ONLY, vocabulary=("time-out", "suspend", "logout", "")
+    ),
+    "cmi.core.session_time": CMIElement(WRITE_ONLY, "timespan"),
+    "cmi.suspend_data": CMIElement(READ_WRITE),
+    "cmi.launch_data": CMIElement(READ_ONLY),
+    "cmi.comments": CMIElement(READ_WRITE),
+    "cmi.comments_from_lms": CMIElement(READ_ONLY),
+    "cmi.objectives._children": KEYWORD,
+    "cmi.objectives._count": KEYWORD,
+    "cmi.objectives.n.id": CMIElement(READ_WRITE, "identifier"),
+    "cmi.objectives.n.score._children": KEYWORD,
+    "cmi.objectives.n.score.raw": SCORM_12_SCORE,
+    "cmi.objectives.n.score.max": SCORM_12_SCORE,
+    "cmi.objectives.n.score.min": SCORM_12_SCORE,
+    "cmi.objectives.n.status": CMIElement(
+        READ_WRITE, vocabulary=SCORM_12_STATUSES + ("not attempted",)
+    ),
+    "cmi.student_data._children": KEYWORD,
+    "cmi.student_data.mastery_score": CMIElement(READ_ONLY),
+    "cmi.student_data.max_time_allowed": CMIElement(READ_ONLY),
+    "cmi.student_data.time_limit_action": CMIElement(READ_ONLY),
+    "cmi.student_preference._children": KEYWORD,
+    "cmi.student_preference.audio": CMIElement(READ_WRITE, "integer", None, -1, 100),
+    "cmi.student_preference.language": CMIElement(READ_WRITE),
+    "cmi.student_preference.speed": CMIElement(READ_WRITE, "integer", None, -100, 100),
+    "cmi.student_preference.text": CMIElement(READ_WRITE, "integer", None, -1, 1),
+    "cmi.interactions._children": KEYWORD,
+    "cmi.interactions._count": KEYWORD,
+    "cmi.interactions.n.id": CMIElement(WRITE_ONLY, "identifier"),
+    "cmi.interactions.n.objectives._count": KEYWORD,
+    "cmi.interactions.n.objectives.n.id": CMIElement(WRITE_ONLY, "identifier"),
+    "cmi.interactions.n.time": CMIElement(WRITE_ONLY, "time"),
+    "cmi.interactions.n.type": CMIElement(
+        WRITE_ONLY,
+        vocabulary=(
+            "true-false",
+            "choice",
+            "fill-in",
+            "matching",
+            "performance",
+            "sequencing",
+            "likert",
+            "numeric",
+        ),
+    ),
+    "cmi.interactions.n.correct_responses._count": KEYWORD,
+    "cmi.interactions.n.correct_responses.n.pattern": CMIElement(WRITE_ONLY),
+    "cmi.interactions.n.weighting": CMIElement(WRITE_ONLY, "decimal"),
+    "cmi.interactions.n.student_response": CMIElement(WRITE_ONLY),
+    "cmi.interactions.n.result": CMIElement(
+        WRITE_ONLY, "decimal", ("correct", "wrong", "unanticipated", "neutral")
+    ),
+    "cmi.interactions.n.latency": CMIElement(WRITE_ONLY, "timespan"),
+}
+
+SCORM_2004_COMPLETION_STATUSES = ("completed", "incomplete", "not attempted", "unknown")
+SCORM_2004_SUCCESS_STATUSES = ("passed", "failed", "unknown")
+SCORM_2004_SCALED_SCORE = CMIElement(READ_WRITE, "decimal", None, -1, 1)
+SCORM_2004_SCORE = CMIElement(READ_WRITE, "decimal")
+SCORM_2004_PROGRESS = CMIElement(READ_WRITE, "decimal", None, 0, 1)
+
+SCORM_2004_ELEMENTS = {
+    "cmi._version": KEYWORD,
+    "cmi.comments_from_learner._children": KEYWORD,
+    "cmi.comments_from_learner._count": KEYWORD,
+    "cmi.comments_from_learner.n.comment": CMIElement(READ_WRITE),
+    "cmi.comments_from_learner.n.location": CMIElement(READ_WRITE),
+    "cmi.comments_from_learner.n.timestamp": CMIElement(READ_WRITE, "timestamp"),
+    "cmi.comments_from_lms._children": KEYWORD,
+    "cmi.comments_from_lms._count": KEYWORD,
+    "cmi.comments_from_lms.n.comment": CMIElement(READ_ONLY),
+    "cmi.comments_from_lms.n.location": CMIElement(READ_ONLY),
+    "cmi.comments_from_lms.n.timestamp": CMIElement(READ_ONLY),
+    "cmi.completion_status": CMIElement(
+        READ_WRITE, vocabulary=SCORM_2004_COMPLETION_STATUSES
+    ),
+    "cmi.completion_threshold": CMIElement(READ_ONLY),
+    "cmi.credit": CMIElement(READ_ONLY),
+    "cmi.entry": CMIElement(READ_ONLY),
+    "cmi.exit": CMIElement(
+        WRITE_ONLY, vocabulary=("time-out", "suspend", "logout", "normal", "")
+    ),
+    "cmi.interactions._children": KEYWORD,
+    "cmi.interactions._count": KEYWORD,
+    "cmi.interactions.n.id": CMIElement(READ_WRITE, "identifier"),
+    "cmi.interactions.n.type": CMIElement(
+        READ_WRITE,
+        vocabulary=(
+            "true-false",
+            "choice",
+            "fill-in",
+            "long-fill-in",
+            "matching",
+            "performance",
+            "sequencing",
+            "likert",
+            "numeric",
+            "other",
+        ),
+    ),
+    "cmi.interactions.n.objectives._count": KEYWORD,
+    "cmi.interactions.n.objectives.n.id": CMIElement(READ_WRITE, "identifier"),
+    "cmi.interactions.n.timestamp": CMIElement(READ_WRITE, "timestamp"),
+    "cmi.interactions.n.correct_responses._count": KEYWORD,
+    "cmi.interactions.n.correct_responses.n.pattern": CMIElement(READ_WRITE),
+    "cmi.interactions.n.weighting": CMIElement(READ_WRITE, "decimal"),
+    "cmi.interactions.n.learner_response": CMIElement(READ_WRITE),
+    "cmi.interactions.n.result": CMIElement(
+        READ_WRITE, "decimal", ("correct", "incorrect", "unanticipated", "neutral")
+    ),
+    "cmi.interactions.n.latency": CMIElement(READ_WRITE, "duration"),
+    "cmi.interactions.n.description": CMIElement(READ_WRITE),
+    "cmi.launch_data": CMIElement(READ_ONLY),
+    "cmi.learner_id": CMIElement(READ_ONLY),
+    "cmi.learner_name": CMIElement(READ_ONLY),
+    "cmi.learner_preference._children": KEYWORD,
+    "cmi.learner_preference.audio_level": CMIElement(READ_WRITE, "decimal", None, 0),
+    "cmi.learner_preference.language": CMIElement(READ_WRITE),
+    "cmi.learner_preference.delivery_speed": CMIElement(READ_WRITE, "decimal", None, 0),
+    "cmi.learner_preference.audio_captioning": CMIElement(
+        READ_WRITE, vocabulary=("-1", "0", "1")
+    ),
+    "cmi.location": CMIElement(READ_WRITE),
+    "cmi.max_time_allowed": CMIElement(READ_ONLY),
+    "cmi.mode": CMIElement(READ_ONLY),
+    "cmi.objectives._children": KEYWORD,
+    "cmi.objectives._count": KEYWORD,
+    "cmi.objectives.n.id": CMIElement(READ_WRITE, "identifier"),
+    "cmi.objectives.n.score._children": KEYWORD,
+    "cmi.objectives.n.score.scaled": SCORM_2004_SCALED_SCORE,
+    "cmi.objectives.n.score.raw": SCORM_2004_SCORE,
+    "cmi.objectives.n.score.min": SCORM_2004_SCORE,
+    "cmi.objectives.n.score.max": SCORM_2004_SCORE,
+    "cmi.objectives.n.success_status": CMIElement(
+        READ_WRITE, vocabulary=SCORM_2004_SUCCESS_STATUSES
+    ),
+    "cmi.objectives.n.completion_status": CMIElement(
+        READ_WRITE, vocabulary=SCORM_2004_COMPLETION_STATUSES
+    ),
+    "cmi.objectives.n.progress_measure": SCORM_2004_PROGRESS,
+    "cmi.objectives.n.description": CMIElement(READ_WRITE),
+    "cmi.progress_measure": SCORM_2004_PROGRESS,
+    "cmi.scaled_passing_score": CMIElement(READ_ONLY),
+    "cmi.score._children": KEYWORD,
+    "cmi.score.scaled": SCORM_2004_SCALED_SCORE,
+    "cmi.score.raw": SCORM_2004_SCORE,
+    "cmi.score.min": SCORM_2004_SCORE,
+    "cmi.score.max": SCORM_2004_SCORE,
+    "cmi.session_time": CMIElement(WRITE_ONLY, "duration"),
+    "cmi.success_status": CMIElement(
+        READ_WRITE, vocabulary=SCORM_2004_SUCCESS_STATUSES
+    ),
+    "cmi.suspend_data": CMIElement(READ_WRITE),
+    "cmi.time_limit_action": CMIElement(READ_ONLY),
+    "cmi.total_time": CMIElement(READ_ONLY),
+    "adl.nav.request": CMIElement(READ_WRITE),
+}
+
+CMI_ELEMENTS = {
+    SCORM_12_EDITION: SCORM_12_ELEMENTS,
+    SCORM_2004_EDITION: SCORM_2004_ELEMENTS,
+}
+
+# Initial values of the readable elements which aren't empty, the values of
+# the elements depending on the XBlock are set by the XBlock
+CMI_DEFAULTS = {
+    SCORM_12_EDITION: {
+        "cmi.core.credit": "credit",
+        "cmi.core.entry": "ab-initio",
+        "cmi.core.lesson_mode": "normal",
+        "cmi.core.lesson_status": "not attempted",
+        "cmi.core.total_time": "0000:00:00",
+    },
+    SCORM_2004_EDITION: {
+        "cmi._version": "1.0",
+        "cmi.completion_status": "unknown",
+        "cmi.credit": "credit",
+        "cmi.entry": "ab-initio",
+        "cmi.mode": "normal",
+        "cmi.success_status": "unknown",
+        "cmi.total_time": "PT0H0M0S",
+    },
+}
+
+# Error codes by kind of error. SCORM 1.2 has no range error.
+CMI_ERROR_CODES = {
+    SCORM_12_EDITION: {
+        "undefined": "401",
+        "keyword": "402",
+        "read_only": "403",
+        "write_only": "404",
+        "type_mismatch": "405",
+        "out_of_range": "405",
+        "too_long": "101",
+        "discarded": "101",
+    },
+    SCORM_2004_EDITION: {
+        "undefined": "401",
+        "keyword": "404",
+        "read_only": "404",
+        "write_only": "405",
+        "type_mismatch": "406",
+        "out_of_range": "407",
+        "too_long": "351",
+        "discarded": "351",
+    },
+}
+CMI_ERROR_MESSAGES = {
+    SCORM_12_EDITION: {
+        "0": "No error",
+        "101": "General exception",
+        "201": "Invalid argument error",
+        "202": "Element cannot have children",
+        "203": "Element not an array. Cannot have count",
+        "301": "Not initialized",
+        "401": "Not implemented error",
+        "402": "Invalid set value, element is a keyword",
+        "403": "Element is read only",
+        "404": "Element is write only",
+        "405": "Incorrect data type",
+    },
+    SCORM_2004_EDITION: {
+        "0": "No Error",
+        "101": "General Exception",
+        "301": "General Get Failure",
+        "351": "General Set Failure",
+        "401": "Undefined Data Model Element",
+        "403": "Data Model Element Value Not Initialized",
+        "404": "Data Model Element Is Read Only",
+        "405": "Data Model Element Is Write Only",
+        "406": "Data Model Element Type Mismatch",
+        "407": "Data Model Element Value Out Of Range",
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_edition(scorm_version):
+    """
+    Returns the edition of the data model of `scorm_version`. Versions which
+    aren't part of `ScormVersions`, found in unusual manifests, fall back to
+    SCORM 1.2.
+    """
+    try:
+        if ScormVersions(scorm_version) > ScormVersions["SCORM_12"]:
+            return SCORM_2004_EDITION
+    except ValueError:
+        pass
+    return SCORM_12_EDITION
+
+
+@functools.lru_cache(maxsize=4096)
+def get_cmi_element(name, scorm_version):
+    """
+    Returns the definition of the `name` element, or None if the element
+    isn't part of the data model of `scorm_version`
+    """
+    elements = CMI_ELEMENTS[get_edition(scorm_version)]
+    element = elements.get(name)
+    if element is None and isinstance(name, str):
+        element = elements.get(INDEX_RE.sub(".n.", name))
+    return element
+
+
+def get_error_code(error, scorm_version):
+    return CMI_ERROR_CODES[get_edition(scorm_version)][error]
+
+
+def check_cmi_get(name, scorm_version):
+    """
+    Returns the error code of reading the `name` element, or None
+    """
+    element = get_cmi_element(name, scorm_version)
+    if element is None:
+        return get_error_code("undefined", scorm_version)
+    if element.access == WRITE_ONLY:
+        return get_error_code("write_only", scorm_version)
+    return None
+
+
+def check_cmi_set(name, value, scorm_version, max_length=None):
+    """
+    Returns the error code of setting the `name` element to `value`, or None.
+    Values longer than `max_length` are rejected.
+    """
+    element = get_cmi_element(name, scorm_version)
+    if element is None:
+        return get_error_code("undefined", scorm_version)
+    if element.access == READ_ONLY:
+        if KEYWORD_RE.search(name):
+            return get_error_code("keyword", scorm_version)
+        return get_error_code("read_only", scorm_version)
+    value = str(value)
+    if max_length is not None and len(value) > max_length:
+        return get_error_code("too_long", scorm_version)
+    if element.type is None and element.vocabulary is None:
+        return None
+    if element.vocabulary and value in element.vocabulary:
+        return None
+    if element.type is None or not CMI_TYPE_PATTERNS[element.type].match(value):
+        return get_error_code("type_mismatch", scorm_version)
+    if (element.minimum is not None and float(value) < element.minimum) or (
+        element.maximum is not None and float(value) > element.maximum
+    ):
+        return get_error_code("out_of_range", scorm_version)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_cmi_children(name, scorm_version):
+    """
+    Value of the `_children` keyword `name`: the comma separated list of
+    the children of its parent element
+    """
+    elements = CMI_ELEMENTS[get_edition(scorm_version)]
+    parent = INDEX_RE.sub(".n.", name)[: -len("._children")]
+    prefix = parent + ".n." if parent + "._count" in elements else parent + "."
+    children = []
+    for element in elements:
+        if element.startswith(prefix):
+            child = element[len(prefix) :].split(".")[0]
+            if not child.startswith("_") and child not in children:
+                children.append(child)
+    return ",".join(children)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cmi_defaults(scorm_version):
+    """
+    Initial values of all the readable elements of `scorm_version` which
+    aren't part of arrays, keywords included
+    """
+    edition = get_edition(scorm_version)
+    defaults = {}
+    for name, element in CMI_ELEMENTS[edition].items():
+        if ".n." in name or element.access == WRITE_ONLY:
+            continue
+        if name.endswith("._children"):
+            defaults[name] = get_cmi_children(name, scorm_version)
+        elif name.endswith("._count"):
+            defaults[name] = 0
+        else:
+            defaults[name] = CMI_DEFAULTS[edition].get(name, "")
+    return defaults
+
+
+@functools.lru_cache(maxsize=None)
+def get_cmi_model(scorm_version):
+    """
+    Data model of `scorm_version` for the SCORM API, which validates values
+    as `check_cmi_set` does
+    """
+    edition = get_edition(scorm_version)
+    elements = CMI_ELEMENTS[edition]
+    return {
+        "edition": edition,
+        "elements": {
+            name: [
+                element.access,
+                element.type,
+                list(element.vocabulary) if element.vocabulary else None,
+                element.minimum,
+                element.maximum,
+            ]
+            for name, element in elements.items()
+        },
+        "types": CMI_TYPES,
+        "errors": CMI_ERROR_CODES[edition],
+        "messages": CMI_ERROR_MESSAGES[edition],
+    }
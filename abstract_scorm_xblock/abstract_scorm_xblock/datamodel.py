@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Storage of the SCORM CMI data model in the `_scorm_data` user state field.
+
+Values are stored as the latest value per element, with a few tweaks keeping
+the user state small:
+
+* interactions are stored as a list of dicts indexed by interaction number,
+  under the `cmi.interactions` key, instead of one key per element;
+* big values are compressed with zlib.
+"""
+import base64
+import binascii
+import logging
+import re
+import zlib
+
+from django.conf import settings
+
+from .exceptions import ScormValueDiscardedException
+
+
+logger = logging.getLogger(__name__)
+
+INTERACTIONS = "cmi.interactions"
+INTERACTIONS_COUNT = "cmi.interactions._count"
+INTERACTION_RE = re.compile(r"^cmi\.interactions\.(?P<index>\d+)\.(?P<element>.+)$")
+# Elements of the arrays other than interactions, e.g. objectives
+ARRAY_ELEMENT_RE = re.compile(r"^(?P<array>cmi\.[a-z_]+)\.(?P<index>\d+)\.")
+COMPRESSED = "zlib"
+
+
+def compress(value):
+    """
+    Compresses string values bigger than `SCORM_CMI_COMPRESSION_THRESHOLD`
+    characters, when compression actually saves space
+    """
+    if (
+        not isinstance(value, str)
+        or len(value) < settings.SCORM_CMI_COMPRESSION_THRESHOLD
+    ):
+        return value
+    compressed = base64.b64encode(zlib.compress(value.encode("utf-8"))).decode("ascii")
+    if len(compressed) >= len(value):
+        return value
+    return {COMPRESSED: compressed}
+
+
+def decompress(value):
+    if isinstance(value, dict) and COMPRESSED in value:
+        try:
+            return zlib.decompress(base64.b64decode(value[COMPRESSED])).decode("utf-8")
+        except (binascii.Error, zlib.error, TypeError, UnicodeDecodeError):
+            # Stored before values were checked to be strings
+            logger.warning("Invalid compressed CMI value discarded")
+            return ""
+    return value
+
+
+def get_cmi_value(scorm_data, name, default=""):
+    """
+    Reads the value of the `name` CMI element from `scorm_data`
+    """
+    interactions = scorm_data.get(INTERACTIONS, [])
+    if name == INTERACTIONS_COUNT and interactions:
+        return len(interactions)
+    if name.endswith("._count") and name not in scorm_data:
+        return get_array_counts(scorm_data).get(name, default)
+    match = INTERACTION_RE.match(name)
+    if match:
+        index = int(match.group("index"))
+        if index < len(interactions) and match.group("element") in interactions[index]:
+            return decompress(interactions[index][match.group("element")])
+    return decompress(scorm_data.get(name, default))
+
+
+def set_cmi_value(scorm_data, name, value):
+    """
+    Stores the value of the `name` CMI element in `scorm_data`.
+    Returns False if the value is unchanged, in which case `scorm_data` is
+    left untouched. Raises ScormValueDiscardedException if the value can't
+    be stored.
+    """
+    value = compress(value)
+
+    match = INTERACTION_RE.match(name)
+    if not match:
+        if name in scorm_data and scorm_data[name] == value:
+            return False
+        scorm_data[name] = value
+        return True
+
+    if INTERACTIONS not in scorm_data:
+        migrate_interactions(scorm_data)
+    interactions = scorm_data[INTERACTIONS]
+    index = int(match.group("index"))
+    if index == len(interactions):
+        if index >= settings.SCORM_CMI_MAX_INTERACTIONS:
+            raise ScormValueDiscardedException(
+                'Interaction "{}" discarded: too many interactions'.format(name)
+            )
+        interactions.append({})
+    elif index > len(interactions):
+        raise ScormValueDiscardedException(
+            'Interaction "{}" discarded: invalid index'.format(name)
+        )
+    interaction = interactions[index]
+    if (
+        match.group("element") in interaction
+        and interaction[match.group("element")] == value
+    ):
+        return False
+    interaction[match.group("element")] = value
+    return True
+
+
+def migrate_interactions(scorm_data):
+    """
+    Moves the interactions stored with one key per element,
+    before the introduction of the compact format, to the compact format
+    """
+    interactions = []
+    for name in [name for name in scorm_data if INTERACTION_RE.match(name)]:
+        match = INTERACTION_RE.match(name)
+        index = int(match.group("index"))
+        while len(interactions) <= index:
+            interactions.append({})
+        interactions[index][match.group("element")] = scorm_data.pop(name)
+    scorm_data[INTERACTIONS] = interactions
+
+
+def get_array_counts(scorm_data):
+    """
+    Returns the `_count` of the arrays other than interactions stored in
+    `scorm_data`, which contents don't set
+    """
+    counts = {}
+    for name in scorm_data:
+        match = ARRAY_ELEMENT_RE.match(name)
+        if match:
+            count_name = match.group("array") + "._count"
+            counts[count_name] = max(
+                counts.get(count_name, 0), int(match.group("index")) + 1
+            )
+    return counts
+
+
+def iter_cmi_values(scorm_data):
+    """
+    Iterates over all (name, value) CMI elements stored in `scorm_data`
+    """
+    for name, value in scorm_data.items():
+        if name != INTERACTIONS:
+            yield name, decompress(value)
+    yield from get_array_counts(scorm_data).items()
+    interactions = scorm_data.get(INTERACTIONS, [])
+    if interactions:
+        yield INTERACTIONS_COUNT, len(interactions)
+    for index, interaction in enumerate(interactions):
+        for element, value in interaction.items():
+            yield "{}.{}.{}".format(INTERACTIONS, index, element), decompress(value)
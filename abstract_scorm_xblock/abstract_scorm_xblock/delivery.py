@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Backends offloading the delivery of SCORM package files to the web server.
+
+A backend is a function receiving the path of a file in the default storage
+and its content type, and returning a response telling the web server which
+file to send. The browser URL doesn't change, so files are still served from
+the LMS domain and the SAMEORIGIN policy is satisfied.
+
+Web servers only keep a few headers of these responses, dropping
+Content-Encoding and Vary, so precompressed variants (`SCORM_PRECOMPRESS`)
+aren't served through backends. Text files can be compressed by the web
+server instead, e.g. with nginx:
+
+    location /scorm-internal/ {
+        internal;
+        gzip on;
+        gzip_vary on;
+        gzip_proxied any;
+        gzip_types text/css application/javascript application/json image/svg+xml;
+        ...
+    }
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from urllib.parse import quote, urlsplit
+
+
+def x_accel_redirect(fullpath, content_type):
+    """
+    Lets nginx serve the file from an internal location mapped on the
+    default storage root, e.g. for a filesystem storage:
+
+        location /scorm-internal/ {
+            internal;
+            alias /openedx/media/;
+        }
+    """
+    response = HttpResponse(content_type=content_type)
+    response["X-Accel-Redirect"] = settings.SCORM_DELIVERY_INTERNAL_URL + quote(
+        fullpath
+    )
+    return response
+
+
+def x_sendfile(fullpath, content_type):
+    """
+    Lets Apache (mod_xsendfile) or lighttpd serve the file from the
+    filesystem storage
+    """
+    response = HttpResponse(content_type=content_type)
+    response["X-Sendfile"] = default_storage.path(fullpath)
+    return response
+
+
+def reverse_proxy(fullpath, content_type):
+    """
+    Lets nginx proxy the file from an object storage, using the (possibly
+    signed) storage URL of the file, e.g.:
+
+        location ~ ^/scorm-internal/(?<proxy_scheme>[^/]+)/(?<proxy_host>[^/]+)/(?<proxy_path>.*)$ {
+            internal;
+            resolver 8.8.8.8;
+            proxy_pass $proxy_scheme://$proxy_host/$proxy_path$is_args$args;
+        }
+    """
+    url = urlsplit(default_storage.url(fullpath))
+    redirect = "{}{}/{}{}".format(
+        settings.SCORM_DELIVERY_INTERNAL_URL, url.scheme, url.netloc, url.path
+    )
+    if url.query:
+        redirect += "?" + url.query
+    response = HttpResponse(content_type=content_type)
+    response["X-Accel-Redirect"] = redirect
+    return response
+
+
+DELIVERY_BACKENDS = {
+    "x-accel-redirect": x_accel_redirect,
+    "x-sendfile": x_sendfile,
+    "reverse-proxy": reverse_proxy,
+}
+
+
+def get_delivery_backend():
+    """
+    Returns the backend selected by `SCORM_DELIVERY_BACKEND`, which can be
+    the name of one of the backends above or the dotted path of a custom one.
+    Returns None if files should be proxied by Django.
+    """
+    backend = settings.SCORM_DELIVERY_BACKEND
+    if not backend or backend == "proxy":
+        return None
+    if backend in DELIVERY_BACKENDS:
+        return DELIVERY_BACKENDS[backend]
+    return import_string(backend)
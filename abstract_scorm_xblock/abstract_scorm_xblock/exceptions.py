@@ -5,3 +5,11 @@ class ScormPackageNotFoundException(Exception):
 
 class ScormManifestNotFoundException(Exception):
     pass
+
+
+class ScormPackageExtractionInProgressException(Exception):
+    pass
+
+
+class ScormValueDiscardedException(Exception):
+    pass
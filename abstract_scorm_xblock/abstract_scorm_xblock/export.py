@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Export of the SCORM runtime data of the learners of a course.
+
+The user state of SCORM XBlocks is read from the StudentModule table in
+batches, using keyset pagination on the primary key, and turned into CSV or
+JSON lines one learner at a time, so that memory use doesn't depend on the
+number of learners.
+"""
+import csv
+import json
+
+from .datamodel import INTERACTIONS, decompress
+
+CSV_FORMAT = "csv"
+JSONL_FORMAT = "jsonl"
+EXPORT_FORMATS = {
+    CSV_FORMAT: "text/csv",
+    JSONL_FORMAT: "application/x-ndjson",
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+LEARNER_COLUMNS = [
+    "block_id",
+    "user_id",
+    "username",
+    "lesson_status",
+    "success_status",
+    "lesson_score",
+    "session_time",
+]
+# Interactions are exported with one CSV row each
+INTERACTION_COLUMNS = [
+    "interaction",
+    "interaction_id",
+    "type",
+    "result",
+    "response",
+    "latency",
+    "timestamp",
+    "weighting",
+    "description",
+]
+
+# Defaults of the XBlock user state fields
+DEFAULT_STATE = {
+    "lesson_score": 0,
+    "_lesson_status": "not attempted",
+    "_success_status": "unknown",
+}
+
+
+def fetch_student_modules(course_key, categories, after_id, batch_size):
+    """
+    Returns the next `batch_size` (id, usage key, user id, username, state)
+    user states of the `categories` XBlocks of the course, after the
+    `after_id` one
+    """
+    # Only available in the LMS
+    from lms.djangoapps.courseware.models import StudentModule
+
+    return list(
+        StudentModule.objects.filter(
+            course_id=course_key, module_type__in=categories, id__gt=after_id
+        )
+        .order_by("id")
+        .values_list(
+            "id", "module_state_key", "student_id", "student__username", "state"
+        )[:batch_size]
+    )
+
+
+def count_student_modules(course_key, categories):
+    """
+    Returns the number of user states of the `categories` XBlocks of the course
+    """
+    # Only available in the LMS
+    from lms.djangoapps.courseware.models import StudentModule
+
+    return StudentModule.objects.filter(
+        course_id=course_key, module_type__in=categories
+    ).count()
+
+
+def iter_student_modules(course_key, categories, batch_size=DEFAULT_BATCH_SIZE):
+    after_id = 0
+    while True:
+        rows = fetch_student_modules(course_key, categories, after_id, batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1][0]
+
+
+def make_interaction(index, interaction):
+    interaction = {name: decompress(value) for name, value in interaction.items()}
+    return {
+        "interaction": index,
+        "interaction_id": interaction.get("id", ""),
+        "type": interaction.get("type", ""),
+        "result": interaction.get("result", ""),
+        # SCORM 1.2 and SCORM 2004 names
+        "response": interaction.get(
+            "learner_response", interaction.get("student_response", "")
+        ),
+        "latency": interaction.get("latency", ""),
+        "timestamp": interaction.get("timestamp", interaction.get("time", "")),
+        "weighting": interaction.get("weighting", ""),
+        "description": interaction.get("description", ""),
+    }
+
+
+def make_record(usage_key, user_id, username, state):
+    """
+    Returns the learner data exported from a StudentModule state
+    """
+    state = json.loads(state or "{}")
+    scorm_data = state.get("_scorm_data") or {}
+    interactions = scorm_data.get(INTERACTIONS, [])
+    return {
+        "block_id": str(usage_key),
+        "user_id": user_id,
+        "username": username,
+        "lesson_status": state.get("_lesson_status", DEFAULT_STATE["_lesson_status"]),
+        "success_status": state.get(
+            "_success_status", DEFAULT_STATE["_success_status"]
+        ),
+        "lesson_score": state.get("lesson_score", DEFAULT_STATE["lesson_score"]),
+        "session_time": decompress(
+            scorm_data.get("cmi.session_time", scorm_data.get("cmi.core.session_time"))
+        )
+        or "",
+        "interactions": [
+            make_interaction(index, interaction)
+            for index, interaction in enumerate(interactions)
+        ],
+    }
+
+
+def iter_records(course_key, categories, batch_size=DEFAULT_BATCH_SIZE):
+    for _, usage_key, user_id, username, state in iter_student_modules(
+        course_key, categories, batch_size
+    ):
+        yield make_record(usage_key, user_id, username, state)
+
+
+class Echo(object):
+    """
+    File-like object returning what is written, letting `csv.writer` format
+    rows one at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_lines(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(LEARNER_COLUMNS + INTERACTION_COLUMNS)
+    for record in records:
+        learner = [record[column] for column in LEARNER_COLUMNS]
+        if not record["interactions"]:
+            yield writer.writerow(learner + [""] * len(INTERACTION_COLUMNS))
+        for interaction in record["interactions"]:
+            yield writer.writerow(
+                learner + [interaction[column] for column in INTERACTION_COLUMNS]
+            )
+
+
+def iter_jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record) + "\n"
+
+
+def iter_export(
+    course_key, categories, export_format=CSV_FORMAT, batch_size=DEFAULT_BATCH_SIZE
+):
+    """
+    Streams the SCORM runtime data of the learners of the `categories`
+    XBlocks of a course, as lines of CSV or JSON
+    """
+    records = iter_records(course_key, categories, batch_size)
+    if export_format == JSONL_FORMAT:
+        return iter_jsonl_lines(records)
+    return iter_csv_lines(records)
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zipfile import ZipFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from xmodule.contentstore.django import contentstore
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .cache import (
+    acquire_extraction_lock,
+    is_package_extracted,
+    mark_blob_in_use,
+    mark_package_extracted,
+    release_extraction_lock,
+    set_extraction_status,
+)
+from .exceptions import (
+    ScormPackageExtractionInProgressException,
+    ScormPackageNotFoundException,
+)
+from .metrics import observe, span
+from .index import (
+    BLOBS_STORAGE_MODE,
+    get_blob_path,
+    get_variant_path,
+    guess_content_type,
+    make_index_entry,
+    save_package_index,
+)
+from .zipstore import (
+    PACKAGE_FILENAME,
+    ZIP_STORAGE_MODE,
+    get_package_zip_path,
+    make_zip_entry,
+)
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "imsmanifest.xml"
+
+# Content types, besides text/*, worth precompressing
+COMPRESSIBLE_CONTENT_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+    "image/x-icon",
+    "font/ttf",
+    "font/otf",
+    "application/vnd.ms-fontobject",
+}
+# Quality 11 is the default but is too slow for multi megabyte files
+BROTLI_QUALITY = 9
+
+
+class ExtractionProgress(object):
+    """
+    Keeps track of the extraction of a SCORM package, and publishes
+    it in the Django cache so that it can be polled from Studio
+    """
+
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+
+    # Minimum interval in seconds between two updates of the cache
+    SAVE_INTERVAL = 1
+
+    def __init__(self, md5):
+        self.md5 = md5
+        self.status = self.make_status(self.PENDING)
+        self._last_save = 0
+
+    @classmethod
+    def make_status(cls, state, message=""):
+        return {
+            "state": state,
+            "message": message,
+            "files_done": 0,
+            "files_total": 0,
+            "bytes_done": 0,
+            "bytes_total": 0,
+        }
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if force or now - self._last_save >= self.SAVE_INTERVAL:
+            set_extraction_status(self.md5, dict(self.status))
+            self._last_save = now
+
+    def start(self, files_total, bytes_total):
+        self.status.update(
+            state=self.IN_PROGRESS, files_total=files_total, bytes_total=bytes_total
+        )
+        self.save(force=True)
+
+    def advance(self, file_size):
+        self.status["files_done"] += 1
+        self.status["bytes_done"] += file_size
+        self.save()
+
+    def finish(self):
+        self.status["state"] = self.DONE
+        self.save(force=True)
+
+    def fail(self, message):
+        self.status.update(state=self.FAILED, message=message)
+        self.save(force=True)
+
+
+def get_scorm_path(md5):
+    """
+    Path of the extracted SCORM package in the default storage
+    """
+    return os.path.join(settings.STORAGE_SCORM_PATH, md5)
+
+
+@span("package_search")
+def search_scorm_package(course_id, scorm_file):
+    """
+    Returns the contentstore entry of the SCORM package named `scorm_file`
+    in the course
+    """
+    scorm_content, count = contentstore().get_all_content_for_course(
+        course_id, filter_params={"displayname": scorm_file}
+    )
+    zip_mimetypes = {"application/x-zip-compressed", "application/zip"}
+    if not count or scorm_content[0]["contentType"] not in zip_mimetypes:
+        raise ScormPackageNotFoundException(
+            'SCORM package "{}" not found'.format(scorm_file)
+        )
+    # Since course content names are unique we are sure that we
+    # can't have multiple results, so we just pop the first.
+    return scorm_content.pop()
+
+
+def spool_scorm_package(asset_key):
+    """
+    Streams the SCORM package from the contentstore chunk by chunk into a file
+    object. Packages up to `SCORM_EXTRACTION_SPOOL_MAX_SIZE` bytes are kept in
+    memory, bigger ones are spooled to a temporary file on disk.
+    """
+    content = contentstore().find(asset_key, as_stream=True)
+    if content.length > settings.SCORM_EXTRACTION_SPOOL_MAX_SIZE:
+        # tempfile.SpooledTemporaryFile can't be used here since it's not
+        # seekable() till python 3.11, and ZipFile requires it
+        scorm_file = tempfile.TemporaryFile(dir=settings.SCORM_EXTRACTION_SPOOL_DIR)
+    else:
+        scorm_file = io.BytesIO()
+    for chunk in content.stream_data():
+        scorm_file.write(chunk)
+    scorm_file.seek(0)
+    return scorm_file
+
+
+class HashingReader(object):
+    """
+    File-like wrapper computing the sha256 of the data read from `fileobj`
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.sha256.update(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def is_compressible(zipinfo):
+    content_type = guess_content_type(zipinfo.filename)
+    return zipinfo.file_size >= settings.SCORM_PRECOMPRESS_MIN_SIZE and (
+        content_type.startswith("text/") or content_type in COMPRESSIBLE_CONTENT_TYPES
+    )
+
+
+def make_compressors():
+    """
+    Returns the (compress, flush) functions of a compressor for each
+    supported encoding. Brotli is only supported if the `brotli` package
+    is installed.
+    """
+    gzip_compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    compressors = {"gzip": (gzip_compressor.compress, gzip_compressor.flush)}
+    if brotli is not None:
+        brotli_compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compressors["br"] = (brotli_compressor.process, brotli_compressor.finish)
+    return compressors
+
+
+def save_precompressed_variants(zipfile_obj, zipinfo, scorm_path, lock):
+    """
+    Saves the gzip and brotli variants of a zip member to the package
+    metadata directory, compressing it in a single pass.
+    Returns the size of each variant, skipping the ones not smaller than
+    the member itself.
+    """
+    compressors = make_compressors()
+    variants = {
+        encoding: tempfile.SpooledTemporaryFile(
+            settings.SCORM_EXTRACTION_SPOOL_MAX_SIZE,
+            dir=settings.SCORM_EXTRACTION_SPOOL_DIR,
+        )
+        for encoding in compressors
+    }
+    try:
+        with lock:
+            member = zipfile_obj.open(zipinfo)
+        try:
+            for chunk in iter(lambda: member.read(File.DEFAULT_CHUNK_SIZE), b""):
+                for encoding, (compress, _) in compressors.items():
+                    variants[encoding].write(compress(chunk))
+        finally:
+            with lock:
+                member.close()
+
+        sizes = {}
+        for encoding, (_, flush) in compressors.items():
+            variant = variants[encoding]
+            variant.write(flush())
+            size = variant.tell()
+            if size >= zipinfo.file_size:
+                continue
+            variant.seek(0)
+            content = File(variant, name=zipinfo.filename)
+            content.size = size
+            variant_path = get_variant_path(scorm_path, encoding, zipinfo.filename)
+            default_storage.delete(variant_path)
+            default_storage.save(variant_path, content)
+            sizes[encoding] = size
+        return sizes
+    finally:
+        for variant in variants.values():
+            variant.close()
+
+
+def upload_zip_member(zipfile_obj, zipinfo, path, lock):
+    """
+    Streams a single zip member to `path` in the default storage without
+    loading it in memory, and returns its sha256.
+    ZipFile supports reading members from multiple threads, but the
+    bookkeeping done when opening and closing them isn't thread safe:
+    `lock` serializes it.
+    """
+    with lock:
+        member = zipfile_obj.open(zipinfo)
+    try:
+        reader = HashingReader(member)
+        content = File(reader, name=zipinfo.filename)
+        # Avoid django guessing the size from the member name, which
+        # is relative and could match an unrelated local file.
+        content.size = zipinfo.file_size
+        default_storage.save(path, content)
+    finally:
+        with lock:
+            member.close()
+    return reader.sha256.hexdigest()
+
+
+def hash_zip_member(zipfile_obj, zipinfo, lock):
+    with lock:
+        member = zipfile_obj.open(zipinfo)
+    try:
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: member.read(File.DEFAULT_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    finally:
+        with lock:
+            member.close()
+    return sha256.hexdigest()
+
+
+def save_zip_member(zipfile_obj, zipinfo, scorm_path, lock):
+    """
+    Saves a zip member to the package directory, along with its
+    precompressed variants, and returns its index entry
+    """
+    sha256 = upload_zip_member(
+        zipfile_obj, zipinfo, os.path.join(scorm_path, zipinfo.filename), lock
+    )
+    encodings = None
+    if settings.SCORM_PRECOMPRESS and is_compressible(zipinfo):
+        encodings = save_precompressed_variants(zipfile_obj, zipinfo, scorm_path, lock)
+    return make_index_entry(
+        zipinfo.file_size, time.time(), sha256, zipinfo.filename, encodings
+    )
+
+
+def save_zip_member_blob(zipfile_obj, zipinfo, scorm_path, lock):
+    """
+    Blob store counterpart of `save_zip_member`: the member is saved as a
+    blob named after its sha256, unless a blob with the same content
+    already exists, e.g. a runtime file shared by many packages.
+    """
+    sha256 = hash_zip_member(zipfile_obj, zipinfo, lock)
+    blob_path = get_blob_path(sha256)
+    # Existing blobs can be old and unreferenced: they must not be collected
+    # before the package index is saved
+    mark_blob_in_use(sha256)
+    if default_storage.exists(blob_path):
+        # Blobs left half uploaded by a failed extraction are replaced
+        if default_storage.size(blob_path) == zipinfo.file_size:
+            logger.debug('Blob of "%s" already exists', zipinfo.filename)
+            blob_path = None
+        else:
+            default_storage.delete(blob_path)
+    if blob_path:
+        upload_zip_member(zipfile_obj, zipinfo, blob_path, lock)
+    encodings = None
+    if settings.SCORM_PRECOMPRESS and is_compressible(zipinfo):
+        encodings = save_precompressed_variants(zipfile_obj, zipinfo, scorm_path, lock)
+    entry = make_index_entry(
+        zipinfo.file_size, time.time(), sha256, zipinfo.filename, encodings
+    )
+    entry["blob"] = True
+    return entry
+
+
+def save_zip_member_with_retry(
+    zipfile_obj, zipinfo, scorm_path, lock, save_member=save_zip_member
+):
+    retries = settings.SCORM_EXTRACTION_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            return save_member(zipfile_obj, zipinfo, scorm_path, lock)
+        # Storage backends raise all kind of exceptions on network errors
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logger.warning(
+                'Error saving "%s" to "%s" (attempt %d of %d): %s',
+                zipinfo.filename,
+                scorm_path,
+                attempt + 1,
+                retries + 1,
+                e,
+            )
+            # Don't let storages which don't overwrite files save the
+            # next attempt under a different name
+            default_storage.delete(os.path.join(scorm_path, zipinfo.filename))
+            time.sleep(settings.SCORM_EXTRACTION_RETRY_DELAY * (attempt + 1))
+
+
+def extract_scorm_package(scorm_file, scorm_path, progress=None):
+    """
+    Extracts all members of the SCORM zip file to `scorm_path` in the default storage.
+    Members are uploaded by a pool of `SCORM_EXTRACTION_WORKERS` threads.
+    The manifest is saved last, after the package index: since its presence
+    tells that a package has been extracted, a half extracted package never
+    looks complete.
+    With `SCORM_STORAGE_MODE = "blobs"` the members, except the manifest, are
+    saved to the content addressed blob store instead.
+    """
+    index = {}
+    lock = threading.Lock()
+    if settings.SCORM_STORAGE_MODE == BLOBS_STORAGE_MODE:
+        save_member = save_zip_member_blob
+    else:
+        save_member = save_zip_member
+    with ZipFile(scorm_file) as zipfile_obj:
+        members = [
+            zipinfo for zipinfo in zipfile_obj.infolist() if not zipinfo.is_dir()
+        ]
+        manifests = [
+            zipinfo for zipinfo in members if zipinfo.filename == MANIFEST_FILENAME
+        ]
+        size = sum(zipinfo.file_size for zipinfo in members)
+        observe("package_files", len(members))
+        observe("package_bytes", size)
+        if progress:
+            progress.start(len(members), size)
+        with ThreadPoolExecutor(settings.SCORM_EXTRACTION_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    save_zip_member_with_retry,
+                    zipfile_obj,
+                    zipinfo,
+                    scorm_path,
+                    lock,
+                    save_member,
+                ): zipinfo
+                for zipinfo in members
+                if zipinfo.filename != MANIFEST_FILENAME
+            }
+            try:
+                for future in as_completed(futures):
+                    index[futures[future].filename] = future.result()
+                    if progress:
+                        progress.advance(futures[future].file_size)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        for zipinfo in manifests:
+            index[zipinfo.filename] = make_index_entry(
+                zipinfo.file_size,
+                time.time(),
+                hashlib.sha256(zipfile_obj.read(zipinfo)).hexdigest(),
+                zipinfo.filename,
+            )
+        save_package_index(scorm_path, index)
+        for zipinfo in manifests:
+            save_zip_member_with_retry(zipfile_obj, zipinfo, scorm_path, lock)
+            if progress:
+                progress.advance(zipinfo.file_size)
+
+
+def store_scorm_package(scorm_file, scorm_path, progress=None):
+    """
+    Zip-direct mode counterpart of `extract_scorm_package`: stores the
+    SCORM zip file as is next to `scorm_path` in the default storage, along
+    with an index of its members, then extracts the manifest only.
+    """
+    lock = threading.Lock()
+    scorm_file.seek(0, os.SEEK_END)
+    package_size = scorm_file.tell()
+    with ZipFile(scorm_file) as zipfile_obj:
+        members = [
+            zipinfo for zipinfo in zipfile_obj.infolist() if not zipinfo.is_dir()
+        ]
+        observe("package_files", len(members))
+        observe("package_bytes", sum(zipinfo.file_size for zipinfo in members))
+        if progress:
+            progress.start(1, package_size)
+        index = {}
+        for zipinfo in members:
+            sha256 = hashlib.sha256()
+            with zipfile_obj.open(zipinfo) as member:
+                for chunk in iter(lambda: member.read(File.DEFAULT_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+            entry = make_index_entry(
+                zipinfo.file_size, time.time(), sha256.hexdigest(), zipinfo.filename
+            )
+            entry["zip"] = make_zip_entry(scorm_file, zipinfo)
+            index[zipinfo.filename] = entry
+
+        scorm_file.seek(0)
+        content = File(scorm_file, name=PACKAGE_FILENAME)
+        content.size = package_size
+        package_path = get_package_zip_path(scorm_path)
+        default_storage.delete(package_path)
+        default_storage.save(package_path, content)
+        if progress:
+            progress.advance(package_size)
+
+        save_package_index(scorm_path, index, package=PACKAGE_FILENAME)
+        for zipinfo in members:
+            if zipinfo.filename == MANIFEST_FILENAME:
+                save_zip_member_with_retry(zipfile_obj, zipinfo, scorm_path, lock)
+
+
+def extract_scorm_package_once(asset_key, md5, progress=None, wait=None):
+    """
+    Extracts the SCORM package to the default storage if needed, making
+    sure that concurrent callers don't extract the same package in parallel:
+    the first caller acquires a lock and extracts the package, while the others
+    wait up to `wait` seconds (by default `SCORM_EXTRACTION_LOCK_WAIT`) for
+    the extraction to complete, then give up raising
+    ScormPackageExtractionInProgressException.
+    With `SCORM_STORAGE_MODE = "zip"` the package is stored as a zip instead.
+    """
+    scorm_path = get_scorm_path(md5)
+    manifest_path = os.path.join(scorm_path, MANIFEST_FILENAME)
+    if wait is None:
+        wait = settings.SCORM_EXTRACTION_LOCK_WAIT
+    deadline = time.monotonic() + wait
+    # The process local marker may outlive a package deleted by
+    # `scorm_gc_packages`
+    while not is_package_extracted(md5, local=False):
+        token = acquire_extraction_lock(md5)
+        if token:
+            try:
+                if not default_storage.exists(manifest_path):
+                    with span(
+                        "package_extraction", {"mode": settings.SCORM_STORAGE_MODE}
+                    ), spool_scorm_package(asset_key) as scorm_file:
+                        if settings.SCORM_STORAGE_MODE == ZIP_STORAGE_MODE:
+                            store_scorm_package(scorm_file, scorm_path, progress)
+                        else:
+                            extract_scorm_package(scorm_file, scorm_path, progress)
+                if default_storage.exists(manifest_path):
+                    mark_package_extracted(md5)
+            finally:
+                release_extraction_lock(md5, token)
+            break
+        if time.monotonic() >= deadline:
+            raise ScormPackageExtractionInProgressException(
+                'SCORM package "{}" is being extracted'.format(md5)
+            )
+        time.sleep(settings.SCORM_EXTRACTION_LOCK_POLL_INTERVAL)
+    return scorm_path
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Index of the files of an extracted SCORM package.
+
+The index maps the path of every file of a package to its size, modification
+time, content type, sha256, precompressed variants and whether the file is
+saved in the content addressed blob store, and is written to the default storage at
+extraction time, next to the package directory. It lets the serve view answer
+404s and build response headers without any storage round-trip.
+"""
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import LRUCache, make_cache_key
+
+
+INDEX_FILENAME = "index.json"
+BLOBS_STORAGE_MODE = "blobs"
+BLOBS_DIRNAME = "_blobs"
+INDEX_VERSION = 1
+# Encodings of precompressed variants, by order of preference
+PRECOMPRESSED_ENCODINGS = ("br", "gzip")
+
+# Lifetime in seconds of the "no index" marker of packages extracted before
+# indexes were introduced
+MISSING_INDEX_TIMEOUT = 60
+
+package_indexes = LRUCache(settings.SCORM_INDEX_LRU_SIZE)
+
+
+def get_meta_path(scorm_path):
+    """
+    Path in the default storage of the metadata of the package extracted to
+    `scorm_path`. It's a sibling of the package directory so that it isn't
+    served along with the package files.
+    """
+    return "{}.meta".format(scorm_path)
+
+
+def get_index_path(md5):
+    return os.path.join(
+        get_meta_path(os.path.join(settings.STORAGE_SCORM_PATH, md5)), INDEX_FILENAME
+    )
+
+
+def get_blob_path(sha256):
+    """
+    Path in the default storage of a blob of the content addressed blob
+    store, shared by all the packages containing the same file
+    """
+    return os.path.join(settings.STORAGE_SCORM_PATH, BLOBS_DIRNAME, sha256[:2], sha256)
+
+
+def get_variant_path(scorm_path, encoding, path):
+    """
+    Path in the default storage of the precompressed variant of a package file
+    """
+    return os.path.join(get_meta_path(scorm_path), encoding, path)
+
+
+# Content types of files which are themselves compressed, e.g. "data.json.gz".
+# They must be served as is, without a Content-Encoding header, otherwise
+# browsers would decompress them.
+COMPRESSED_CONTENT_TYPES = {
+    "gzip": "application/gzip",
+    "bzip2": "application/x-bzip2",
+    "xz": "application/x-xz",
+    "br": "application/x-brotli",
+    "compress": "application/x-compress",
+}
+
+
+def guess_content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding:
+        return COMPRESSED_CONTENT_TYPES.get(encoding, "application/octet-stream")
+    return content_type or "application/octet-stream"
+
+
+def make_index_entry(size, mtime, sha256, filename, encodings=None):
+    """
+    `encodings` maps the encodings of the precompressed variants of the
+    file, if any, to their size
+    """
+    entry = {
+        "size": size,
+        "mtime": int(mtime),
+        "content_type": guess_content_type(filename),
+        "sha256": sha256,
+    }
+    if encodings:
+        entry["encodings"] = encodings
+    return entry
+
+
+def save_package_index(scorm_path, files, package=None):
+    """
+    Saves the index of the package extracted to `scorm_path`, where `files`
+    maps file paths relative to the package directory to index entries.
+    `package` is the name of the package zip, for packages stored in
+    zip-direct mode.
+    """
+    index_path = os.path.join(get_meta_path(scorm_path), INDEX_FILENAME)
+    index = {"version": INDEX_VERSION, "files": files}
+    if package:
+        index["package"] = package
+    # Don't let storages which don't overwrite files save it under another name
+    default_storage.delete(index_path)
+    default_storage.save(index_path, ContentFile(json.dumps(index).encode("utf-8")))
+    # Forget any "no index" marker stored while the package was being extracted
+    cache.delete(make_cache_key("index", os.path.basename(scorm_path)))
+    return index
+
+
+def read_package_index(md5):
+    """
+    Reads the index of a package from the default storage, returning an
+    empty dict if the package has no index
+    """
+    try:
+        with default_storage.open(get_index_path(md5)) as index_file:
+            return json.loads(index_file.read().decode("utf-8"))
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def get_package_index(md5):
+    """
+    Returns the index of the package identified by `md5`, or None if the
+    package was extracted without an index.
+    The process local cache is checked first, then the Django cache, then
+    the default storage.
+    """
+    index = package_indexes.get(md5)
+    if index is not None:
+        return index
+    cache_key = make_cache_key("index", md5)
+    index = cache.get(cache_key)
+    if index is None:
+        index = read_package_index(md5)
+        cache.set(
+            cache_key,
+            index,
+            settings.SCORM_INDEX_TIMEOUT if index else MISSING_INDEX_TIMEOUT,
+        )
+    if not index:
+        return None
+    package_indexes.set(md5, index)
+    return index
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+
+from abstract_scorm_xblock.export import (
+    CSV_FORMAT,
+    DEFAULT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    iter_export,
+)
+
+
+class Command(BaseCommand):
+    """
+    Exports the SCORM runtime data (statuses, scores, session time and
+    interactions) of all the learners of a course, as CSV with one row per
+    interaction, or as JSON lines with one line per learner and XBlock.
+    """
+
+    help = "Exports the SCORM runtime data of the learners of a course"
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", help="Course to export")
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default=CSV_FORMAT,
+            help="Export format (default csv)",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write the export to (default the standard output)",
+        )
+        parser.add_argument(
+            "--category",
+            action="append",
+            help=(
+                "Category of the SCORM XBlocks, can be repeated for XBlocks "
+                "extending AbstractScormXBlock (default abstract_scorm_xblock)"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of user states fetched at once (default 1000)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            course_key = CourseKey.from_string(options["course_id"])
+        except InvalidKeyError:
+            raise CommandError("Invalid course id: {}".format(options["course_id"]))
+        lines = iter_export(
+            course_key,
+            options["category"] or ["abstract_scorm_xblock"],
+            options["format"],
+            options["batch_size"],
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            output.writelines(lines)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from abstract_scorm_xblock.cache import is_blob_in_use
+from abstract_scorm_xblock.index import BLOBS_DIRNAME, read_package_index
+
+
+class Command(BaseCommand):
+    """
+    Mark and sweep garbage collector of the SCORM blob store: blobs which
+    are not referenced by any package index are deleted, unless they are
+    used by an extraction in progress.
+    """
+
+    help = "Deletes the blobs of the SCORM blob store not used by any package"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the blobs which would be deleted",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=int,
+            default=60 * 60 * 24,
+            help=(
+                "Blobs more recent than this number of seconds are kept, since "
+                "they can belong to a package being extracted (default one day)"
+            ),
+        )
+
+    def get_referenced_blobs(self):
+        referenced = set()
+        if not default_storage.exists(settings.STORAGE_SCORM_PATH):
+            return referenced
+        directories, _ = default_storage.listdir(settings.STORAGE_SCORM_PATH)
+        for directory in directories:
+            md5, extension = os.path.splitext(directory)
+            if extension != ".meta":
+                continue
+            index = read_package_index(md5)
+            referenced.update(
+                entry["sha256"]
+                for entry in index.get("files", {}).values()
+                if entry.get("blob")
+            )
+        return referenced
+
+    def iter_blobs(self):
+        blobs_path = os.path.join(settings.STORAGE_SCORM_PATH, BLOBS_DIRNAME)
+        if not default_storage.exists(blobs_path):
+            return
+        prefixes, _ = default_storage.listdir(blobs_path)
+        for prefix in prefixes:
+            _, names = default_storage.listdir(os.path.join(blobs_path, prefix))
+            for name in names:
+                yield name, os.path.join(blobs_path, prefix, name)
+
+    def handle(self, *args, **options):
+        referenced = self.get_referenced_blobs()
+        cutoff = timezone.now() - datetime.timedelta(seconds=options["grace_period"])
+        deleted = deleted_size = kept = 0
+        for name, path in self.iter_blobs():
+            if (
+                name in referenced
+                or default_storage.get_modified_time(path) > cutoff
+                or is_blob_in_use(name)
+            ):
+                kept += 1
+                continue
+            deleted += 1
+            deleted_size += default_storage.size(path)
+            if options["dry_run"]:
+                self.stdout.write("Would delete {}".format(path))
+            else:
+                default_storage.delete(path)
+        self.stdout.write(
+            "{} {} unreferenced blobs ({} bytes), kept {} blobs".format(
+                "Would delete" if options["dry_run"] else "Deleted",
+                deleted,
+                deleted_size,
+                kept,
+            )
+        )
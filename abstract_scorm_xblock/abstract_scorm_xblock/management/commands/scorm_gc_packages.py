@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import datetime
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from xmodule.modulestore import ModuleStoreEnum
+from xmodule.modulestore.django import modulestore
+
+from abstract_scorm_xblock.cache import (
+    acquire_extraction_lock,
+    make_cache_key,
+    release_extraction_lock,
+    unmark_package_extracted,
+)
+from abstract_scorm_xblock.extraction import MANIFEST_FILENAME
+from abstract_scorm_xblock.index import get_meta_path
+from abstract_scorm_xblock.scormxblock import MD5_RE, SCORM_URL_MD5_RE
+
+
+class Command(BaseCommand):
+    """
+    Deletes the extracted SCORM packages which are not used by any SCORM
+    XBlock, in the draft or published version of any course.
+    Files of packages saved in the blob store are left to `scorm_gc_blobs`,
+    which should be run afterwards.
+    """
+
+    help = "Deletes the extracted SCORM packages not used by any course"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the packages which would be deleted",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=int,
+            default=60 * 60 * 24 * 7,
+            help=(
+                "Packages extracted less than this number of seconds ago are "
+                "kept, since they can be about to be used (default one week)"
+            ),
+        )
+        parser.add_argument(
+            "--category",
+            action="append",
+            help=(
+                "Category of the SCORM XBlocks, can be repeated for XBlocks "
+                "extending AbstractScormXBlock (default abstract_scorm_xblock)"
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of threads deleting files (default 8)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of files submitted to the threads at once (default 1000)",
+        )
+
+    def iter_used_md5s(self, categories):
+        """
+        Streams the md5 of the packages used by the draft and published
+        versions of the SCORM XBlocks of all courses, course by course
+        """
+        store = modulestore()
+        for course_summary in store.get_course_summaries():
+            course_key = course_summary.id
+            for branch in [
+                ModuleStoreEnum.Branch.draft_preferred,
+                ModuleStoreEnum.Branch.published_only,
+            ]:
+                with store.branch_setting(branch, course_key):
+                    for category in categories:
+                        for block in store.get_items(
+                            course_key, qualifiers={"category": category}
+                        ):
+                            match = SCORM_URL_MD5_RE.search(block._scorm_url or "")
+                            if match:
+                                yield match.group("md5")
+
+    def get_extracted_md5s(self):
+        if not default_storage.exists(settings.STORAGE_SCORM_PATH):
+            return set()
+        directories, _ = default_storage.listdir(settings.STORAGE_SCORM_PATH)
+        return {
+            os.path.splitext(directory)[0]
+            for directory in directories
+            if MD5_RE.match(os.path.splitext(directory)[0])
+        }
+
+    def iter_files(self, path):
+        if not default_storage.exists(path):
+            return
+        directories, files = default_storage.listdir(path)
+        for name in files:
+            yield os.path.join(path, name)
+        for name in directories:
+            yield from self.iter_files(os.path.join(path, name))
+
+    def delete_file(self, path, dry_run):
+        size = default_storage.size(path)
+        if not dry_run:
+            default_storage.delete(path)
+        return size
+
+    def delete_files(self, executor, paths, batch_size, dry_run):
+        """
+        Deletes `paths` in batches of `batch_size` files, returning the
+        number of files and bytes deleted
+        """
+        count = size = 0
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) == batch_size:
+                sizes = list(
+                    executor.map(self.delete_file, batch, [dry_run] * len(batch))
+                )
+                count, size, batch = count + len(sizes), size + sum(sizes), []
+        if batch:
+            sizes = list(executor.map(self.delete_file, batch, [dry_run] * len(batch)))
+            count, size = count + len(sizes), size + sum(sizes)
+        return count, size
+
+    def delete_package(self, md5, cutoff, executor, options):
+        """
+        Deletes the files of an extracted package, unless it was extracted
+        after `cutoff`. Returns the number of files and bytes deleted.
+        Packages without manifest are leftovers of failed extractions, and
+        are always deleted.
+        """
+        dry_run = options["dry_run"]
+        scorm_path = os.path.join(settings.STORAGE_SCORM_PATH, md5)
+        manifest_path = os.path.join(scorm_path, MANIFEST_FILENAME)
+        if (
+            default_storage.exists(manifest_path)
+            and default_storage.get_modified_time(manifest_path) > cutoff
+        ):
+            return None
+        if not dry_run:
+            unmark_package_extracted(md5)
+            cache.delete_many(
+                [make_cache_key("index", md5), make_cache_key("manifest", md5)]
+            )
+        # The manifest goes last: an interrupted run leaves a package which
+        # still looks extracted, and is collected by the next run
+        paths = itertools.chain(
+            self.iter_files(get_meta_path(scorm_path)),
+            (path for path in self.iter_files(scorm_path) if path != manifest_path),
+            [manifest_path] if default_storage.exists(manifest_path) else [],
+        )
+        return self.delete_files(executor, paths, options["batch_size"], dry_run)
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        categories = options["category"] or ["abstract_scorm_xblock"]
+        extracted = self.get_extracted_md5s()
+        unused = extracted - set(self.iter_used_md5s(categories))
+        cutoff = timezone.now() - datetime.timedelta(seconds=options["grace_period"])
+
+        deleted = deleted_files = deleted_size = 0
+        with ThreadPoolExecutor(options["workers"]) as executor:
+            for md5 in sorted(unused):
+                # Skip packages being extracted, and don't let them be
+                # extracted again while they are deleted
+                token = acquire_extraction_lock(md5)
+                if not token:
+                    continue
+                try:
+                    result = self.delete_package(md5, cutoff, executor, options)
+                finally:
+                    release_extraction_lock(md5, token)
+                if not result or not result[0]:
+                    continue
+                count, size = result
+                self.stdout.write(
+                    "{} {} ({} files, {} bytes)".format(
+                        "Would delete" if dry_run else "Deleted",
+                        md5,
+                        count,
+                        size,
+                    )
+                )
+                deleted += 1
+                deleted_files += count
+                deleted_size += size
+
+        self.stdout.write(
+            "{} {} unused packages of {} ({} files, {} bytes)".format(
+                "Would delete" if dry_run else "Deleted",
+                deleted,
+                len(extracted),
+                deleted_files,
+                deleted_size,
+            )
+        )
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import UsageKey
+
+from abstract_scorm_xblock.rescore import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_WORKERS,
+    LMSRescoreRuntime,
+    rescore_block,
+    reset_rescore_progress,
+)
+
+
+class Command(BaseCommand):
+    """
+    Publishes again the grades of all the learners of SCORM XBlocks, e.g.
+    after their weight changed. Interrupted rescores are resumed by running
+    the command again.
+    """
+
+    help = "Rescores all the learners of SCORM XBlocks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("usage_ids", nargs="+", help="XBlocks to rescore")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=DEFAULT_WORKERS,
+            help="Number of threads publishing grades (default 4)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of user states fetched at once (default 500)",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=50,
+            help="Maximum number of grades published per second, 0 for no limit "
+            "(default 50)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Publish the grades which didn't change too",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start over rescores which were interrupted",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usage_keys = [
+                UsageKey.from_string(usage_id) for usage_id in options["usage_ids"]
+            ]
+        except InvalidKeyError as e:
+            raise CommandError("Invalid usage id: {}".format(e))
+        runtime = LMSRescoreRuntime()
+        for usage_key in usage_keys:
+            if options["restart"]:
+                reset_rescore_progress(usage_key)
+            progress = rescore_block(
+                usage_key,
+                runtime,
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                rate=options["rate"],
+                force=options["force"],
+            )
+            self.stdout.write(
+                "{}: published {} grades, skipped {} learners".format(
+                    usage_key, progress["published"], progress["skipped"]
+                )
+            )
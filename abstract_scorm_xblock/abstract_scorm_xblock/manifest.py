@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Model of the `imsmanifest.xml` of a SCORM package.
+
+The manifest is parsed once per package md5 into a dict holding everything
+the XBlock needs, which is cached in the process memory, in the Django cache
+and in the default storage as JSON, next to the package directory.
+"""
+import json
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from lxml import etree
+
+from .cache import LRUCache, make_cache_key
+from .exceptions import ScormManifestNotFoundException
+from .extraction import MANIFEST_FILENAME, get_scorm_path
+from .index import get_meta_path
+
+
+MANIFEST_JSON_FILENAME = "manifest.json"
+MANIFEST_MODEL_VERSION = 2
+XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+
+manifest_models = LRUCache(settings.SCORM_MANIFEST_LRU_SIZE)
+
+
+def get_local_name(name):
+    return etree.QName(name).localname
+
+
+def get_child_text(element, name):
+    child = element.find("{*}" + name)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip()
+
+
+def get_scorm_type(resource):
+    """
+    Returns the `adlcp:scormtype` (SCORM 1.2) or `adlcp:scormType`
+    (SCORM 2004) attribute of a resource
+    """
+    for name, value in resource.attrib.items():
+        if get_local_name(name).lower() == "scormtype":
+            return value.lower()
+    return None
+
+
+def parse_items(parent):
+    return [
+        {
+            "identifier": item.get("identifier"),
+            "title": get_child_text(item, "title"),
+            "resource": item.get("identifierref"),
+            "parameters": item.get("parameters"),
+            "items": parse_items(item),
+        }
+        for item in parent.iterfind("{*}item")
+    ]
+
+
+def iter_items(items):
+    for item in items:
+        yield item
+        yield from iter_items(item["items"])
+
+
+def parse_manifest(data):
+    """
+    Parses the content of a manifest into a dict, with:
+
+    * `schema_version`: the SCORM version, as found in the metadata;
+    * `organizations` and their tree of `items`, pointing to resources;
+    * `default_organization`: the identifier of the default organization;
+    * `resources`, with their `identifier`, `type`, `scorm_type` and `href`;
+    * `scos`: identifiers of the resources which are SCOs;
+    * `launch_href`: the href of the resource to launch by default, i.e. the
+      first resource of the default organization, falling back to the first
+      resource having an href;
+    * `launch_parameters`: the `parameters` of the item of the default
+      organization launching `launch_href`, to add to its URL.
+
+    Invalid manifests give an empty model.
+    """
+    model = {
+        "version": MANIFEST_MODEL_VERSION,
+        "schema_version": None,
+        "default_organization": None,
+        "organizations": [],
+        "resources": [],
+        "scos": [],
+        "launch_href": None,
+        "launch_parameters": None,
+    }
+    try:
+        root = etree.fromstring(data)
+    except (etree.XMLSyntaxError, ValueError):
+        return model
+
+    schema_version = root.find(".//{*}schemaversion")
+    if schema_version is not None and schema_version.text:
+        model["schema_version"] = schema_version.text.strip()
+
+    for resource in root.iterfind(".//{*}resources/{*}resource"):
+        href = resource.get("href")
+        # Resources can be relative to the xml:base of their parents
+        base = (resource.getparent().get(XML_BASE) or "") + (
+            resource.get(XML_BASE) or ""
+        )
+        if href and base:
+            href = posixpath.join(base, href)
+        model["resources"].append(
+            {
+                "identifier": resource.get("identifier"),
+                "type": resource.get("type"),
+                "scorm_type": get_scorm_type(resource),
+                "href": href,
+            }
+        )
+    model["scos"] = [
+        resource["identifier"]
+        for resource in model["resources"]
+        if resource["scorm_type"] == "sco"
+    ]
+
+    organizations = root.find("{*}organizations")
+    if organizations is not None:
+        model["default_organization"] = organizations.get("default")
+        model["organizations"] = [
+            {
+                "identifier": organization.get("identifier"),
+                "title": get_child_text(organization, "title"),
+                "items": parse_items(organization),
+            }
+            for organization in organizations.iterfind("{*}organization")
+        ]
+
+    model["launch_href"], model["launch_parameters"] = get_launch(model)
+    return model
+
+
+def get_launch(model):
+    """
+    Returns the href of the resource to launch by default and the parameters
+    of the item launching it
+    """
+    hrefs = {
+        resource["identifier"]: resource["href"]
+        for resource in model["resources"]
+        if resource["href"]
+    }
+    organizations = sorted(
+        model["organizations"],
+        key=lambda organization: (
+            organization["identifier"] != model["default_organization"]
+        ),
+    )
+    for organization in organizations:
+        for item in iter_items(organization["items"]):
+            if item["resource"] in hrefs:
+                return hrefs[item["resource"]], item["parameters"]
+    for resource in model["resources"]:
+        if resource["href"]:
+            return resource["href"], None
+    return None, None
+
+
+def add_launch_parameters(url, parameters):
+    """
+    Adds the `parameters` of a manifest item to the URL of its resource,
+    following the SCORM content packaging rules
+    """
+    if not parameters:
+        return url
+    if parameters.startswith("#"):
+        # Only one fragment is allowed
+        return url if "#" in url else url + parameters
+    parameters = parameters.lstrip("?&")
+    if not parameters:
+        return url
+    return url + ("&" if "?" in url else "?") + parameters
+
+
+def get_manifest_json_path(md5):
+    return os.path.join(get_meta_path(get_scorm_path(md5)), MANIFEST_JSON_FILENAME)
+
+
+def read_manifest_model(md5):
+    """
+    Reads the manifest model from the default storage, parsing the manifest
+    and saving the model the first time
+    """
+    json_path = get_manifest_json_path(md5)
+    try:
+        with default_storage.open(json_path) as json_file:
+            model = json.loads(json_file.read().decode("utf-8"))
+    except (IOError, OSError, ValueError):
+        pass
+    else:
+        if model.get("version") == MANIFEST_MODEL_VERSION:
+            return model
+        # Saved by a previous version: parse the manifest again
+        default_storage.delete(json_path)
+
+    manifest_path = os.path.join(get_scorm_path(md5), MANIFEST_FILENAME)
+    try:
+        with default_storage.open(manifest_path) as manifest_file:
+            model = parse_manifest(manifest_file.read())
+    except (IOError, OSError):
+        raise ScormManifestNotFoundException(
+            'Scorm manifest "{}" not found'.format(manifest_path)
+        )
+    default_storage.save(json_path, ContentFile(json.dumps(model).encode("utf-8")))
+    return model
+
+
+def get_manifest_model(md5):
+    """
+    Returns the model of the manifest of the extracted package identified
+    by `md5`. The process local cache is checked first, then the Django
+    cache, then the default storage. Raises ScormManifestNotFoundException
+    if the package has no manifest.
+    """
+    model = manifest_models.get(md5)
+    if model is not None:
+        return model
+    cache_key = make_cache_key("manifest", md5)
+    model = cache.get(cache_key)
+    if model is None or model.get("version") != MANIFEST_MODEL_VERSION:
+        model = read_manifest_model(md5)
+        cache.set(cache_key, model, settings.SCORM_INDEX_TIMEOUT)
+    manifest_models.set(md5, model)
+    return model
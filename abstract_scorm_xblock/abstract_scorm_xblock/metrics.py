@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the XBlock handlers, package extraction and file serving.
+
+Counters and histograms are sent to the exporter selected by
+`SCORM_METRICS_EXPORTER`, and the duration of each phase wrapped in `span`
+is observed as a `<name>_seconds` histogram. When `SCORM_METRICS_TRACING` is
+set and OpenTelemetry is installed, phases are traced as spans too.
+With the default "noop" exporter and tracing disabled nothing is measured.
+"""
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+
+METRIC_PREFIX = "scorm_"
+
+
+class NoopExporter(object):
+    def increment(self, name, value=1, tags=None):
+        pass
+
+    def observe(self, name, value, tags=None):
+        pass
+
+
+class PrometheusExporter(object):
+    """
+    Registers the metrics in a `prometheus_client` registry, the default one
+    unless another is given, which the LMS has to expose
+    """
+
+    def __init__(self, registry=None):
+        if prometheus_client is None:
+            raise ImproperlyConfigured(
+                "The prometheus metrics exporter requires prometheus_client"
+            )
+        self.registry = registry or prometheus_client.REGISTRY
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get_metric(self, metric_class, name, tags):
+        key = (metric_class, name)
+        with self.lock:
+            if key not in self.metrics:
+                self.metrics[key] = metric_class(
+                    METRIC_PREFIX + name,
+                    name.replace("_", " ").capitalize(),
+                    sorted(tags or {}),
+                    registry=self.registry,
+                )
+        metric = self.metrics[key]
+        return metric.labels(**tags) if tags else metric
+
+    def increment(self, name, value=1, tags=None):
+        self.get_metric(prometheus_client.Counter, name, tags).inc(value)
+
+    def observe(self, name, value, tags=None):
+        self.get_metric(prometheus_client.Histogram, name, tags).observe(value)
+
+
+class StatsdExporter(object):
+    """
+    Sends the metrics over UDP to the statsd server at
+    `SCORM_METRICS_STATSD_HOST`:`SCORM_METRICS_STATSD_PORT`, with DogStatsD
+    tags. Histograms are sent as DogStatsD histograms.
+    """
+
+    def __init__(self):
+        self.address = (
+            settings.SCORM_METRICS_STATSD_HOST,
+            settings.SCORM_METRICS_STATSD_PORT,
+        )
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name, value, metric_type, tags):
+        line = "{}{}:{}|{}".format(METRIC_PREFIX, name, value, metric_type)
+        if tags:
+            line += "|#" + ",".join(
+                "{}:{}".format(key, value) for key, value in sorted(tags.items())
+            )
+        try:
+            self.socket.sendto(line.encode("utf-8"), self.address)
+        except OSError:
+            # Metrics must never break requests
+            pass
+
+    def increment(self, name, value=1, tags=None):
+        self.send(name, value, "c", tags)
+
+    def observe(self, name, value, tags=None):
+        self.send(name, value, "h", tags)
+
+
+class RecordingExporter(object):
+    """
+    Keeps the metrics in memory, so that they can be asserted in tests
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.observations = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def get_key(self, name, tags):
+        return name, tuple(sorted((tags or {}).items()))
+
+    def increment(self, name, value=1, tags=None):
+        with self.lock:
+            self.counters[self.get_key(name, tags)] += value
+
+    def observe(self, name, value, tags=None):
+        with self.lock:
+            self.observations[self.get_key(name, tags)].append(value)
+
+    def get_count(self, name, **tags):
+        return self.counters[self.get_key(name, tags)]
+
+    def get_observations(self, name, **tags):
+        return self.observations[self.get_key(name, tags)]
+
+
+EXPORTERS = {
+    "noop": NoopExporter,
+    "prometheus": PrometheusExporter,
+    "statsd": StatsdExporter,
+    "test": RecordingExporter,
+}
+
+_exporter = None
+
+
+def get_exporter():
+    """
+    Returns the exporter selected by `SCORM_METRICS_EXPORTER`, which can be
+    the name of one of the exporters above or the dotted path of a custom one
+    """
+    global _exporter
+    if _exporter is None:
+        name = settings.SCORM_METRICS_EXPORTER or "noop"
+        exporter_class = EXPORTERS.get(name) or import_string(name)
+        _exporter = exporter_class()
+    return _exporter
+
+
+def set_exporter(exporter):
+    """
+    Replaces the exporter, e.g. with a RecordingExporter in tests. None
+    selects again the exporter of `SCORM_METRICS_EXPORTER`.
+    """
+    global _exporter
+    _exporter = exporter
+
+
+def increment(name, value=1, tags=None):
+    get_exporter().increment(name, value, tags)
+
+
+def observe(name, value, tags=None):
+    get_exporter().observe(name, value, tags)
+
+
+@contextmanager
+def span(name, tags=None):
+    """
+    Observes the duration of the wrapped phase, and traces it if tracing is
+    enabled. Can be used as a decorator too.
+    """
+    exporter = get_exporter()
+    tracing = settings.SCORM_METRICS_TRACING and trace is not None
+    if isinstance(exporter, NoopExporter) and not tracing:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        if tracing:
+            with trace.get_tracer(__name__).start_as_current_span(
+                METRIC_PREFIX + name, attributes=tags
+            ):
+                yield
+        else:
+            yield
+    finally:
+        exporter.observe(name + "_seconds", time.perf_counter() - start, tags)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk rescoring of SCORM XBlocks.
+
+The grades of all the learners of a block are recomputed from their stored
+user state, e.g. after a weight change, and published again when they
+changed. User states are fetched in batches using keyset pagination, and each
+batch is split in chunks rescored by a pool of threads. Publications are rate
+limited so that the grades pipeline isn't flooded, and the progress is saved
+in the Django cache after each batch, so that an interrupted rescore resumes
+where it stopped. The progress is deleted once the rescore is done.
+
+The grades published are saved as the `_published_grade` of the learners, so
+that the next rescore and the next interactions of the learners with the
+XBlock only publish the grades which changed since.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+
+from .cache import make_cache_key
+from .scormxblock import is_graded
+
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 4
+# Lifetime in seconds of the rescore progress in the Django cache
+PROGRESS_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class LMSRescoreRuntime(object):
+    """
+    Access to the blocks, user states and grades of the LMS
+    """
+
+    def get_block(self, usage_key):
+        from xmodule.modulestore.django import modulestore
+
+        return modulestore().get_item(usage_key)
+
+    def fetch_states(self, usage_key, after_id, batch_size):
+        """
+        Returns the next `batch_size` (id, user, state) user states of the
+        block, after the `after_id` one
+        """
+        # Only available in the LMS
+        from lms.djangoapps.courseware.models import StudentModule
+
+        return [
+            (module.id, module.student, json.loads(module.state or "{}"))
+            for module in StudentModule.objects.filter(
+                module_state_key=usage_key, id__gt=after_id
+            )
+            .select_related("student")
+            .order_by("id")[:batch_size]
+        ]
+
+    def publish_grade(self, block, user, grade):
+        from lms.djangoapps.grades.api import signals as grades_signals
+
+        grades_signals.SCORE_PUBLISHED.send(
+            sender=None,
+            block=block,
+            user=user,
+            raw_earned=grade["value"],
+            raw_possible=grade["max_value"],
+            only_if_higher=False,
+            score_deleted=False,
+        )
+
+    def save_published_grade(self, state_id, grade):
+        """
+        Saves `grade` as the last grade published in the `state_id` user
+        state, leaving the rest of the state as is
+        """
+        from lms.djangoapps.courseware.models import StudentModule
+
+        with transaction.atomic():
+            module = StudentModule.objects.select_for_update().get(id=state_id)
+            state = json.loads(module.state or "{}")
+            state["_published_grade"] = grade
+            module.state = json.dumps(state)
+            module.save()
+
+
+class RateLimiter(object):
+    """
+    Lets at most `rate` calls per second go through `wait`, across threads.
+    A `rate` of 0 means no limit.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = self.clock()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            self.sleep(delay)
+
+
+def get_progress_key(usage_key):
+    return make_cache_key("rescore", usage_key)
+
+
+def get_rescore_progress(usage_key):
+    return cache.get(get_progress_key(usage_key)) or {
+        "after_id": 0,
+        "published": 0,
+        "skipped": 0,
+        "done": False,
+    }
+
+
+def reset_rescore_progress(usage_key):
+    cache.delete(get_progress_key(usage_key))
+
+
+def iter_chunks(rows, count):
+    size = max(1, -(-len(rows) // count))
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def rescore_block(
+    usage_key,
+    runtime,
+    workers=DEFAULT_WORKERS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    rate=0,
+    force=False,
+):
+    """
+    Publishes the grades of the learners of the block identified by
+    `usage_key` which changed since they were last published, or all of
+    them if `force` is True. Returns the progress of the rescore, resuming
+    any previous interrupted rescore of the block.
+    """
+    progress = get_rescore_progress(usage_key)
+    block = runtime.get_block(usage_key)
+    if not block.has_score:
+        reset_rescore_progress(usage_key)
+        return progress
+    limiter = RateLimiter(rate)
+
+    def rescore_chunk(rows):
+        # Database connections are per thread: drop the ones which can't be
+        # reused, and close the others once done
+        close_old_connections()
+        try:
+            return rescore_rows(rows)
+        finally:
+            connections.close_all()
+
+    def rescore_rows(rows):
+        published = 0
+        for state_id, user, state in rows:
+            lesson_status = state.get("_lesson_status", "not attempted")
+            success_status = state.get("_success_status", "unknown")
+            published_grade = state.get("_published_grade")
+            if not published_grade and not is_graded(lesson_status, success_status):
+                continue
+            grade = block.compute_grade(
+                state.get("lesson_score", 0), lesson_status, success_status
+            )
+            if not force and grade == published_grade:
+                continue
+            limiter.wait()
+            runtime.publish_grade(block, user, grade)
+            runtime.save_published_grade(state_id, grade)
+            published += 1
+        return published
+
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            rows = runtime.fetch_states(usage_key, progress["after_id"], batch_size)
+            published = sum(executor.map(rescore_chunk, iter_chunks(rows, workers)))
+            progress["published"] += published
+            progress["skipped"] += len(rows) - published
+            if rows:
+                progress["after_id"] = rows[-1][0]
+            progress["done"] = len(rows) < batch_size
+            if progress["done"]:
+                reset_rescore_progress(usage_key)
+                return progress
+            cache.set(get_progress_key(usage_key), progress, PROGRESS_TIMEOUT)
@@ -1,31 +1,144 @@
 # -*- coding: utf-8 -*-
+import json
 import os
-import io
+import re
 import logging
-from zipfile import ZipFile
 
 from webob import Response
-from lxml import etree
 
 from django.conf import settings
 from django.urls import reverse
 from django.core.files.storage import default_storage
 
-from xmodule.contentstore.django import contentstore
 
 from xblock.core import XBlock
+from xblock.exceptions import JsonHandlerError
 from xblock.fields import Scope, String, Float, Boolean, Dict, Integer
 from xblock.fragment import Fragment
 from xblock.completable import CompletableXBlockMixin
 
 from .utils import gettext as _
-from .utils import resource_string, render_template
+from .utils import Counters, add_static_resource, render_template
+from .metrics import increment, span
+from .cache import get_extraction_status, is_package_extracted, mark_package_extracted
 from .constants import ScormVersions
-from .exceptions import ScormManifestNotFoundException, ScormPackageNotFoundException
+from .cmi import (
+    SCORM_2004_EDITION,
+    check_cmi_get,
+    check_cmi_set,
+    get_cmi_children,
+    get_error_code,
+    get_cmi_defaults,
+    get_cmi_model,
+    get_edition,
+)
+from .datamodel import get_cmi_value, iter_cmi_values, set_cmi_value
+from .export import CSV_FORMAT, EXPORT_FORMATS, count_student_modules, iter_export
+from .extraction import (
+    MANIFEST_FILENAME,
+    ExtractionProgress,
+    extract_scorm_package_once,
+    get_scorm_path,
+    search_scorm_package,
+)
+from .manifest import add_launch_parameters, get_manifest_model
+from .tasks import schedule_scorm_package_extraction, schedule_scorm_package_repair
+from .exceptions import (
+    ScormManifestNotFoundException,
+    ScormPackageExtractionInProgressException,
+    ScormPackageNotFoundException,
+    ScormValueDiscardedException,
+)
 
 
 logger = logging.getLogger(__name__)
 
+SCORM_URL_MD5_RE = re.compile(r"/(?P<md5>[a-f0-9]{32})/")
+MD5_RE = re.compile(r"^[a-f0-9]{32}$")
+
+# CMI elements which can trigger completion or grade events
+GRADING_ELEMENTS = {
+    "cmi.core.lesson_status",
+    "cmi.completion_status",
+    "cmi.success_status",
+    "cmi.core.score.raw",
+    "cmi.score.raw",
+    "cmi.score.scaled",
+    "cmi.progress_measure",
+}
+
+
+def is_graded(lesson_status, success_status):
+    """
+    Tells whether a learner reached a status which deserves a grade
+    """
+    return lesson_status in ["passed", "failed", "completed"] or success_status in [
+        "passed",
+        "failed",
+    ]
+
+
+def parse_cmi_values(values):
+    """
+    Returns the CMI values sent by the SCORM API as a dict, given a dict or a
+    list of (name, value) pairs. Raises JsonHandlerError for anything else.
+    """
+    if isinstance(values, dict):
+        return values
+    if isinstance(values, list) and all(
+        isinstance(pair, list) and len(pair) == 2 and isinstance(pair[0], str)
+        for pair in values
+    ):
+        return dict(values)
+    raise JsonHandlerError(400, "Invalid CMI values")
+
+
+def set_lesson_status(changes, value):
+    changes["lesson_status"] = value
+    if value in ["passed", "failed"]:
+        changes["success_status"] = value
+    elif value in ["completed", "incomplete"]:
+        changes["completion_status"] = value
+
+
+def set_raw_score(changes, value):
+    # SCORM 1.2 scores can be blank
+    if value != "":
+        changes["lesson_score"] = float(value) / 100
+
+
+# Readers of the CMI elements backed by XBlock fields
+CMI_FIELD_GETTERS = {
+    "cmi.core.lesson_status": lambda block: block._lesson_status,
+    "cmi.completion_status": lambda block: block._lesson_status,
+    "cmi.success_status": lambda block: block._success_status,
+    "cmi.core.score.raw": lambda block: block.lesson_score * 100,
+    "cmi.score.raw": lambda block: block.lesson_score * 100,
+    "cmi.score.scaled": lambda block: block.lesson_score,
+    "cmi._version": lambda block: "1.0",
+    "cmi.core.entry": lambda block: block.get_entry(),
+    "cmi.entry": lambda block: block.get_entry(),
+}
+
+# Writers of the CMI elements affecting the XBlock fields, which collect the
+# changes of a batch of values in a dict
+CMI_SETTERS = {
+    "cmi.core.lesson_status": set_lesson_status,
+    "cmi.completion_status": set_lesson_status,
+    "cmi.success_status": lambda changes, value: changes.update(success_status=value),
+    "cmi.core.score.raw": set_raw_score,
+    "cmi.score.raw": set_raw_score,
+    "cmi.score.scaled": lambda changes, value: changes.update(
+        lesson_score=max(float(value), 0)
+    ),
+    "cmi.progress_measure": lambda changes, value: changes.update(
+        completion_percent=float(value)
+    ),
+}
+
+# Counts the user state writes and events avoided because values didn't change
+runtime_stats = Counters("runtime_events")
+
 
 @XBlock.wants("user")
 class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
@@ -104,6 +217,9 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
     weight = Float(scope=Scope.settings, default=1)
     lesson_score = Float(scope=Scope.user_state, default=0)
     _scorm_url = String(scope=Scope.settings, default="")
+    # md5 of the package saved in Studio while being extracted in the
+    # background, which replaces the current one once extracted
+    _pending_scorm_md5 = String(scope=Scope.settings, default="")
     _scorm_version = String(
         scope=Scope.settings, default=ScormVersions["SCORM_12"].value
     )
@@ -127,6 +243,8 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
     * cmi.score.max (real (10,7), RW) Maximum value in the range for the raw score
     """
     _scorm_data = Dict(scope=Scope.user_state, default={})
+    # Last grade published, to avoid publishing the same grade again
+    _published_grade = Dict(scope=Scope.user_state, default={})
 
     @property
     def lesson_score_display(self):
@@ -138,24 +256,41 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
         # TODO: We should be able to display an error message
         # instead of trying to render an inexistent or problematic
         # SCORM package
+        preparing_content = False
+        scorm_version, scorm_url = self._scorm_version, self._scorm_url
         try:
-            self._ensure_scorm_package_is_extracted()
+            scorm_version, scorm_url = self._get_launch_settings()
         except ScormManifestNotFoundException as e:
             logger.warning(e)
         except ScormPackageNotFoundException as e:
             logger.warning(e)
+        except ScormPackageExtractionInProgressException as e:
+            logger.info(e)
+            preparing_content = True
 
         template = render_template(
             "static/html/scormxblock.html",
-            {"completion_status": self.get_lesson_status(), "scorm_xblock": self},
+            {
+                "completion_status": self.get_lesson_status(),
+                "preparing_content": preparing_content,
+                "scorm_xblock": self,
+                "export_url": self.runtime.handler_url(self, "export_scorm_data")
+                if getattr(self.runtime, "user_is_staff", False)
+                else None,
+            },
         )
         fragment = Fragment(template)
-        fragment.add_css(resource_string("static/css/scormxblock.css"))
-        fragment.add_javascript(resource_string("static/js/src/scormxblock.js"))
+        add_static_resource(fragment, "static/css/scormxblock.css")
+        add_static_resource(fragment, "static/js/src/scormxblock.js")
         js_settings = {
-            "scorm_version": self._scorm_version,
-            "scorm_url": self._scorm_url,
-            "scorm_data": self._scorm_data,
+            "commit_interval": settings.SCORM_COMMIT_INTERVAL,
+            "grade_publish_mode": settings.SCORM_GRADE_PUBLISH_MODE,
+            "scorm_version": scorm_version,
+            "scorm_url": scorm_url,
+            "cmi_data": self.get_cmi_data(),
+            "cmi_model": get_cmi_model(scorm_version),
+            "cmi_max_length": settings.SCORM_CMI_MAX_VALUE_LENGTH,
+            "preparing_content": preparing_content,
             "completion_status": self.get_lesson_status(),
             "scorm_xblock": {
                 "display_name": self.display_name,
@@ -174,11 +309,13 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
         # instead of trying to render an inexistent or problematic
         # SCORM package
         try:
-            self._ensure_scorm_package_is_extracted()
+            self._get_launch_settings()
         except ScormManifestNotFoundException as e:
             logger.warning(e)
         except ScormPackageNotFoundException as e:
             logger.warning(e)
+        except ScormPackageExtractionInProgressException as e:
+            logger.info(e)
 
         template = render_template(
             "static/html/studio.html",
@@ -197,8 +334,8 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
             },
         )
         fragment = Fragment(template)
-        fragment.add_css(resource_string("static/css/scormxblock.css"))
-        fragment.add_javascript(resource_string("static/js/src/studio.js"))
+        add_static_resource(fragment, "static/css/scormxblock.css")
+        add_static_resource(fragment, "static/js/src/studio.js")
         fragment.initialize_js("ScormStudioXBlock")
         return fragment
 
@@ -222,7 +359,20 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
         self.scorm_file = request.params.get("scorm_file")
 
         try:
-            self._save_scorm_package()
+            if settings.SCORM_ASYNC_EXTRACTION:
+                scorm_md5, status = self._save_scorm_package_async()
+                if status:
+                    return Response(
+                        json_body={
+                            "message": "SCORM package extraction in progress",
+                            "md5": scorm_md5,
+                            "status": status,
+                        },
+                        content_type="application/json",
+                        status=202,
+                    )
+            else:
+                self._save_scorm_package()
         except ScormManifestNotFoundException:
             return Response(
                 json_body={"field": "scorm_file", "message": "Invalid SCORM file"},
@@ -235,6 +385,15 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
                 content_type="application/json",
                 status=404,
             )
+        except ScormPackageExtractionInProgressException:
+            return Response(
+                json_body={
+                    "field": "scorm_file",
+                    "message": "SCORM package extraction in progress, please retry later",
+                },
+                content_type="application/json",
+                status=503,
+            )
 
         return Response(
             json_body={"message": "XBlock saved successfully !"},
@@ -242,25 +401,129 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
             status=200,
         )
 
+    @XBlock.json_handler
+    def scorm_extraction_status(self, data, suffix=""):
+        """
+        Reports the progress of a SCORM package background extraction
+        started by `studio_submit`. Once the extraction is done the XBlock
+        is updated with the package data.
+        """
+        md5 = data.get("md5") or ""
+        status = None
+        if MD5_RE.match(md5):
+            status = get_extraction_status(md5)
+        if not status:
+            return ExtractionProgress.make_status(
+                ExtractionProgress.FAILED, "SCORM package extraction not found"
+            )
+        if status["state"] == ExtractionProgress.DONE and self._get_scorm_md5() != md5:
+            try:
+                self._save_scorm_package()
+            except (ScormManifestNotFoundException, ScormPackageNotFoundException) as e:
+                status = ExtractionProgress.make_status(
+                    ExtractionProgress.FAILED, str(e)
+                )
+        return status
+
+    @XBlock.handler
+    def export_scorm_data(self, request, suffix=""):
+        """
+        Returns the SCORM runtime data of all the learners of the XBlocks of
+        this type in the course, for course staff.
+        The LMS buffers handler responses, so only courses with up to
+        `SCORM_EXPORT_HANDLER_MAX_ROWS` user states can be exported here:
+        bigger ones are exported with the `scorm_export` management command.
+        """
+        if not getattr(self.runtime, "user_is_staff", False):
+            return Response(status=403)
+        export_format = request.params.get("format", CSV_FORMAT)
+        if export_format not in EXPORT_FORMATS:
+            return Response(status=400)
+        course_id = self.runtime.course_id
+        categories = [self.scope_ids.block_type]
+        if count_student_modules(course_id, categories) > (
+            settings.SCORM_EXPORT_HANDLER_MAX_ROWS
+        ):
+            return Response(
+                status=413,
+                content_type="text/plain",
+                charset="utf-8",
+                body=_(
+                    "This course has too many learners to export their data "
+                    "from the LMS. Please ask your platform administrator to "
+                    'run "scorm_export {course_id}".'
+                )
+                .format(course_id=course_id)
+                .encode("utf-8"),
+            )
+        body = "".join(iter_export(course_id, categories, export_format))
+        return Response(
+            body=body.encode("utf-8"),
+            content_type=EXPORT_FORMATS[export_format],
+            charset="utf-8",
+            content_disposition='attachment; filename="scorm_data.{}"'.format(
+                export_format
+            ),
+        )
+
     def get_current_user_attributes(self, attribute):
         user = self.runtime.service(self, "user").get_current_user()
         return user.opt_attrs.get(attribute)
 
     @XBlock.json_handler
+    @span("handler", {"handler": "scorm_get_value"})
     def scorm_get_value(self, data, suffix=""):
+        """
+        Fallback for the CMI elements which are not part
+        of the data shipped with `student_view`
+        """
         name = data.get("name")
-        if name in ["cmi.core.lesson_status", "cmi.completion_status"]:
-            return {"value": self._lesson_status}
-        elif name == "cmi.success_status":
-            return {"value": self._success_status}
-        elif name in ["cmi.core.score.raw", "cmi.score.raw", "cmi.score.scaled"]:
-            return {"value": self.lesson_score * 100}
+        error = check_cmi_get(name, self.get_scorm_version())
+        if error:
+            return {"value": "", "error": error}
+        return {"value": self.get_value(name)}
+
+    def get_value(self, name):
+        if name in CMI_FIELD_GETTERS:
+            return CMI_FIELD_GETTERS[name](self)
         elif name in ["cmi.core.student_id", "cmi.learner_id"]:
-            return {"value": self.get_current_user_attributes("edx-platform.user_id")}
+            return self.get_current_user_attributes("edx-platform.user_id")
         elif name in ["cmi.core.student_name", "cmi.learner_name"]:
-            return {"value": self.get_current_user_attributes("edx-platform.username")}
+            return self.get_current_user_attributes("edx-platform.username")
+        elif name.endswith("._children"):
+            return get_cmi_children(name, self.get_scorm_version())
         else:
-            return {"value": self._scorm_data.get(name, "")}
+            return get_cmi_value(
+                self._scorm_data,
+                name,
+                get_cmi_defaults(self.get_scorm_version()).get(name, ""),
+            )
+
+    def get_entry(self):
+        # Learners resume the content where they left it
+        return "resume" if self._scorm_data else "ab-initio"
+
+    def get_cmi_data(self):
+        """
+        Snapshot of the CMI data model, which allows the SCORM API
+        to answer GetValue calls without requests to the LMS
+        """
+        cmi_data = dict(get_cmi_defaults(self.get_scorm_version()))
+        cmi_data.update(iter_cmi_values(self._scorm_data))
+        cmi_data.update(
+            {name: getter(self) for name, getter in CMI_FIELD_GETTERS.items()}
+        )
+        user_id = self.get_current_user_attributes("edx-platform.user_id")
+        username = self.get_current_user_attributes("edx-platform.username")
+        cmi_data.update(
+            {
+                "cmi.core.student_id": user_id,
+                "cmi.learner_id": user_id,
+                "cmi.core.student_name": username,
+                "cmi.learner_name": username,
+            }
+        )
+        return cmi_data
 
     def get_payload(
         self,
@@ -271,15 +534,27 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
     ):
         payload = {"result": "success"}
         if lesson_score:
-            self.lesson_score = lesson_score
+            if self.lesson_score != lesson_score:
+                self.lesson_score = lesson_score
+            else:
+                runtime_stats.increment("field_writes_skipped")
             if success_status in ["failed", "unknown"]:
                 lesson_score = 0
             else:
                 lesson_score = lesson_score * self.weight
             payload.update({"lesson_score": lesson_score})
 
+        if success_status:
+            if self._success_status != success_status:
+                self._success_status = success_status
+            else:
+                runtime_stats.increment("field_writes_skipped")
+
         if lesson_status:
-            self._lesson_status = lesson_status
+            if self._lesson_status != lesson_status:
+                self._lesson_status = lesson_status
+            else:
+                runtime_stats.increment("field_writes_skipped")
             payload.update({"completion_status": lesson_status})
 
         if completion_status:
@@ -289,35 +564,118 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
         return payload
 
     @XBlock.json_handler
+    @span("handler", {"handler": "scorm_set_value"})
     def scorm_set_value(self, data, suffix=""):
-        name = data.get("name")
-        value = data.get("value")
-
-        lesson_score = None
-        lesson_status = None
-        success_status = None
-        completion_status = None
-        completion_percent = None
-
-        self._scorm_data[name] = value
-
-        if name in ["cmi.core.lesson_status", "cmi.completion_status"]:
-            lesson_status = value
-            if lesson_status in ["passed", "failed"]:
-                success_status = lesson_status
-            elif lesson_status in ["completed", "incomplete"]:
-                completion_status = lesson_status
-        elif name == "cmi.success_status":
-            success_status = value
-        elif name == "cmi.completion_status":
-            completion_status = value
-        elif (
-            name in ["cmi.core.score.raw", "cmi.score.raw", "cmi.score.scaled"]
+        if not isinstance(data, dict) or not isinstance(data.get("name"), str):
+            raise JsonHandlerError(400, "Invalid CMI element")
+        return self.set_values({data["name"]: data.get("value")})
+
+    @XBlock.json_handler
+    @span("handler", {"handler": "scorm_commit"})
+    def scorm_commit(self, data, suffix=""):
+        """
+        Batched version of `scorm_set_value`: `values` is a dict of CMI
+        elements buffered by the SCORM API. `commit` tells whether the
+        content explicitly committed its data or terminated the session,
+        rather than the API flushing its buffer.
+        """
+        return self.commit(data)
+
+    @XBlock.handler
+    @span("handler", {"handler": "scorm_commit_beacon"})
+    def scorm_commit_beacon(self, request, suffix=""):
+        """
+        `scorm_commit` for the beacons sent by the SCORM API as a last resort
+        when the page is dismissed. Browsers can't add the CSRF token header
+        to beacons: the commit is sent as JSON in the `data` field of a form,
+        along with the `csrfmiddlewaretoken` field checked by the LMS.
+        """
+        if request.method != "POST":
+            return JsonHandlerError(405, "Method must be POST").get_response(
+                allow=["POST"]
+            )
+        try:
+            data = json.loads(request.POST["data"])
+        except (KeyError, ValueError):
+            return JsonHandlerError(400, "Invalid JSON").get_response()
+        try:
+            payload = self.commit(data)
+        except JsonHandlerError as e:
+            return e.get_response()
+        return Response(json_body=payload)
+
+    def commit(self, data):
+        """
+        Stores the values committed by the SCORM API, see `scorm_commit`.
+        Raises JsonHandlerError if the commit is malformed.
+        """
+        if not isinstance(data, dict):
+            raise JsonHandlerError(400, "Invalid commit")
+        payload = self.set_values(parse_cmi_values(data.get("values") or {}))
+        if (
+            data.get("commit")
+            and settings.SCORM_GRADE_PUBLISH_MODE == "commit"
             and self.has_score
+            and self._is_graded()
         ):
-            lesson_score = float(value) / 100
-        elif name == "cmi.progress_measure":
-            completion_percent = float(value)
+            self._publish_grade()
+        return payload
+
+    def set_values(self, values):
+        """
+        Stores the CMI elements in `values` and evaluates the resulting
+        completion and grade once for the whole batch.
+        Elements whose value didn't change are ignored: they don't cause any
+        user state write, completion or grade event.
+        Invalid values are rejected, and their error codes returned under
+        `errors`.
+        When `SCORM_GRADE_PUBLISH_MODE` is "commit" grades are published
+        only by `scorm_commit`.
+        """
+        changes = {}
+        errors = {}
+        scorm_version = self.get_scorm_version()
+
+        for name, value in values.items():
+            # The SCORM API only deals with strings
+            value = str(value)
+            error = check_cmi_set(
+                name, value, scorm_version, settings.SCORM_CMI_MAX_VALUE_LENGTH
+            )
+            if error:
+                errors[name] = error
+                continue
+            try:
+                changed = set_cmi_value(self._scorm_data, name, value)
+            except ScormValueDiscardedException as e:
+                logger.warning(e)
+                errors[name] = get_error_code("discarded", scorm_version)
+                continue
+            if not changed:
+                runtime_stats.increment("cmi_writes_skipped")
+                if name in GRADING_ELEMENTS:
+                    runtime_stats.increment("grade_events_skipped")
+                continue
+            if name in CMI_SETTERS:
+                CMI_SETTERS[name](changes, value)
+
+        if not self.has_score:
+            changes.pop("lesson_score", None)
+        completion_status = changes.get("completion_status")
+        completion_percent = changes.get("completion_percent")
+        success_status = changes.get("success_status")
+
+        # Update the XBlock fields before publishing, so that the grade
+        # takes into account a score sent in the same batch
+        payload = self.get_payload(
+            changes.get("lesson_score"),
+            changes.get("lesson_status"),
+            success_status,
+            completion_status,
+        )
+        if errors:
+            payload["errors"] = errors
+            increment("cmi_errors", len(errors))
 
         if completion_status == "completed":
             self.emit_completion(1)
@@ -325,15 +683,10 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
             self.emit_completion(completion_percent)
 
         if success_status or completion_status == "completed":
-            if self.has_score:
+            if self.has_score and settings.SCORM_GRADE_PUBLISH_MODE == "immediate":
                 self._publish_grade()
 
-        return self.get_payload(
-            lesson_score,
-            lesson_status,
-            success_status,
-            completion_status,
-        )
+        return payload
 
     def set_score(self, score):
         """
@@ -341,121 +694,213 @@ class AbstractScormXBlock(XBlock, CompletableXBlockMixin):
         """
         if self.has_score:
             self.lesson_score = score.raw_earned
-            self._publish_grade()
+            self._publish_grade(force=True)
             self.emit_completion(1)
 
-    def _publish_grade(self):
-        if self._lesson_status == "failed" or (
+    def _is_graded(self):
+        """
+        Tells whether the learner reached a status which deserves a grade
+        """
+        return is_graded(self._lesson_status, self._success_status)
+
+    def compute_grade(self, lesson_score, lesson_status, success_status):
+        """
+        Grade of a learner with the given user state, also used to rescore
+        learners in bulk
+        """
+        if lesson_status == "failed" or (
             self.scorm_file
-            and ScormVersions(self._scorm_version) > ScormVersions["SCORM_12"]
-            and self._success_status in ["failed", "unknown"]
+            and get_edition(self.get_scorm_version()) == SCORM_2004_EDITION
+            and success_status in ["failed", "unknown"]
         ):
-            self.runtime.publish(self, "grade", {"value": 0, "max_value": self.weight})
-        else:
-            self.runtime.publish(
-                self, "grade", {"value": self.lesson_score, "max_value": self.weight}
-            )
+            return {"value": 0, "max_value": self.weight}
+        return {"value": lesson_score, "max_value": self.weight}
+
+    def _publish_grade(self, force=False):
+        """
+        Publishes the learner grade, unless it's the same grade published last time
+        """
+        grade = self.compute_grade(
+            self.lesson_score, self._lesson_status, self._success_status
+        )
+        if not force and grade == self._published_grade:
+            runtime_stats.increment("grade_publications_skipped")
+            return
+        self.runtime.publish(self, "grade", grade)
+        self._published_grade = grade
 
     def get_lesson_status(self):
         lesson_status = self._lesson_status
         if (
             self.scorm_file
-            and ScormVersions(self._scorm_version) > ScormVersions["SCORM_12"]
+            and get_edition(self.get_scorm_version()) == SCORM_2004_EDITION
             and self._success_status != "unknown"
         ):
             lesson_status = self._success_status
         return lesson_status
 
-    def _read_scorm_manifest(self, scorm_path):
-        manifest_path = os.path.join(scorm_path, "imsmanifest.xml")
-        try:
-            return default_storage.open(manifest_path).read()
-        except IOError:
-            raise ScormManifestNotFoundException(
-                'Scorm manifest "{}" not found'.format(manifest_path)
-            )
-
-    def _update_scorm_url(self, scorm_md5):
+    def _get_scorm_url(self, scorm_md5, manifest):
+        scorm_index = self._get_scorm_index(manifest)
         # We can't load the scorm file directly from the default_storage URL
         # since it will be blocked by the SAMEORIGIN policy
-        self._scorm_url = reverse(
+        scorm_url = reverse(
             "abstract_scorm_xblock:scorm_serve",
-            kwargs={"md5": scorm_md5, "path": self.scorm_index},
+            kwargs={"md5": scorm_md5, "path": scorm_index},
         )
+        # The parameters of the launch item go to the query string, since
+        # they would be quoted as part of the path
+        if scorm_index == manifest["launch_href"]:
+            scorm_url = add_launch_parameters(scorm_url, manifest["launch_parameters"])
+        return scorm_url
 
-    def _update_scorm_index(self, manifest):
-        if not self.scorm_index:
-            try:
-                self.scorm_index = (
-                    etree.fromstring(manifest).find(".//{*}resource").get("href")
-                )
-            except (IOError, AttributeError):
-                self.scorm_index = "index.html"
+    def _get_scorm_index(self, manifest):
+        return self.scorm_index or manifest["launch_href"] or "index.html"
 
-    def _update_scorm_version(self, manifest):
-        try:
-            self._scorm_version = (
-                etree.fromstring(manifest).find(".//{*}schemaversion").text
-            )
-        except (IOError, AttributeError):
-            self._scorm_version = ScormVersions["SCORM_12"].value
+    def _get_scorm_version(self, manifest):
+        return manifest["schema_version"] or ScormVersions["SCORM_12"].value
 
     def _search_scorm_package(self):
-        scorm_content, count = contentstore().get_all_content_for_course(
-            self.runtime.course_id,
-            filter_params={"displayname": self.scorm_file},
-        )
-        zip_mimetypes = {"application/x-zip-compressed", "application/zip"}
-        if not count or scorm_content[0]["contentType"] not in zip_mimetypes:
-            raise ScormPackageNotFoundException(
-                'SCORM package "{}" not found'.format(self.scorm_file)
-            )
-        # Since course content names are unique we are sure that we
-        # can't have multiple results, so we just pop the first.
-        return scorm_content.pop()
+        return search_scorm_package(self.runtime.course_id, self.scorm_file)
 
     def _extract_scorm_package(self, scorm_package):
         """
-        Extracts the SCORM package to the default storage if needed
+        Extracts the SCORM package to the default storage if needed, or
+        stores its zip file as is if `SCORM_STORAGE_MODE` is "zip"
         """
-        scorm_path = os.path.join(settings.STORAGE_SCORM_PATH, scorm_package["md5"])
-
-        try:
-            self._read_scorm_manifest(scorm_path)
-        except ScormManifestNotFoundException:
-            # We are actually loading the whole zipfile in memory.
-            # This step should probably be handled more carefully.
-            scorm_zipfile_data = contentstore().find(scorm_package["asset_key"]).data
-            with ZipFile(io.BytesIO(scorm_zipfile_data)) as zipfile_obj:
-                # We can't save extracted files directly
-                # ZipFile does not provide a seek method till python 3.7
-                # https://bugs.python.org/issue22908
-                for filename in zipfile_obj.namelist():
-                    if filename.endswith("/"):
-                        continue
-                    default_storage.save(
-                        os.path.join(
-                            settings.STORAGE_SCORM_PATH, scorm_package["md5"], filename
-                        ),
-                        io.BytesIO(zipfile_obj.read(filename)),
-                    )
-        return scorm_path
+        return extract_scorm_package_once(
+            scorm_package["asset_key"], scorm_package["md5"]
+        )
 
     def _ensure_scorm_package_is_extracted(self):
         scorm_package = self._search_scorm_package()
         scorm_path = self._extract_scorm_package(scorm_package)
         return scorm_package, scorm_path
 
+    def _get_scorm_md5(self):
+        """
+        Returns the md5 of the SCORM package saved in Studio, as found in `_scorm_url`
+        """
+        match = SCORM_URL_MD5_RE.search(self._scorm_url)
+        return match.group("md5") if match else None
+
+    def _ensure_scorm_package_is_available(self):
+        """
+        Fast path used when rendering the XBlock, which never extracts
+        packages itself. Packages which are known to be extracted don't need
+        any contentstore query or storage lookup. If the package saved in
+        Studio is not known to be extracted we check its manifest in the
+        default storage, and if it's missing (e.g. deleted from the storage)
+        its extraction is scheduled in the background.
+        """
+        if not self.scorm_file:
+            return
+        scorm_md5 = self._get_scorm_md5()
+        if not scorm_md5:
+            raise ScormPackageNotFoundException(
+                'SCORM package "{}" was not saved in Studio'.format(self.scorm_file)
+            )
+        if is_package_extracted(scorm_md5):
+            return
+        scorm_path = get_scorm_path(scorm_md5)
+        if default_storage.exists(os.path.join(scorm_path, MANIFEST_FILENAME)):
+            mark_package_extracted(scorm_md5)
+            return
+        status = schedule_scorm_package_repair(
+            self.runtime.course_id, self.scorm_file, scorm_md5
+        )
+        if status["state"] == ExtractionProgress.FAILED:
+            raise ScormPackageNotFoundException(
+                'SCORM package "{}" could not be extracted: {}'.format(
+                    self.scorm_file, status["message"]
+                )
+            )
+        raise ScormPackageExtractionInProgressException(
+            'SCORM package "{}" is being extracted'.format(scorm_md5)
+        )
+
+    def _get_pending_scorm_md5(self):
+        """
+        Returns the md5 of the package saved in Studio while being extracted
+        in the background, once it's extracted, or None
+        """
+        scorm_md5 = self._pending_scorm_md5
+        if not scorm_md5 or is_package_extracted(scorm_md5):
+            return scorm_md5 or None
+        status = get_extraction_status(scorm_md5)
+        if status and status["state"] != ExtractionProgress.DONE:
+            return None
+        scorm_path = get_scorm_path(scorm_md5)
+        if not default_storage.exists(os.path.join(scorm_path, MANIFEST_FILENAME)):
+            return None
+        mark_package_extracted(scorm_md5)
+        return scorm_md5
+
+    def _get_launch_settings(self):
+        """
+        Returns the version and the launch URL of the SCORM package to render.
+        The package saved in Studio while being extracted in the background
+        replaces the current one once extracted, even if Studio stopped
+        polling its extraction status. Fields are left untouched, since they
+        are read only when rendering the XBlock in the LMS: only the Studio
+        handlers update them.
+        """
+        scorm_md5 = self._get_pending_scorm_md5()
+        if scorm_md5:
+            manifest = get_manifest_model(scorm_md5)
+            return (
+                self._get_scorm_version(manifest),
+                self._get_scorm_url(scorm_md5, manifest),
+            )
+        self._ensure_scorm_package_is_available()
+        return self._scorm_version, self._scorm_url
+
+    def get_scorm_version(self):
+        """
+        Version of the SCORM package rendered to the learner, which may be a
+        package extracted in the background not recorded in the fields yet
+        """
+        scorm_md5 = self._get_pending_scorm_md5()
+        if scorm_md5:
+            return self._get_scorm_version(get_manifest_model(scorm_md5))
+        return self._scorm_version
+
+    def _update_scorm_package(self, scorm_package, scorm_path):
+        manifest = get_manifest_model(scorm_package["md5"])
+        self._scorm_version = self._get_scorm_version(manifest)
+        self.scorm_index = self._get_scorm_index(manifest)
+        self._scorm_url = self._get_scorm_url(scorm_package["md5"], manifest)
+
     def _save_scorm_package(self):
+        self._pending_scorm_md5 = ""
         if self.scorm_file:
             scorm_package, scorm_path = self._ensure_scorm_package_is_extracted()
-            manifest = self._read_scorm_manifest(scorm_path)
-            self._update_scorm_version(manifest)
-            self._update_scorm_index(manifest)
-            self._update_scorm_url(scorm_package["md5"])
+            self._update_scorm_package(scorm_package, scorm_path)
         else:
             self._scorm_url = ""
 
+    def _save_scorm_package_async(self):
+        """
+        Like `_save_scorm_package`, but packages which are not extracted yet
+        are extracted by a background task. In this case the package md5 and
+        the extraction status are returned, and the XBlock is updated once
+        `scorm_extraction_status` reports that the extraction is done, or
+        when it's rendered after the extraction.
+        """
+        self._pending_scorm_md5 = ""
+        if not self.scorm_file:
+            self._scorm_url = ""
+            return None, None
+        scorm_package = self._search_scorm_package()
+        scorm_md5 = scorm_package["md5"]
+        scorm_path = get_scorm_path(scorm_md5)
+        if not is_package_extracted(scorm_md5):
+            if not default_storage.exists(os.path.join(scorm_path, MANIFEST_FILENAME)):
+                self._pending_scorm_md5 = scorm_md5
+                return scorm_md5, schedule_scorm_package_extraction(scorm_package)
+            mark_package_extracted(scorm_md5)
+        self._update_scorm_package(scorm_package, scorm_path)
+        return scorm_md5, None
+
     @staticmethod
     def workbench_scenarios():
         """A canned scenario for display in the workbench."""
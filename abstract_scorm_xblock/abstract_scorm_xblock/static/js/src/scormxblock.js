@@ -1,10 +1,13 @@
 function ScormXBlock(runtime, element, settings) {
   function SCORM_12_API() {
     this.LMSInitialize = function () {
+      lastError = "0";
       return "true";
     };
 
     this.LMSFinish = function () {
+      lastError = "0";
+      Commit(true, true);
       return "true";
     };
 
@@ -12,28 +15,24 @@ function ScormXBlock(runtime, element, settings) {
     this.LMSSetValue = SetValue;
 
     this.LMSCommit = function () {
-      return "true";
-    };
-
-    this.LMSGetLastError = function () {
-      return "0";
-    };
-
-    this.LMSGetErrorString = function (errorCode) {
-      return "Some Error";
+      lastError = "0";
+      return Commit(true, false);
     };
 
-    this.LMSGetDiagnostic = function (errorCode) {
-      return "Some Diagnostice";
-    };
+    this.LMSGetLastError = GetLastError;
+    this.LMSGetErrorString = GetErrorString;
+    this.LMSGetDiagnostic = GetErrorString;
   }
 
   function SCORM_2004_API() {
     this.Initialize = function () {
+      lastError = "0";
       return "true";
     };
 
     this.Terminate = function () {
+      lastError = "0";
+      Commit(true, true);
       return "true";
     };
 
@@ -41,23 +40,111 @@ function ScormXBlock(runtime, element, settings) {
     this.SetValue = SetValue;
 
     this.Commit = function () {
-      return "true";
+      lastError = "0";
+      return Commit(true, false);
     };
 
-    this.GetLastError = function () {
-      return "0";
-    };
+    this.GetLastError = GetLastError;
+    this.GetErrorString = GetErrorString;
+    this.GetDiagnostic = GetErrorString;
+  }
 
-    this.GetErrorString = function (errorCode) {
-      return "Some Error";
-    };
+  // The CMI data model of the SCORM version of the content, see the `cmi`
+  // module: elements map to [access, type, vocabulary, minimum, maximum]
+  var cmiModel = settings.cmi_model;
+  var cmiTypes = {};
+  Object.keys(cmiModel.types).forEach(function (type) {
+    cmiTypes[type] = new RegExp(cmiModel.types[type]);
+  });
+  var lastError = "0";
 
-    this.GetDiagnostic = function (errorCode) {
-      return "Some Diagnostice";
-    };
-  }
+  var GetLastError = function () {
+    return lastError;
+  };
 
+  var GetErrorString = function (errorCode) {
+    return cmiModel.messages[errorCode || lastError] || "";
+  };
+
+  var GetElement = function (cmi_element) {
+    return (
+      cmiModel.elements[cmi_element] ||
+      cmiModel.elements[String(cmi_element).replace(/\.\d+\./g, ".n.")]
+    );
+  };
+
+  // Returns the error code of setting an element to a value, as
+  // `cmi.check_cmi_set` does
+  var CheckValue = function (cmi_element, value) {
+    var definition = GetElement(cmi_element);
+    if (definition === undefined) {
+      return cmiModel.errors.undefined;
+    }
+    if (definition[0] == "r") {
+      if (/\._(children|count|version)$/.test(cmi_element)) {
+        return cmiModel.errors.keyword;
+      }
+      return cmiModel.errors.read_only;
+    }
+    value = String(value);
+    if (value.length > settings.cmi_max_length) {
+      return cmiModel.errors.too_long;
+    }
+    // Elements are appended to the arrays in sequence
+    var outOfSequence = false;
+    ForEachArray(cmi_element, function (count, index) {
+      if (index > Number(settings.cmi_data[count])) {
+        outOfSequence = true;
+      }
+    });
+    if (outOfSequence) {
+      return cmiModel.errors.discarded;
+    }
+    var type = definition[1];
+    var vocabulary = definition[2];
+    if (type === null && vocabulary === null) {
+      return "0";
+    }
+    if (vocabulary !== null && vocabulary.includes(value)) {
+      return "0";
+    }
+    if (type === null || !cmiTypes[type].test(value)) {
+      return cmiModel.errors.type_mismatch;
+    }
+    if (
+      (definition[3] !== null && parseFloat(value) < definition[3]) ||
+      (definition[4] !== null && parseFloat(value) > definition[4])
+    ) {
+      return cmiModel.errors.out_of_range;
+    }
+    return "0";
+  };
+
+  // CMI values set by the content and not yet sent to the LMS
+  var pendingValues = {};
+  var commitTimer = null;
+  // Browsers limit the size of the requests outliving the page
+  var KEEPALIVE_MAX_SIZE = 60000;
+
+  // Values are read from the CMI data shipped with the XBlock, the LMS
+  // is queried only for elements which are not part of it
   var GetValue = function (cmi_element) {
+    var definition = GetElement(cmi_element);
+    if (definition === undefined) {
+      lastError = cmiModel.errors.undefined;
+      return "";
+    }
+    if (definition[0] == "w") {
+      lastError = cmiModel.errors.write_only;
+      return "";
+    }
+    lastError = "0";
+    if (cmi_element in settings.cmi_data) {
+      if ([undefined, null].includes(settings.cmi_data[cmi_element])) {
+        return "";
+      }
+      return settings.cmi_data[cmi_element];
+    }
     var response = $.ajax({
       type: "POST",
       url: runtime.handlerUrl(element, "scorm_get_value"),
@@ -65,35 +152,181 @@ function ScormXBlock(runtime, element, settings) {
       async: false,
     });
 
-    response = JSON.parse(response.responseText);
-    if (!response.value && cmi_element in settings.scorm_data) {
-      if ([undefined, null].includes(settings.scorm_data[cmi_element])) {
-        return "";
+    var result = JSON.parse(response.responseText);
+    lastError = result.error || "0";
+    return result.value;
+  };
+
+  var SetValue = function (cmi_element, value) {
+    value = String(value);
+    lastError = CheckValue(cmi_element, value);
+    if (lastError != "0") {
+      return "false";
+    }
+    pendingValues[cmi_element] = value;
+    settings.cmi_data[cmi_element] = value;
+    UpdateCounts(cmi_element);
+    ScheduleCommit();
+    return "true";
+  };
+
+  // Calls `callback` with the `_count` element and the index of each array
+  // holding `cmi_element` whose count is known, e.g. with
+  // "cmi.interactions._count" and 2 for "cmi.interactions.2.id"
+  var ForEachArray = function (cmi_element, callback) {
+    var arrayIndex = /\.(\d+)\./g;
+    var match;
+    while ((match = arrayIndex.exec(cmi_element)) !== null) {
+      var count = cmi_element.slice(0, match.index) + "._count";
+      if (count in settings.cmi_data) {
+        callback(count, Number(match[1]));
       }
-      return settings.scorm_data[cmi_element];
     }
-    return response.value;
   };
 
-  var SetValue = function (cmi_element, value) {
+  // The content appends elements to the arrays, e.g. interactions, at the
+  // index given by their `_count`, which must account for the values which
+  // are not yet sent to the LMS
+  var UpdateCounts = function (cmi_element) {
+    ForEachArray(cmi_element, function (count, index) {
+      settings.cmi_data[count] = Math.max(
+        Number(settings.cmi_data[count]) || 0,
+        index + 1
+      );
+    });
+  };
+
+  var ScheduleCommit = function () {
+    if (commitTimer === null) {
+      commitTimer = setTimeout(function () {
+        Commit(false, false);
+      }, settings.commit_interval);
+    }
+  };
+
+  // Buffers again the values of a failed request, unless they were set
+  // again since, so that they are sent with the next one
+  var RestoreValues = function (values) {
+    Object.keys(values).forEach(function (cmi_element) {
+      if (!(cmi_element in pendingValues)) {
+        pendingValues[cmi_element] = values[cmi_element];
+      }
+    });
+    ScheduleCommit();
+  };
+
+  var GetCookie = function (name) {
+    var match = document.cookie.match(
+      new RegExp("(^|;\\s*)" + name + "=([^;]*)")
+    );
+    return match ? decodeURIComponent(match[2]) : "";
+  };
+
+  var UpdateStatus = function (response) {
+    if (typeof response.lesson_score != "undefined") {
+      $(".lesson_score", element).html(response.lesson_score.toFixed(2));
+    }
+    $(".completion_status", element).html(response.completion_status);
+    // Values rejected by the LMS, which the content can't be told about
+    // synchronously anymore
+    if (response.errors) {
+      lastError = Object.values(response.errors)[0];
+    }
+  };
+
+  // Sends the commit `data` with a beacon. Beacons can't have the CSRF token
+  // header: it's sent in a form, along with the data. Returns false if the
+  // browser refused the beacon.
+  var SendBeacon = function (data) {
+    if (!navigator.sendBeacon) {
+      return false;
+    }
+    var form = new URLSearchParams();
+    form.append("csrfmiddlewaretoken", GetCookie("csrftoken"));
+    form.append("data", data);
+    return (
+      form.toString().length <= KEEPALIVE_MAX_SIZE &&
+      navigator.sendBeacon(
+        runtime.handlerUrl(element, "scorm_commit_beacon"),
+        form
+      )
+    );
+  };
+
+  // Send all buffered values to the LMS in a single request. `commit`
+  // tells whether the content committed its data or ended the session.
+  // When the session ends the page may be dismissed: browsers block
+  // synchronous requests and cancel asynchronous ones then, so the values
+  // are sent with a keepalive request, or a beacon.
+  var Commit = function (commit, terminate) {
+    if (commitTimer !== null) {
+      clearTimeout(commitTimer);
+      commitTimer = null;
+    }
+    if (
+      $.isEmptyObject(pendingValues) &&
+      !(commit && settings.grade_publish_mode == "commit")
+    ) {
+      return "true";
+    }
+    var values = pendingValues;
+    pendingValues = {};
+    var url = runtime.handlerUrl(element, "scorm_commit");
+    var data = JSON.stringify({ values: values, commit: commit });
+    if (terminate && new Blob([data]).size <= KEEPALIVE_MAX_SIZE) {
+      if (window.fetch) {
+        fetch(url, {
+          method: "POST",
+          body: data,
+          keepalive: true,
+          credentials: "same-origin",
+          headers: { "X-CSRFToken": GetCookie("csrftoken") },
+        })
+          .then(
+            function (response) {
+              if (!response.ok) {
+                throw new Error(response.statusText);
+              }
+              return response.json().then(UpdateStatus);
+            },
+            // The browser refused the request, e.g. over the keepalive quota
+            function () {
+              if (!SendBeacon(data)) {
+                throw new Error("Beacon refused");
+              }
+            }
+          )
+          .catch(function () {
+            RestoreValues(values);
+          });
+        return "true";
+      }
+      if (SendBeacon(data)) {
+        return "true";
+      }
+    }
     $.ajax({
       type: "POST",
-      url: runtime.handlerUrl(element, "scorm_set_value"),
-      data: JSON.stringify({ name: cmi_element, value: value }),
-      async: true,
-      success: function (response) {
-        if (typeof response.lesson_score != "undefined") {
-          $(".lesson_score", element).html(response.lesson_score.toFixed(2));
-        }
-        $(".completion_status", element).html(response.completion_status);
+      url: url,
+      data: data,
+      // Too big for a keepalive request: last resort
+      async: !terminate,
+      success: UpdateStatus,
+      error: function () {
+        RestoreValues(values);
       },
     });
     return "true";
   };
 
+  $(window).on("pagehide", function () {
+    Commit(true, true);
+  });
+
   var GetAPI = function () {
     let api;
-    if (settings.scorm_version == "1.2") {
+    // Versions unknown to the LMS get the SCORM 1.2 data model and API
+    if (cmiModel.edition == "1.2") {
       api = new SCORM_12_API();
     } else {
       api = new SCORM_2004_API();
@@ -221,6 +454,9 @@ function ScormXBlock(runtime, element, settings) {
       ",left=" +
       (screen.width - width) / 2 +
       ",resizable=yes,scrollbars=no,status=yes";
+    if (settings.preparing_content) {
+      return;
+    }
     if (settings.scorm_xblock.popup && settings.scorm_xblock.autoopen) {
       showPopup(params);
     } else if (!settings.scorm_xblock.popup) {
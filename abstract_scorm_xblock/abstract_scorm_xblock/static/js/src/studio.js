@@ -1,5 +1,48 @@
 function ScormStudioXBlock(runtime, element) {
   var handlerUrl = runtime.handlerUrl(element, "studio_submit");
+  var extractionStatusUrl = runtime.handlerUrl(
+    element,
+    "scorm_extraction_status"
+  );
+
+  function showError(error_field) {
+    $("#" + error_field + "_field")
+      .parent()
+      .css("color", "red");
+  }
+
+  function pollExtractionStatus(md5) {
+    $.ajax({
+      url: extractionStatusUrl,
+      type: "POST",
+      data: JSON.stringify({ md5: md5 }),
+      dataType: "json",
+      success: function (status) {
+        if (status.state == "done") {
+          runtime.notify("save", { state: "end" });
+        } else if (status.state == "failed") {
+          runtime.notify("error", {
+            title: "SCORM package extraction failed",
+            message: status.message,
+          });
+          showError("scorm_file");
+        } else {
+          runtime.notify("save", {
+            state: "start",
+            message:
+              "Extracting SCORM package (" +
+              status.files_done +
+              "/" +
+              status.files_total +
+              " files)",
+          });
+          setTimeout(function () {
+            pollExtractionStatus(md5);
+          }, 1000);
+        }
+      },
+    });
+  }
 
   $(element)
     .find(".save-button")
@@ -32,15 +75,17 @@ function ScormStudioXBlock(runtime, element) {
         data: form_data,
         type: "POST",
         success: function (data, textStatus, jqXHR) {
-          runtime.notify("save", { state: "end" });
+          if (jqXHR.status == 202) {
+            pollExtractionStatus(JSON.parse(data).md5);
+          } else {
+            runtime.notify("save", { state: "end" });
+          }
         },
         error: function (jqXHR, textStatus, errorThrown) {
           var error_field = JSON.parse(jqXHR.responseText).field;
           var error_message = JSON.parse(jqXHR.responseText).message;
 
-          $("#" + error_field + "_field")
-            .parent()
-            .css("color", "red");
+          showError(error_field);
         },
       });
     });
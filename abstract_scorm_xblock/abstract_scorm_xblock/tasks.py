@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+from celery import shared_task
+from opaque_keys.edx.keys import AssetKey, CourseKey
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .cache import add_extraction_status, get_extraction_status, set_extraction_status
+from .exceptions import ScormPackageNotFoundException
+from .extraction import (
+    MANIFEST_FILENAME,
+    ExtractionProgress,
+    extract_scorm_package_once,
+    search_scorm_package,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def extract_scorm_package_task(asset_key, md5):
+    """
+    Extracts a SCORM package to the default storage,
+    publishing the extraction progress in the Django cache
+    """
+    progress = ExtractionProgress(md5)
+    try:
+        scorm_path = extract_scorm_package_once(
+            AssetKey.from_string(asset_key),
+            md5,
+            progress,
+            wait=settings.SCORM_EXTRACTION_LOCK_TIMEOUT,
+        )
+    except Exception as e:
+        logger.exception('Error extracting SCORM package "%s"', asset_key)
+        progress.fail(str(e))
+        return
+
+    if not default_storage.exists(os.path.join(scorm_path, MANIFEST_FILENAME)):
+        progress.fail("Invalid SCORM file")
+        return
+
+    progress.finish()
+
+
+@shared_task
+def repair_scorm_package_task(course_id, scorm_file, md5):
+    """
+    Extracts again a SCORM package saved in Studio whose files are missing
+    from the default storage, provided the course still has the same package
+    """
+    try:
+        scorm_package = search_scorm_package(
+            CourseKey.from_string(course_id), scorm_file
+        )
+    except ScormPackageNotFoundException as e:
+        ExtractionProgress(md5).fail(str(e))
+        return
+    if scorm_package["md5"] != md5:
+        ExtractionProgress(md5).fail(
+            'SCORM package "{}" was replaced in the course'.format(scorm_file)
+        )
+        return
+    extract_scorm_package_task(str(scorm_package["asset_key"]), md5)
+
+
+def schedule_scorm_package_extraction(scorm_package):
+    """
+    Schedules the background extraction of a SCORM package.
+    Concurrent requests for the same package are deduplicated into a single
+    task, keyed by the package md5. Failed extractions can be scheduled again.
+    Returns the current extraction status.
+    """
+    md5 = scorm_package["md5"]
+    status = ExtractionProgress.make_status(ExtractionProgress.PENDING)
+    if not add_extraction_status(md5, status):
+        current_status = get_extraction_status(md5)
+        if current_status and current_status["state"] != ExtractionProgress.FAILED:
+            return current_status
+        set_extraction_status(md5, status)
+    extract_scorm_package_task.delay(str(scorm_package["asset_key"]), md5)
+    return get_extraction_status(md5) or status
+
+
+def schedule_scorm_package_repair(course_id, scorm_file, md5):
+    """
+    Schedules the background extraction of a SCORM package saved in Studio
+    and found missing when rendering the XBlock. Like
+    `schedule_scorm_package_extraction` requests are deduplicated by the
+    package md5, but failed repairs are not retried until their status
+    expires, so that learners don't start a new extraction on every page view.
+    Returns the current extraction status.
+    """
+    status = ExtractionProgress.make_status(ExtractionProgress.PENDING)
+    if not add_extraction_status(md5, status):
+        current_status = get_extraction_status(md5)
+        # A done status of a package missing from the storage is stale
+        if current_status and current_status["state"] != ExtractionProgress.DONE:
+            return current_status
+        set_extraction_status(md5, status)
+    repair_scorm_package_task.delay(str(course_id), scorm_file, md5)
+    return get_extraction_status(md5) or status
@@ -1,25 +1,191 @@
 # -*- coding: utf-8 -*-
+import csv
+import fcntl
+import hashlib
+import io
 import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+import zlib
 
 import mock
+import pkg_resources
 import unittest
 
 import ddt
+from webob import Request
 
-from xblock.field_data import DictFieldData
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import Http404, QueryDict
+from django.template import Template
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from django.utils.http import http_date
 
+from xblock.field_data import DictFieldData, ReadOnlyFieldData, SplitFieldData
+from xblock.fields import Scope
+
+from .cache import (
+    LRUCache,
+    LocalFileCache,
+    extracted_packages,
+    get_extraction_status,
+    is_package_extracted,
+    make_cache_key,
+    mark_blob_in_use,
+    mark_package_extracted,
+    set_extraction_status,
+    unmark_package_extracted,
+)
+from .cmi import (
+    check_cmi_get,
+    check_cmi_set,
+    get_cmi_element,
+    get_cmi_model,
+)
 from .constants import ScormVersions
-from .scormxblock import AbstractScormXBlock
+from .datamodel import get_cmi_value, iter_cmi_values, set_cmi_value
+from .tasks import (
+    extract_scorm_package_task,
+    repair_scorm_package_task,
+    schedule_scorm_package_extraction,
+)
+from .exceptions import ScormManifestNotFoundException, ScormValueDiscardedException
+from .export import iter_export
+from .extraction import (
+    ExtractionProgress,
+    brotli,
+    extract_scorm_package,
+    extract_scorm_package_once,
+    spool_scorm_package,
+    store_scorm_package,
+)
+from .index import get_package_index, package_indexes
+from .manifest import (
+    add_launch_parameters,
+    get_manifest_json_path,
+    get_manifest_model,
+    manifest_models,
+    parse_manifest,
+)
+from .metrics import (
+    NoopExporter,
+    PrometheusExporter,
+    RecordingExporter,
+    StatsdExporter,
+    prometheus_client,
+    set_exporter,
+    span,
+)
+from .rescore import (
+    RateLimiter,
+    get_rescore_progress,
+    rescore_block,
+    reset_rescore_progress,
+)
+from .scormxblock import AbstractScormXBlock, runtime_stats
+from .utils import get_static_resource, get_template
+from .views import scormxblock_serve, scormxblock_static
+
+
+SCORM_MANIFEST = b"""<?xml version="1.0" encoding="UTF-8"?>
+<manifest identifier="manifest" version="1"
+    xmlns="http://www.imsglobal.org/xsd/imscp_v1p1"
+    xmlns:adlcp="http://www.adlnet.org/xsd/adlcp_v1p3">
+  <metadata>
+    <schema>ADL SCORM</schema>
+    <schemaversion>2004 4th Edition</schemaversion>
+  </metadata>
+  <organizations default="organization">
+    <organization identifier="organization">
+      <title>Course</title>
+      <item identifier="item" identifierref="resource">
+        <title>SCO</title>
+      </item>
+    </organization>
+  </organizations>
+  <resources>
+    <resource identifier="resource" type="webcontent"
+        adlcp:scormType="sco" href="story.html">
+      <file href="story.html"/>
+    </resource>
+  </resources>
+</manifest>
+"""
+
+
+def make_scorm_zipfile(files, compression=zipfile.ZIP_DEFLATED):
+    """
+    Builds an in memory SCORM zip file containing `files`
+    """
+    scorm_file = io.BytesIO()
+    with zipfile.ZipFile(scorm_file, "w", compression) as zipfile_obj:
+        for filename, data in files.items():
+            zipfile_obj.writestr(filename, data)
+    return scorm_file.getvalue()
+
+
+def make_contentstore(data, chunk_size=1024, filename="package.zip"):
+    """
+    Mocks a contentstore containing the `data` SCORM package
+    and streaming it in chunks
+    """
+    content = mock.Mock(length=len(data))
+    content.stream_data.side_effect = lambda: (
+        data[i : i + chunk_size] for i in range(0, len(data), chunk_size)
+    )
+    scorm_package = {
+        "md5": hashlib.md5(data).hexdigest(),
+        "asset_key": "asset-v1:org+course+run+type@asset+block@" + filename,
+        "contentType": "application/zip",
+    }
+    return mock.Mock(
+        return_value=mock.Mock(
+            find=mock.Mock(return_value=content),
+            get_all_content_for_course=mock.Mock(
+                side_effect=lambda *args, **kwargs: [[dict(scorm_package)], 1]
+            ),
+        )
+    )
+
+
+class LocalStorageMixin(object):
+    """
+    Replaces the default storage with a storage in a temporary local directory
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir)
+        settings_override = override_settings(
+            DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+            MEDIA_ROOT=self.storage_dir,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = default_storage
 
 
 @ddt.ddt
-class AbstractScormXBlockTests(unittest.TestCase):
+class AbstractScormXBlockTests(LocalStorageMixin, unittest.TestCase):
     def make_one(self, **kwargs):
         """
         Creates a AbstractScormXBlock for testing purpose.
         """
         field_data = DictFieldData(kwargs)
-        xblock = AbstractScormXBlock(mock.MagicMock(), field_data, mock.MagicMock())
+        xblock = AbstractScormXBlock(
+            mock.MagicMock(user_is_staff=False), field_data, mock.MagicMock()
+        )
         return xblock
 
     def test_fields_xblock(self):
@@ -41,7 +207,7 @@ class AbstractScormXBlockTests(unittest.TestCase):
         self.assertEqual(xblock._success_status, "unknown")
 
     @mock.patch(
-        "abstract_scorm_xblock.scormxblock.contentstore",
+        "abstract_scorm_xblock.extraction.contentstore",
         return_value=mock.Mock(
             get_all_content_for_course=mock.Mock(return_value=[[], 0])
         ),
@@ -58,8 +224,97 @@ class AbstractScormXBlockTests(unittest.TestCase):
             fragment.body_html(),
         )
 
+    @mock.patch("abstract_scorm_xblock.scormxblock.default_storage")
+    @mock.patch("abstract_scorm_xblock.extraction.contentstore")
+    def test_student_view_extracted_package(self, contentstore, default_storage):
+        md5 = "09c1735eaa57d78fe245868f0e07cf7b"
+        mark_package_extracted(md5)
+        xblock = self.make_one(
+            scorm_file="package.zip",
+            _scorm_url="/abstract_scorm_xblock/{}/index.html".format(md5),
+        )
+        xblock.student_view()
+
+        contentstore.assert_not_called()
+        default_storage.exists.assert_not_called()
+        default_storage.open.assert_not_called()
+
+    @mock.patch("abstract_scorm_xblock.scormxblock.default_storage")
+    @mock.patch("abstract_scorm_xblock.extraction.contentstore")
+    def test_student_view_unmarked_package(self, contentstore, default_storage):
+        md5 = "5bd7e0b1c4a5f0cd5c7c4b6bb6d2a3c1"
+        unmark_package_extracted(md5)
+        default_storage.exists.return_value = True
+        xblock = self.make_one(
+            scorm_file="package.zip",
+            _scorm_url="/abstract_scorm_xblock/{}/index.html".format(md5),
+        )
+        xblock.student_view()
+
+        contentstore.assert_not_called()
+        self.assertTrue(is_package_extracted(md5))
+
+    @mock.patch(
+        "abstract_scorm_xblock.extraction.contentstore",
+        return_value=mock.Mock(
+            get_all_content_for_course=mock.Mock(return_value=[[], 0])
+        ),
+    )
+    @mock.patch("abstract_scorm_xblock.scormxblock.default_storage")
+    def test_student_view_many_blocks(self, default_storage, contentstore):
+        # A page with many blocks loads and compiles each template once, and
+        # doesn't query the contentstore nor the storage
+        get_template.cache_clear()
+        get_static_resource.cache_clear()
+        self.addCleanup(get_template.cache_clear)
+        self.addCleanup(get_static_resource.cache_clear)
+        blocks = 50
+        with mock.patch(
+            "abstract_scorm_xblock.utils.pkg_resources.resource_string",
+            wraps=pkg_resources.resource_string,
+        ) as resource_string, mock.patch(
+            "abstract_scorm_xblock.utils.Template", wraps=Template
+        ) as template:
+            fragments = [self.make_one().student_view() for _ in range(blocks)]
+
+        loaded = [call[0][1] for call in resource_string.call_args_list]
+        self.assertEqual(
+            sorted(loaded),
+            [
+                "static/css/scormxblock.css",
+                "static/html/scormxblock.html",
+                "static/js/src/scormxblock.js",
+            ],
+        )
+        self.assertEqual(template.call_count, 1)
+        contentstore.assert_not_called()
+        self.assertEqual(default_storage.method_calls, [])
+        self.assertEqual(fragments[0].body_html(), fragments[blocks - 1].body_html())
+
+    @override_settings(SCORM_STATIC_URLS=True)
+    @mock.patch(
+        "abstract_scorm_xblock.extraction.contentstore",
+        return_value=mock.Mock(
+            get_all_content_for_course=mock.Mock(return_value=[[], 0])
+        ),
+    )
+    def test_student_view_static_urls(self, contentstore):
+        fragment = self.make_one().student_view()
+
+        _, digest = get_static_resource("static/js/src/scormxblock.js")
+        self.assertEqual(
+            [(resource.kind, resource.mimetype) for resource in fragment.resources],
+            [("url", "text/css"), ("url", "application/javascript")],
+        )
+        self.assertEqual(
+            fragment.resources[1].data,
+            "/abstract_scorm_xblock/static/{}/static/js/src/scormxblock.js".format(
+                digest
+            ),
+        )
+
     @mock.patch(
-        "abstract_scorm_xblock.scormxblock.contentstore",
+        "abstract_scorm_xblock.extraction.contentstore",
         return_value=mock.Mock(
             get_all_content_for_course=mock.Mock(return_value=[[], 0])
         ),
@@ -74,7 +329,7 @@ class AbstractScormXBlockTests(unittest.TestCase):
         self.assertIn("Cancel", fragment.body_html())
 
     @mock.patch(
-        "abstract_scorm_xblock.scormxblock.contentstore",
+        "abstract_scorm_xblock.extraction.contentstore",
         return_value=mock.Mock(
             get_all_content_for_course=mock.Mock(return_value=[[], 0])
         ),
@@ -103,14 +358,183 @@ class AbstractScormXBlockTests(unittest.TestCase):
         response = xblock.studio_submit(mock.Mock(method="POST", params=fields))
         self.assertEqual(response.status_code, 404)
 
+    def test_studio_submit_launch_parameters(self):
+        scorm_data = make_scorm_zipfile(
+            {
+                "imsmanifest.xml": SCORM_MANIFEST.replace(
+                    b'identifierref="resource"',
+                    b'identifierref="resource" parameters="?lang=en"',
+                ),
+                "story.html": b"<html></html>",
+            }
+        )
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        contentstore = make_contentstore(scorm_data)
+        xblock = self.make_one()
+
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", contentstore
+        ), mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            response = xblock.studio_submit(
+                mock.Mock(method="POST", params={"scorm_file": "package.zip"})
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(xblock.scorm_index, "story.html")
+        self.assertTrue(xblock._scorm_url.endswith("/story.html?lang=en"))
+        path, _, query = xblock._scorm_url.partition("?")
+        self.assertEqual(resolve(path).kwargs, {"md5": md5, "path": "story.html"})
+        self.assertEqual(query, "lang=en")
+
+    @override_settings(SCORM_ASYNC_EXTRACTION=True)
+    def test_studio_submit_async(self):
+        # Run celery tasks synchronously, without a broker
+        conf = extract_scorm_package_task.app.conf
+        self.addCleanup(setattr, conf, "task_always_eager", conf.task_always_eager)
+        conf.task_always_eager = True
+
+        scorm_data = make_scorm_zipfile(
+            {"imsmanifest.xml": SCORM_MANIFEST, "story.html": b"<html></html>"}
+        )
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        contentstore = make_contentstore(scorm_data)
+        xblock = self.make_one()
+
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", contentstore
+        ), mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            response = xblock.studio_submit(
+                mock.Mock(method="POST", params={"scorm_file": "package.zip"})
+            )
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json["md5"], md5)
+            self.assertEqual(xblock._scorm_url, "")
+
+            response = xblock.scorm_extraction_status(
+                mock.Mock(method="POST", body=json.dumps({"md5": md5}).encode("utf-8"))
+            )
+
+        self.assertEqual(response.json["state"], "done")
+        self.assertEqual(response.json["files_done"], 2)
+        self.assertEqual(response.json["files_total"], 2)
+        self.assertIn(md5, xblock._scorm_url)
+        self.assertEqual(xblock.scorm_index, "story.html")
+        self.assertEqual(
+            xblock._scorm_version, ScormVersions["SCORM_2004_4_EDITION"].value
+        )
+
+    @override_settings(SCORM_ASYNC_EXTRACTION=True)
+    def test_studio_submit_async_without_polling(self):
+        """
+        The XBlock renders the new package once extracted, even if Studio
+        didn't poll the extraction status until the end, without writing
+        the authored fields which are read only in the LMS
+        """
+        conf = extract_scorm_package_task.app.conf
+        self.addCleanup(setattr, conf, "task_always_eager", conf.task_always_eager)
+        conf.task_always_eager = True
+
+        scorm_data = make_scorm_zipfile(
+            {"imsmanifest.xml": SCORM_MANIFEST, "story.html": b"<html></html>"}
+        )
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        unmark_package_extracted(md5)
+        cache.delete(make_cache_key("extraction", md5))
+        contentstore = make_contentstore(scorm_data)
+        old_url = "/scorm/{}/index.html".format("0" * 32)
+        xblock = self.make_one(_scorm_url=old_url)
+
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", contentstore
+        ), mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            response = xblock.studio_submit(
+                mock.Mock(method="POST", params={"scorm_file": "package.zip"})
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(xblock._pending_scorm_md5, md5)
+
+        # Authored fields are read only in the LMS
+        authored_data = ReadOnlyFieldData(
+            DictFieldData(
+                {
+                    "scorm_file": "package.zip",
+                    "_scorm_url": old_url,
+                    "_pending_scorm_md5": md5,
+                }
+            )
+        )
+        field_data = SplitFieldData(
+            {
+                Scope.content: authored_data,
+                Scope.settings: authored_data,
+                Scope.user_state: DictFieldData({}),
+            }
+        )
+        lms_xblock = AbstractScormXBlock(
+            mock.MagicMock(user_is_staff=False), field_data, mock.MagicMock()
+        )
+        fragment = lms_xblock.student_view()
+        lms_xblock.save()
+
+        self.assertIn(md5, fragment.json_init_args["scorm_url"])
+        self.assertIn("story.html", fragment.json_init_args["scorm_url"])
+        self.assertEqual(
+            fragment.json_init_args["scorm_version"],
+            ScormVersions["SCORM_2004_4_EDITION"].value,
+        )
+        self.assertEqual(
+            lms_xblock.get_scorm_version(),
+            ScormVersions["SCORM_2004_4_EDITION"].value,
+        )
+        self.assertEqual(lms_xblock.scorm_index, "")
+        self.assertEqual(lms_xblock._scorm_url, old_url)
+        contentstore.return_value.get_all_content_for_course.assert_called_once()
+
+        # Studio records the new package when polling its extraction status
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", contentstore
+        ), mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            response = xblock.scorm_extraction_status(
+                mock.Mock(method="POST", body=json.dumps({"md5": md5}).encode("utf-8"))
+            )
+        self.assertEqual(response.json["state"], "done")
+        self.assertIn(md5, xblock._scorm_url)
+        self.assertEqual(xblock.scorm_index, "story.html")
+        self.assertEqual(xblock._pending_scorm_md5, "")
+
+    def test_unknown_version(self):
+        md5 = "0b8a1d2c3e4f5a6b7c8d9e0f1a2b3c4d"
+        mark_package_extracted(md5)
+        xblock = self.make_one(
+            has_score=True,
+            scorm_file="package.zip",
+            _scorm_url="/abstract_scorm_xblock/{}/index.html".format(md5),
+            _scorm_version="SCORM 1.2 (custom)",
+        )
+
+        response = xblock.scorm_commit(
+            mock.Mock(
+                method="POST",
+                body=json.dumps(
+                    {"values": {"cmi.core.lesson_status": "completed"}}
+                ).encode("utf-8"),
+            )
+        )
+        fragment = xblock.student_view()
+
+        self.assertEqual(response.json["completion_status"], "completed")
+        self.assertEqual(fragment.json_init_args["cmi_model"]["edition"], "1.2")
+        self.assertEqual(xblock.get_lesson_status(), "completed")
+
     @mock.patch("abstract_scorm_xblock.scormxblock.AbstractScormXBlock._publish_grade")
     @ddt.data(
-        {"name": "cmi.core.lesson_status", "value": "completed"},
-        {"name": "cmi.completion_status", "value": "failed"},
-        {"name": "cmi.success_status", "value": "unknown"},
+        ("1.2", {"name": "cmi.core.lesson_status", "value": "completed"}),
+        ("2004 4th Edition", {"name": "cmi.completion_status", "value": "completed"}),
+        ("2004 4th Edition", {"name": "cmi.success_status", "value": "unknown"}),
     )
-    def test_set_status(self, value, _publish_grade):
-        xblock = self.make_one(has_score=True)
+    @ddt.unpack
+    def test_set_status(self, scorm_version, value, _publish_grade):
+        xblock = self.make_one(has_score=True, _scorm_version=scorm_version)
 
         response = xblock.scorm_set_value(
             mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
@@ -138,11 +562,12 @@ class AbstractScormXBlockTests(unittest.TestCase):
             )
 
     @ddt.data(
-        {"name": "cmi.core.score.raw", "value": "20"},
-        {"name": "cmi.score.raw", "value": "20"},
+        ("1.2", {"name": "cmi.core.score.raw", "value": "20"}),
+        ("2004 4th Edition", {"name": "cmi.score.raw", "value": "20"}),
     )
-    def test_set_lesson_score(self, value):
-        xblock = self.make_one(has_score=True)
+    @ddt.unpack
+    def test_set_lesson_score(self, scorm_version, value):
+        xblock = self.make_one(has_score=True, _scorm_version=scorm_version)
 
         response = xblock.scorm_set_value(
             mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
@@ -159,31 +584,446 @@ class AbstractScormXBlockTests(unittest.TestCase):
         )
 
     @ddt.data(
-        {"name": "cmi.core.lesson_location", "value": 1},
-        {"name": "cmi.location", "value": 2},
-        {"name": "cmi.suspend_data", "value": [1, 2]},
+        ("1.2", {"name": "cmi.core.lesson_location", "value": 1}),
+        ("2004 4th Edition", {"name": "cmi.location", "value": 2}),
+        ("1.2", {"name": "cmi.suspend_data", "value": [1, 2]}),
     )
-    def test_set_other_scorm_values(self, value):
-        xblock = self.make_one(has_score=True)
+    @ddt.unpack
+    def test_set_other_scorm_values(self, scorm_version, value):
+        xblock = self.make_one(has_score=True, _scorm_version=scorm_version)
 
         response = xblock.scorm_set_value(
             mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
         )
 
-        self.assertEqual(xblock._scorm_data[value["name"]], value["value"])
+        # Values are stored as strings, as the SCORM API deals with strings
+        self.assertEqual(xblock._scorm_data[value["name"]], str(value["value"]))
 
         self.assertEqual(
             response.json,
             {"result": "success"},
         )
 
+    @mock.patch("abstract_scorm_xblock.scormxblock.AbstractScormXBlock.emit_completion")
+    def test_scorm_commit(self, emit_completion):
+        xblock = self.make_one(has_score=True)
+        values = {
+            "cmi.core.lesson_location": "slide_3",
+            "cmi.interactions.0.id": "question_1",
+            "cmi.interactions.0.result": "correct",
+            "cmi.core.score.raw": "80",
+            "cmi.core.lesson_status": "completed",
+        }
+
+        response = xblock.scorm_commit(
+            mock.Mock(
+                method="POST", body=json.dumps({"values": values}).encode("utf-8")
+            )
+        )
+
+        self.assertEqual(
+            response.json,
+            {
+                "result": "success",
+                "lesson_score": 0.8,
+                "completion_status": "completed",
+            },
+        )
+        for name, value in values.items():
+            self.assertEqual(get_cmi_value(xblock._scorm_data, name), value)
+        emit_completion.assert_called_once_with(1)
+        xblock.runtime.publish.assert_called_once_with(
+            xblock, "grade", {"value": 0.8, "max_value": 1}
+        )
+
+    @mock.patch("abstract_scorm_xblock.scormxblock.AbstractScormXBlock.emit_completion")
+    def test_scorm_commit_invalid_values(self, emit_completion):
+        xblock = self.make_one(has_score=True, _scorm_version="2004 4th Edition")
+        values = {
+            "cmi.location": "slide_3",
+            "cmi.score.scaled": "1.5",
+            "cmi.success_status": "excellent",
+            "cmi.learner_id": "someone",
+            "cmi.core.lesson_status": "completed",
+            "cmi.interactions.3.id": "question_4",
+        }
+
+        response = xblock.scorm_commit(
+            mock.Mock(
+                method="POST", body=json.dumps({"values": values}).encode("utf-8")
+            )
+        )
+
+        self.assertEqual(
+            response.json,
+            {
+                "result": "success",
+                "errors": {
+                    "cmi.score.scaled": "407",
+                    "cmi.success_status": "406",
+                    "cmi.learner_id": "404",
+                    "cmi.core.lesson_status": "401",
+                    # Interactions must be set in sequence
+                    "cmi.interactions.3.id": "351",
+                },
+            },
+        )
+        self.assertEqual(
+            xblock._scorm_data, {"cmi.location": "slide_3", "cmi.interactions": []}
+        )
+        self.assertEqual(xblock.lesson_score, 0)
+        emit_completion.assert_not_called()
+        xblock.runtime.publish.assert_not_called()
+
+    @ddt.data(
+        {"values": "cmi.core.lesson_location=slide_3"},
+        {"values": [["cmi.core.lesson_location"]]},
+        {"values": [[1, "slide_3"]]},
+        ["cmi.core.lesson_location", "slide_3"],
+    )
+    def test_scorm_commit_malformed(self, data):
+        xblock = self.make_one()
+
+        response = xblock.scorm_commit(
+            mock.Mock(method="POST", body=json.dumps(data).encode("utf-8"))
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(xblock._scorm_data, {})
+
+    def test_scorm_commit_pairs(self):
+        xblock = self.make_one()
+        data = {"values": [["cmi.core.lesson_location", "slide_3"]]}
+
+        response = xblock.scorm_commit(
+            mock.Mock(method="POST", body=json.dumps(data).encode("utf-8"))
+        )
+
+        self.assertEqual(response.json, {"result": "success"})
+        self.assertEqual(xblock.get_value("cmi.core.lesson_location"), "slide_3")
+
+    def test_scorm_commit_beacon(self):
+        xblock = self.make_one()
+        data = {"values": {"cmi.core.lesson_location": "slide_3"}, "commit": True}
+
+        response = xblock.scorm_commit_beacon(
+            Request.blank(
+                "/",
+                POST={"csrfmiddlewaretoken": "token", "data": json.dumps(data)},
+            )
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(xblock.get_value("cmi.core.lesson_location"), "slide_3")
+        for request in [
+            Request.blank("/", POST={"data": "{"}),
+            Request.blank("/", POST={"data": json.dumps({"values": 1})}),
+        ]:
+            self.assertEqual(xblock.scorm_commit_beacon(request).status_code, 400)
+        self.assertEqual(
+            xblock.scorm_commit_beacon(Request.blank("/")).status_code, 405
+        )
+
+    @override_settings(SCORM_CMI_MAX_VALUE_LENGTH=8000)
+    def test_scorm_commit_value_types(self):
+        xblock = self.make_one(_scorm_version="1.2")
+        values = {
+            "cmi.core.lesson_location": {"zlib": "x"},
+            "cmi.student_preference.audio": 5,
+            "cmi.suspend_data": "a" * 8001,
+            "cmi.comments": "a" * 5000,
+        }
+
+        response = xblock.scorm_commit(
+            mock.Mock(
+                method="POST", body=json.dumps({"values": values}).encode("utf-8")
+            )
+        )
+
+        self.assertEqual(response.json["errors"], {"cmi.suspend_data": "101"})
+        # Values are stored as strings, in full up to SCORM_CMI_MAX_VALUE_LENGTH
+        self.assertEqual(
+            xblock.get_value("cmi.core.lesson_location"), str({"zlib": "x"})
+        )
+        self.assertEqual(xblock.get_value("cmi.student_preference.audio"), "5")
+        self.assertEqual(xblock.get_value("cmi.comments"), "a" * 5000)
+        xblock.student_view()
+
+    def test_scorm_commit_success_status(self):
+        xblock = self.make_one(has_score=True, _scorm_version="2004 4th Edition")
+        values = {
+            "cmi.score.scaled": "0.75",
+            "cmi.completion_status": "completed",
+            "cmi.success_status": "passed",
+        }
+
+        xblock.scorm_commit(
+            mock.Mock(
+                method="POST", body=json.dumps({"values": values}).encode("utf-8")
+            )
+        )
+
+        self.assertEqual(xblock._success_status, "passed")
+        self.assertEqual(xblock.lesson_score, 0.75)
+        xblock.runtime.publish.assert_any_call(
+            xblock, "grade", {"value": 0.75, "max_value": 1}
+        )
+
+    @ddt.data(
+        ("1.2", "cmi.core.session_time", "404"),
+        ("1.2", "cmi.interactions.0.id", "404"),
+        ("1.2", "cmi.location", "401"),
+        ("2004 4th Edition", "cmi.exit", "405"),
+        ("2004 4th Edition", "cmi.core.lesson_status", "401"),
+    )
+    @ddt.unpack
+    def test_scorm_get_invalid_element(self, scorm_version, name, error):
+        xblock = self.make_one(_scorm_version=scorm_version)
+
+        response = xblock.scorm_get_value(
+            mock.Mock(method="POST", body=json.dumps({"name": name}).encode("utf-8"))
+        )
+
+        self.assertEqual(response.json, {"value": "", "error": error})
+
+    @ddt.data(
+        ("1.2", "cmi.core.score._children", "raw,max,min"),
+        (
+            "1.2",
+            "cmi.interactions._children",
+            "id,objectives,time,type,"
+            "correct_responses,weighting,student_response,result,latency",
+        ),
+        ("2004 4th Edition", "cmi.objectives.3.score._children", "scaled,raw,min,max"),
+    )
+    @ddt.unpack
+    def test_scorm_get_children(self, scorm_version, name, children):
+        xblock = self.make_one(_scorm_version=scorm_version)
+
+        response = xblock.scorm_get_value(
+            mock.Mock(method="POST", body=json.dumps({"name": name}).encode("utf-8"))
+        )
+
+        self.assertEqual(response.json, {"value": children})
+
+    @mock.patch("abstract_scorm_xblock.scormxblock.AbstractScormXBlock.emit_completion")
+    def test_scorm_commit_unchanged_values(self, emit_completion):
+        xblock = self.make_one(has_score=True)
+        values = {
+            "cmi.core.lesson_location": "slide_3",
+            "cmi.core.score.raw": "80",
+            "cmi.core.lesson_status": "completed",
+        }
+        request = mock.Mock(
+            method="POST", body=json.dumps({"values": values}).encode("utf-8")
+        )
+        xblock.scorm_commit(request)
+        xblock.save()
+        emit_completion.reset_mock()
+        xblock.runtime.publish.reset_mock()
+        runtime_stats.reset()
+
+        xblock.scorm_commit(request)
+
+        self.assertEqual(xblock._get_fields_to_save(), [])
+        emit_completion.assert_not_called()
+        xblock.runtime.publish.assert_not_called()
+        self.assertEqual(runtime_stats.get("cmi_writes_skipped"), 3)
+        self.assertEqual(runtime_stats.get("grade_events_skipped"), 2)
+
+    def test_publish_grade_once(self):
+        xblock = self.make_one(has_score=True)
+        for values in [
+            {"cmi.core.score.raw": "80", "cmi.core.lesson_status": "completed"},
+            {"cmi.core.lesson_status": "passed"},
+            {"cmi.core.lesson_status": "completed"},
+            {"cmi.core.score.raw": "90"},
+            {"cmi.core.lesson_status": "passed"},
+        ]:
+            xblock.scorm_commit(
+                mock.Mock(
+                    method="POST", body=json.dumps({"values": values}).encode("utf-8")
+                )
+            )
+
+        self.assertEqual(
+            [
+                call
+                for call in xblock.runtime.publish.call_args_list
+                if call[0][1] == "grade"
+            ],
+            [
+                mock.call(xblock, "grade", {"value": 0.8, "max_value": 1}),
+                mock.call(xblock, "grade", {"value": 0.9, "max_value": 1}),
+            ],
+        )
+
+    @override_settings(SCORM_GRADE_PUBLISH_MODE="commit")
+    @mock.patch("abstract_scorm_xblock.scormxblock.AbstractScormXBlock.emit_completion")
+    def test_publish_grade_on_commit(self, emit_completion):
+        xblock = self.make_one(has_score=True)
+        for values in [
+            {"cmi.core.score.raw": "50", "cmi.core.lesson_status": "incomplete"},
+            {"cmi.core.score.raw": "80", "cmi.core.lesson_status": "completed"},
+        ]:
+            xblock.scorm_commit(
+                mock.Mock(
+                    method="POST", body=json.dumps({"values": values}).encode("utf-8")
+                )
+            )
+        xblock.runtime.publish.assert_not_called()
+
+        for _ in range(2):
+            xblock.scorm_commit(
+                mock.Mock(
+                    method="POST",
+                    body=json.dumps({"values": {}, "commit": True}).encode("utf-8"),
+                )
+            )
+        xblock.runtime.publish.assert_called_once_with(
+            xblock, "grade", {"value": 0.8, "max_value": 1}
+        )
+
+    @ddt.data(
+        (
+            ScormVersions["SCORM_12"].value,
+            [
+                "cmi.core.student_id",
+                "cmi.core.student_name",
+                "cmi.core.lesson_status",
+                "cmi.core.lesson_location",
+                "cmi.core.score.raw",
+                "cmi.suspend_data",
+            ],
+        ),
+        (
+            ScormVersions["SCORM_2004_4_EDITION"].value,
+            [
+                "cmi.learner_id",
+                "cmi.learner_name",
+                "cmi.completion_status",
+                "cmi.success_status",
+                "cmi.location",
+                "cmi.score.raw",
+                "cmi.suspend_data",
+            ],
+        ),
+    )
+    @ddt.unpack
+    def test_student_view_cmi_data(self, scorm_version, session_elements):
+        """
+        The elements read by a typical SCO session are shipped with the
+        XBlock, so that no `scorm_get_value` request is needed.
+        """
+        xblock = self.make_one(
+            _scorm_version=scorm_version,
+            _lesson_status="incomplete",
+            _success_status="unknown",
+            lesson_score=0.5,
+            _scorm_data={
+                "cmi.core.lesson_location": "slide_2",
+                "cmi.location": "slide_2",
+                "cmi.suspend_data": "abc",
+            },
+        )
+        xblock.runtime.service.return_value.get_current_user.return_value.opt_attrs = {
+            "edx-platform.user_id": 1,
+            "edx-platform.username": "learner",
+        }
+        fragment = xblock.student_view()
+        cmi_data = fragment.json_init_args["cmi_data"]
+
+        for name in session_elements:
+            self.assertIn(name, cmi_data)
+            self.assertEqual(
+                cmi_data[name],
+                xblock.scorm_get_value(
+                    mock.Mock(
+                        method="POST", body=json.dumps({"name": name}).encode("utf-8")
+                    )
+                ).json["value"],
+            )
+
+    @ddt.data(
+        (
+            ScormVersions["SCORM_12"].value,
+            {
+                "cmi.core.entry": "ab-initio",
+                "cmi.core.credit": "credit",
+                "cmi.core.lesson_mode": "normal",
+                "cmi.core.lesson_location": "",
+                "cmi.suspend_data": "",
+                "cmi.launch_data": "",
+                "cmi.student_data.mastery_score": "",
+                "cmi.interactions._count": 0,
+                "cmi.core._children": (
+                    "student_id,student_name,lesson_location,credit,lesson_status,"
+                    "entry,score,total_time,lesson_mode,exit,session_time"
+                ),
+            },
+        ),
+        (
+            ScormVersions["SCORM_2004_4_EDITION"].value,
+            {
+                "cmi.entry": "ab-initio",
+                "cmi.credit": "credit",
+                "cmi.mode": "normal",
+                "cmi.location": "",
+                "cmi.suspend_data": "",
+                "cmi.objectives._count": 0,
+                "cmi.score._children": "scaled,raw,min,max",
+            },
+        ),
+    )
+    @ddt.unpack
+    def test_student_view_cmi_data_first_launch(self, scorm_version, defaults):
+        """
+        All the readable elements are shipped with the XBlock for learners
+        without stored data too
+        """
+        xblock = self.make_one(_scorm_version=scorm_version, _scorm_data={})
+        cmi_data = xblock.student_view().json_init_args["cmi_data"]
+
+        for name, element in get_cmi_model(scorm_version)["elements"].items():
+            if ".n." not in name and element[0] != "w":
+                self.assertIn(name, cmi_data)
+        for name, value in defaults.items():
+            self.assertEqual(cmi_data[name], value)
+            self.assertEqual(
+                xblock.scorm_get_value(
+                    mock.Mock(
+                        method="POST", body=json.dumps({"name": name}).encode("utf-8")
+                    )
+                ).json["value"],
+                value,
+            )
+
+    def test_cmi_data_resume(self):
+        xblock = self.make_one(
+            _scorm_data={
+                "cmi.suspend_data": "abc",
+                "cmi.objectives.0.id": "obj_1",
+                "cmi.objectives.1.id": "obj_2",
+            }
+        )
+        cmi_data = xblock.get_cmi_data()
+
+        self.assertEqual(cmi_data["cmi.core.entry"], "resume")
+        self.assertEqual(cmi_data["cmi.objectives._count"], 2)
+        self.assertEqual(xblock.get_value("cmi.objectives._count"), 2)
+
     @ddt.data(
-        {"name": "cmi.core.lesson_status"},
-        {"name": "cmi.completion_status"},
-        {"name": "cmi.success_status"},
+        ("1.2", {"name": "cmi.core.lesson_status"}),
+        ("2004 4th Edition", {"name": "cmi.completion_status"}),
+        ("2004 4th Edition", {"name": "cmi.success_status"}),
     )
-    def test_scorm_get_status(self, value):
-        xblock = self.make_one(_lesson_status="status", _success_status="status")
+    @ddt.unpack
+    def test_scorm_get_status(self, scorm_version, value):
+        xblock = self.make_one(
+            _lesson_status="status",
+            _success_status="status",
+            _scorm_version=scorm_version,
+        )
 
         response = xblock.scorm_get_value(
             mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
@@ -192,11 +1032,12 @@ class AbstractScormXBlockTests(unittest.TestCase):
         self.assertEqual(response.json, {"value": "status"})
 
     @ddt.data(
-        {"name": "cmi.core.score.raw"},
-        {"name": "cmi.score.raw"},
+        ("1.2", {"name": "cmi.core.score.raw"}),
+        ("2004 4th Edition", {"name": "cmi.score.raw"}),
     )
-    def test_scorm_get_lesson_score(self, value):
-        xblock = self.make_one(lesson_score=0.2)
+    @ddt.unpack
+    def test_scorm_get_lesson_score(self, scorm_version, value):
+        xblock = self.make_one(lesson_score=0.2, _scorm_version=scorm_version)
 
         response = xblock.scorm_get_value(
             mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
@@ -205,17 +1046,19 @@ class AbstractScormXBlockTests(unittest.TestCase):
         self.assertEqual(response.json, {"value": 20})
 
     @ddt.data(
-        {"name": "cmi.core.lesson_location"},
-        {"name": "cmi.location"},
-        {"name": "cmi.suspend_data"},
+        ("1.2", {"name": "cmi.core.lesson_location"}),
+        ("2004 4th Edition", {"name": "cmi.location"}),
+        ("1.2", {"name": "cmi.suspend_data"}),
     )
-    def test_get_other_scorm_values(self, value):
+    @ddt.unpack
+    def test_get_other_scorm_values(self, scorm_version, value):
         xblock = self.make_one(
+            _scorm_version=scorm_version,
             _scorm_data={
                 "cmi.core.lesson_location": 1,
                 "cmi.location": 2,
                 "cmi.suspend_data": [1, 2],
-            }
+            },
         )
 
         response = xblock.scorm_get_value(
@@ -223,3 +1066,1827 @@ class AbstractScormXBlockTests(unittest.TestCase):
         )
 
         self.assertEqual(response.json, {"value": xblock._scorm_data[value["name"]]})
+
+
+class FlakyStorage(FileSystemStorage):
+    """
+    Local filesystem storage failing the first save of each file,
+    and recording the order of successful saves
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.failed = set()
+        self.saved = []
+
+    def _save(self, name, content):
+        with self.lock:
+            if name not in self.failed:
+                self.failed.add(name)
+                raise IOError("Connection reset")
+        name = super()._save(name, content)
+        with self.lock:
+            self.saved.append(name)
+        return name
+
+
+class ScormExtractionTests(LocalStorageMixin, unittest.TestCase):
+    @override_settings(SCORM_EXTRACTION_SPOOL_MAX_SIZE=1024)
+    def test_spool_scorm_package(self):
+        small = b"x" * 1024
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", make_contentstore(small)
+        ):
+            scorm_file = spool_scorm_package("asset_key")
+        self.assertIsInstance(scorm_file, io.BytesIO)
+        self.assertEqual(scorm_file.read(), small)
+
+        big = b"x" * 1025
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", make_contentstore(big)
+        ):
+            scorm_file = spool_scorm_package("asset_key")
+        self.assertNotIsInstance(scorm_file, io.BytesIO)
+        self.assertEqual(scorm_file.read(), big)
+        scorm_file.close()
+
+    def test_extract_scorm_package(self):
+        files = {
+            "imsmanifest.xml": b"<manifest/>",
+            "index.html": b"<html></html>",
+            "assets/app.js": b"var a = 1;",
+        }
+        extract_scorm_package(io.BytesIO(make_scorm_zipfile(files)), "scorm/md5")
+
+        for filename, data in files.items():
+            with self.storage.open("scorm/md5/" + filename) as f:
+                self.assertEqual(f.read(), data)
+        with self.storage.open("scorm/md5.meta/index.json") as f:
+            index = json.load(f)
+        self.assertEqual(set(index["files"]), set(files))
+        entry = index["files"]["assets/app.js"]
+        self.assertEqual(entry["size"], len(files["assets/app.js"]))
+        self.assertEqual(entry["sha256"], hashlib.sha256(b"var a = 1;").hexdigest())
+        self.assertIn(
+            entry["content_type"], ["application/javascript", "text/javascript"]
+        )
+
+    @override_settings(SCORM_EXTRACTION_SPOOL_MAX_SIZE=1024 * 1024)
+    def test_extraction_memory_is_bounded(self):
+        member_size = 16 * 1024 * 1024
+        scorm_data = make_scorm_zipfile(
+            {"imsmanifest.xml": b"<manifest/>", "video.mp4": b"\0" * member_size},
+            compression=zipfile.ZIP_STORED,
+        )
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore",
+            make_contentstore(scorm_data, chunk_size=64 * 1024),
+        ):
+            del scorm_data
+            tracemalloc.start()
+            try:
+                with spool_scorm_package("asset_key") as scorm_file:
+                    extract_scorm_package(scorm_file, "scorm/md5")
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertEqual(self.storage.size("scorm/md5/video.mp4"), member_size)
+        self.assertLess(peak, member_size / 4)
+
+    @override_settings(SCORM_EXTRACTION_WORKERS=4, SCORM_EXTRACTION_RETRY_DELAY=0)
+    def test_parallel_extraction(self):
+        files = {"imsmanifest.xml": b"<manifest/>"}
+        files.update(
+            {"story_content/{}.js".format(i): str(i).encode() for i in range(200)}
+        )
+        storage = FlakyStorage(location=self.storage_dir)
+        with mock.patch("abstract_scorm_xblock.extraction.default_storage", storage):
+            extract_scorm_package(io.BytesIO(make_scorm_zipfile(files)), "scorm/md5")
+
+        self.assertEqual(len(storage.saved), len(files))
+        self.assertEqual(storage.saved[-1], "scorm/md5/imsmanifest.xml")
+        for filename, data in files.items():
+            with storage.open("scorm/md5/" + filename) as f:
+                self.assertEqual(f.read(), data)
+
+    @override_settings(SCORM_EXTRACTION_RETRIES=0)
+    def test_failed_extraction_has_no_manifest(self):
+        files = {"imsmanifest.xml": b"<manifest/>", "index.html": b"<html></html>"}
+        storage = FlakyStorage(location=self.storage_dir)
+        with mock.patch("abstract_scorm_xblock.extraction.default_storage", storage):
+            with self.assertRaises(IOError):
+                extract_scorm_package(
+                    io.BytesIO(make_scorm_zipfile(files)), "scorm/md5"
+                )
+
+        self.assertFalse(storage.exists("scorm/md5/imsmanifest.xml"))
+
+    @mock.patch("abstract_scorm_xblock.tasks.extract_scorm_package_task")
+    def test_schedule_extraction_is_deduplicated(self, extract_scorm_package_task):
+        scorm_package = {
+            "md5": "0d599f0ec05c3bda8c3b8a68c32a1b47",
+            "asset_key": "asset-v1:org+course+run+type@asset+block@package.zip",
+        }
+        unmark_package_extracted(scorm_package["md5"])
+        cache.delete(make_cache_key("extraction", scorm_package["md5"]))
+
+        for _ in range(3):
+            status = schedule_scorm_package_extraction(scorm_package)
+            self.assertEqual(status["state"], "pending")
+        extract_scorm_package_task.delay.assert_called_once_with(
+            scorm_package["asset_key"], scorm_package["md5"]
+        )
+
+    @override_settings(SCORM_EXTRACTION_LOCK_POLL_INTERVAL=0.01)
+    def test_concurrent_extraction_is_single_flight(self):
+        scorm_data = make_scorm_zipfile(
+            {"imsmanifest.xml": SCORM_MANIFEST, "story.html": b"<html></html>"}
+        )
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        unmark_package_extracted(md5)
+        contentstore = make_contentstore(scorm_data)
+        barrier = threading.Barrier(20)
+        errors = []
+
+        def extract():
+            barrier.wait()
+            try:
+                extract_scorm_package_once("asset_key", md5, wait=10)
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        with mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            threads = [threading.Thread(target=extract) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(contentstore.return_value.find.call_count, 1)
+        self.assertTrue(is_package_extracted(md5))
+        self.assertTrue(self.storage.exists("scorm_packages/{}/story.html".format(md5)))
+
+    @mock.patch("abstract_scorm_xblock.tasks.repair_scorm_package_task")
+    def test_student_view_preparing_content(self, repair_scorm_package_task):
+        # Packages missing from the storage are extracted in the background,
+        # never while rendering the XBlock
+        md5 = "1b6453892473a467d07372d45eb05abc"
+        unmark_package_extracted(md5)
+        cache.delete(make_cache_key("extraction", md5))
+        xblock = AbstractScormXBlock(
+            mock.MagicMock(course_id="course-v1:org+course+run"),
+            DictFieldData(
+                {
+                    "scorm_file": "package.zip",
+                    "_scorm_url": "/abstract_scorm_xblock/{}/index.html".format(md5),
+                }
+            ),
+            mock.MagicMock(),
+        )
+
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore"
+        ) as contentstore:
+            for _ in range(2):
+                fragment = xblock.student_view()
+                self.assertIn("scorm_preparing_content", fragment.body_html())
+
+        contentstore.assert_not_called()
+        repair_scorm_package_task.delay.assert_called_once_with(
+            "course-v1:org+course+run", "package.zip", md5
+        )
+
+        # Failed repairs are reported, not retried
+        set_extraction_status(
+            md5, ExtractionProgress.make_status(ExtractionProgress.FAILED, "error")
+        )
+        fragment = xblock.student_view()
+        self.assertNotIn("scorm_preparing_content", fragment.body_html())
+        repair_scorm_package_task.delay.assert_called_once()
+
+        # Stale done statuses are rescheduled
+        set_extraction_status(
+            md5, ExtractionProgress.make_status(ExtractionProgress.DONE)
+        )
+        xblock.student_view()
+        self.assertEqual(repair_scorm_package_task.delay.call_count, 2)
+
+    def test_repair_scorm_package_task(self):
+        scorm_data = make_scorm_zipfile({"imsmanifest.xml": SCORM_MANIFEST})
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        unmark_package_extracted(md5)
+        contentstore = make_contentstore(scorm_data)
+        contentstore.return_value.get_all_content_for_course.return_value = (
+            [{"md5": md5, "asset_key": "asset_key", "contentType": "application/zip"}],
+            1,
+        )
+
+        with mock.patch(
+            "abstract_scorm_xblock.extraction.contentstore", contentstore
+        ), mock.patch("abstract_scorm_xblock.tasks.AssetKey"):
+            repair_scorm_package_task(
+                "course-v1:org+course+run", "package.zip", "0" * 32
+            )
+            self.assertEqual(get_extraction_status("0" * 32)["state"], "failed")
+            self.assertFalse(self.storage.exists("scorm_packages/{}".format("0" * 32)))
+
+            repair_scorm_package_task("course-v1:org+course+run", "package.zip", md5)
+            self.assertEqual(get_extraction_status(md5)["state"], "done")
+            self.assertTrue(is_package_extracted(md5))
+
+
+@ddt.ddt
+class ScormDataModelTests(unittest.TestCase):
+    def make_interactions(self, count):
+        values = {}
+        for i in range(count):
+            values.update(
+                {
+                    "cmi.interactions.{}.id".format(i): "Scene1_QuestionDraw{}".format(
+                        i
+                    ),
+                    "cmi.interactions.{}.type".format(i): "choice",
+                    "cmi.interactions.{}.result".format(i): "correct",
+                    "cmi.interactions.{}.latency".format(i): "PT1M30S",
+                    "cmi.interactions.{}.learner_response".format(i): "choice_a",
+                }
+            )
+        return values
+
+    def test_interactions_are_compact(self):
+        values = self.make_interactions(100)
+        scorm_data = {}
+        for name, value in values.items():
+            set_cmi_value(scorm_data, name, value)
+
+        self.assertEqual(list(scorm_data), ["cmi.interactions"])
+        self.assertEqual(len(scorm_data["cmi.interactions"]), 100)
+        self.assertEqual(get_cmi_value(scorm_data, "cmi.interactions._count"), 100)
+        for name, value in values.items():
+            self.assertEqual(get_cmi_value(scorm_data, name), value)
+        self.assertEqual(
+            dict(iter_cmi_values(scorm_data)),
+            dict(values, **{"cmi.interactions._count": 100}),
+        )
+        self.assertLess(len(json.dumps(scorm_data)), len(json.dumps(values)) * 0.7)
+
+    def test_legacy_interactions(self):
+        scorm_data = {
+            "cmi.interactions.0.id": "q1",
+            "cmi.interactions.0.result": "wrong",
+            "cmi.location": "slide_2",
+        }
+        self.assertEqual(get_cmi_value(scorm_data, "cmi.interactions.0.id"), "q1")
+
+        set_cmi_value(scorm_data, "cmi.interactions.1.id", "q2")
+        self.assertEqual(
+            scorm_data,
+            {
+                "cmi.interactions": [{"id": "q1", "result": "wrong"}, {"id": "q2"}],
+                "cmi.location": "slide_2",
+            },
+        )
+
+    @override_settings(SCORM_CMI_MAX_INTERACTIONS=2)
+    def test_interactions_are_bounded(self):
+        scorm_data = {}
+        for i in range(2):
+            set_cmi_value(scorm_data, "cmi.interactions.{}.id".format(i), "q")
+        with self.assertRaises(ScormValueDiscardedException):
+            set_cmi_value(scorm_data, "cmi.interactions.2.id", "q")
+        with self.assertRaises(ScormValueDiscardedException):
+            set_cmi_value(scorm_data, "cmi.interactions.5.id", "q")
+        self.assertEqual(len(scorm_data["cmi.interactions"]), 2)
+
+    def test_suspend_data(self):
+        suspend_data = "2m5c1001a0101201112~2e3" * 2500
+        scorm_data = {}
+        set_cmi_value(scorm_data, "cmi.suspend_data", suspend_data)
+
+        # Values longer than the SPM are kept in full
+        self.assertEqual(get_cmi_value(scorm_data, "cmi.suspend_data"), suspend_data)
+        self.assertIn("zlib", scorm_data["cmi.suspend_data"])
+        self.assertLess(len(json.dumps(scorm_data)), len(suspend_data) / 10)
+
+    def test_invalid_compressed_value(self):
+        scorm_data = {"cmi.suspend_data": {"zlib": "x"}}
+        self.assertEqual(get_cmi_value(scorm_data, "cmi.suspend_data"), "")
+
+
+@ddt.ddt
+class ScormCMITests(unittest.TestCase):
+    @ddt.data(
+        # SCORM 1.2
+        ("1.2", "cmi.core.lesson_location", "slide_3", None),
+        ("1.2", "cmi.core.lesson_status", "passed", None),
+        ("1.2", "cmi.core.lesson_status", "not attempted", "405"),
+        ("1.2", "cmi.core.lesson_status", "done", "405"),
+        ("1.2", "cmi.core.score.raw", "85.5", None),
+        ("1.2", "cmi.core.score.raw", "", None),
+        ("1.2", "cmi.core.score.raw", "101", "405"),
+        ("1.2", "cmi.core.score.raw", "eighty", "405"),
+        ("1.2", "cmi.core.exit", "suspend", None),
+        ("1.2", "cmi.core.session_time", "0001:30:00.5", None),
+        ("1.2", "cmi.core.session_time", "PT1H30M", "405"),
+        ("1.2", "cmi.core.student_id", "someone", "403"),
+        ("1.2", "cmi.core._children", "raw", "402"),
+        ("1.2", "cmi.interactions._count", "3", "402"),
+        ("1.2", "cmi.interactions.0.type", "choice", None),
+        ("1.2", "cmi.interactions.0.result", "wrong", None),
+        ("1.2", "cmi.interactions.0.result", "0.5", None),
+        ("1.2", "cmi.interactions.0.result", "incorrect", "405"),
+        ("1.2", "cmi.interactions.0.time", "10:15:00", None),
+        ("1.2", "cmi.interactions.2.objectives.1.id", "objective_1", None),
+        ("1.2", "cmi.interactions.2.objectives.1.id", "objective 1", "405"),
+        ("1.2", "cmi.student_preference.audio", "-1", None),
+        ("1.2", "cmi.student_preference.audio", "101", "405"),
+        ("1.2", "cmi.student_preference.speed", "1.5", "405"),
+        ("1.2", "cmi.location", "slide_3", "401"),
+        ("1.2", "cmi.vendor.data", "x", "401"),
+        # SCORM 2004
+        ("2004 4th Edition", "cmi.location", "slide_3", None),
+        ("2004 4th Edition", "cmi.completion_status", "completed", None),
+        ("2004 4th Edition", "cmi.completion_status", "passed", "406"),
+        ("2004 4th Edition", "cmi.success_status", "failed", None),
+        ("2004 4th Edition", "cmi.score.scaled", "-0.25", None),
+        ("2004 4th Edition", "cmi.score.scaled", "1.01", "407"),
+        ("2004 4th Edition", "cmi.score.raw", "250", None),
+        ("2004 4th Edition", "cmi.progress_measure", "0.5", None),
+        ("2004 4th Edition", "cmi.progress_measure", "2", "407"),
+        ("2004 4th Edition", "cmi.session_time", "PT1H2M3.25S", None),
+        ("2004 4th Edition", "cmi.session_time", "P", "406"),
+        ("2004 4th Edition", "cmi.session_time", "01:00:00", "406"),
+        ("2004 4th Edition", "cmi.exit", "normal", None),
+        ("2004 4th Edition", "cmi.learner_name", "someone", "404"),
+        ("2004 4th Edition", "cmi._version", "1.0", "404"),
+        ("2004 4th Edition", "cmi.interactions.0.result", "incorrect", None),
+        ("2004 4th Edition", "cmi.interactions.0.result", "wrong", "406"),
+        ("2004 4th Edition", "cmi.interactions.0.latency", "PT5S", None),
+        ("2004 4th Edition", "cmi.interactions.0.timestamp", "2021-03-01T10:15Z", None),
+        ("2004 4th Edition", "cmi.interactions.0.timestamp", "yesterday", "406"),
+        ("2004 4th Edition", "cmi.comments_from_learner.0.comment", "Great", None),
+        ("2004 4th Edition", "cmi.comments_from_lms.0.comment", "Great", "404"),
+        ("2004 4th Edition", "cmi.learner_preference.audio_captioning", "1", None),
+        ("2004 4th Edition", "cmi.learner_preference.audio_level", "-1", "407"),
+        ("2004 4th Edition", "cmi.core.lesson_status", "passed", "401"),
+    )
+    @ddt.unpack
+    def test_conformance(self, scorm_version, name, value, error):
+        self.assertEqual(check_cmi_set(name, value, scorm_version), error)
+
+    @ddt.data(("1.2", "101"), ("2004 4th Edition", "351"))
+    @ddt.unpack
+    def test_value_too_long(self, scorm_version, error):
+        self.assertIsNone(
+            check_cmi_set("cmi.suspend_data", "a" * 8000, scorm_version, 8000)
+        )
+        self.assertEqual(
+            check_cmi_set("cmi.suspend_data", "a" * 8001, scorm_version, 8000), error
+        )
+
+    @ddt.data(
+        ("1.2", "cmi.core.exit", "404"),
+        ("1.2", "cmi.interactions.0.latency", "404"),
+        ("1.2", "cmi.core._children", None),
+        ("1.2", "cmi.objectives.0.status", None),
+        ("2004 4th Edition", "cmi.session_time", "405"),
+        ("2004 4th Edition", "cmi.interactions.0.latency", None),
+        ("2004 4th Edition", "cmi.undefined", "401"),
+    )
+    @ddt.unpack
+    def test_get_conformance(self, scorm_version, name, error):
+        self.assertEqual(check_cmi_get(name, scorm_version), error)
+
+    def test_model_patterns(self):
+        model = get_cmi_model("2004 4th Edition")
+        self.assertEqual(json.loads(json.dumps(model)), model)
+        for name, (access, type_, vocabulary, minimum, maximum) in model[
+            "elements"
+        ].items():
+            self.assertIn(access, ["r", "w", "rw"])
+            self.assertTrue(type_ is None or type_ in model["types"])
+
+    def test_unknown_version(self):
+        # Unusual schemaversion strings get the SCORM 1.2 data model
+        self.assertEqual(get_cmi_model("1.2 custom")["edition"], "1.2")
+        self.assertIsNone(check_cmi_set("cmi.core.lesson_location", "a", "1.2 custom"))
+        self.assertEqual(check_cmi_get("cmi.location", "1.2 custom"), "401")
+
+    def test_dispatch_cost(self):
+        names = ["cmi.interactions.{}.result".format(i) for i in range(100)]
+        names += ["cmi.location", "cmi.score.scaled", "cmi.suspend_data"]
+        calls = 100000
+        get_cmi_element.cache_clear()
+        for i in range(calls):
+            check_cmi_set(names[i % len(names)], "0.5", "2004 4th Edition")
+        # Element lookups are cached: the index normalization regex runs once
+        # per name
+        self.assertEqual(get_cmi_element.cache_info().misses, len(names))
+        self.assertEqual(get_cmi_element.cache_info().hits, calls - len(names))
+
+
+# Runs the SCORM API of scormxblock.js with stubs of the browser and the
+# XBlock runtime, then `SCRIPT` which prints its results as JSON
+SCORM_API_HARNESS = """
+var requests = [];
+var beacons = [];
+var ready = null;
+var contentWindow = {document: {open() {}, write() {}, close() {}}};
+global.window = {};
+global.screen = {height: 600, width: 800};
+global.navigator = {
+  sendBeacon(url, data) {
+    beacons.push([url, String(data)]);
+    return true;
+  },
+};
+global.document = {cookie: "csrftoken=token"};
+global.$ = function (arg) {
+  if (typeof arg === "function") {
+    ready = arg;
+  }
+  return {on() {}, html() {}, show() {}, replaceWith() {}, 0: {contentWindow}};
+};
+$.isEmptyObject = (obj) => Object.keys(obj).length === 0;
+$.ajax = function (options) {
+  requests.push(options);
+  return {responseText: '{"value": ""}'};
+};
+eval(require("fs").readFileSync(process.argv[1], "utf8"));
+ScormXBlock(
+  {handlerUrl: (element, name) => "/handler/" + name},
+  {},
+  JSON.parse(process.argv[2])
+);
+ready($);
+var API = contentWindow.API;
+"""
+
+
+@ddt.ddt
+@unittest.skipUnless(shutil.which("node"), "node isn't installed")
+class ScormAPITests(unittest.TestCase):
+    def run_script(self, script, scorm_version, cmi_data):
+        js_settings = {
+            "commit_interval": 60000,
+            "grade_publish_mode": "immediate",
+            "scorm_version": scorm_version,
+            "scorm_url": "/scorm/index.html",
+            "cmi_data": cmi_data,
+            "cmi_model": get_cmi_model(scorm_version),
+            "cmi_max_length": 64000,
+            "preparing_content": False,
+            "scorm_xblock": {"width": None, "height": 450, "popup": False},
+        }
+        output = subprocess.run(
+            [
+                "node",
+                "-e",
+                SCORM_API_HARNESS + script + "\nprocess.exit(0);",
+                pkg_resources.resource_filename(
+                    "abstract_scorm_xblock", "static/js/src/scormxblock.js"
+                ),
+                json.dumps(js_settings),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+        ).stdout
+        return json.loads(output)
+
+    @ddt.data(
+        ("1.2", "LMSGetValue", "LMSSetValue"),
+        ("2004 4th Edition", "GetValue", "SetValue"),
+    )
+    @ddt.unpack
+    def test_array_counts(self, scorm_version, get_value, set_value):
+        """
+        Contents append interactions and objectives at the index given by
+        `_count`, while the values are buffered
+        """
+        script = """
+        var indexes = [];
+        for (var i = 0; i < 3; i++) {
+          var n = API.%(get)s("cmi.interactions._count");
+          API.%(set)s("cmi.interactions." + n + ".id", "q" + i);
+          indexes.push(String(n));
+        }
+        API.%(set)s("cmi.objectives.0.id", "objective");
+        API.%(set)s("cmi.objectives.1.id", "objective");
+        // Elements are appended in sequence
+        var outOfSequence = API.%(set)s("cmi.objectives.5.id", "objective");
+        console.log(JSON.stringify({
+          indexes: indexes,
+          outOfSequence: outOfSequence,
+          interactions: String(API.%(get)s("cmi.interactions._count")),
+          objectives: String(API.%(get)s("cmi.objectives._count")),
+          requests: requests.length,
+        }));
+        """ % {
+            "get": get_value,
+            "set": set_value,
+        }
+        block = AbstractScormXBlock(
+            mock.MagicMock(),
+            DictFieldData({"_scorm_version": scorm_version}),
+            mock.MagicMock(),
+        )
+        block.get_current_user_attributes = mock.Mock(return_value="1")
+
+        result = self.run_script(script, scorm_version, block.get_cmi_data())
+
+        self.assertEqual(
+            result,
+            {
+                "indexes": ["0", "1", "2"],
+                "outOfSequence": "false",
+                "interactions": "3",
+                "objectives": "2",
+                "requests": 0,
+            },
+        )
+
+    def test_beacon(self):
+        # Without keepalive fetch the last values are sent with a beacon,
+        # which carries the CSRF token in its form
+        script = """
+        API.LMSSetValue("cmi.core.lesson_location", "slide_3");
+        API.LMSFinish();
+        console.log(JSON.stringify({beacons: beacons, requests: requests.length}));
+        """
+
+        result = self.run_script(script, "1.2", {})
+
+        self.assertEqual(result["requests"], 0)
+        [(url, data)] = result["beacons"]
+        self.assertEqual(url, "/handler/scorm_commit_beacon")
+        form = QueryDict(data)
+        self.assertEqual(form["csrfmiddlewaretoken"], "token")
+        self.assertEqual(
+            json.loads(form["data"]),
+            {"values": {"cmi.core.lesson_location": "slide_3"}, "commit": True},
+        )
+
+
+@ddt.ddt
+class ScormServeTests(LocalStorageMixin, unittest.TestCase):
+    md5 = "09c1735eaa57d78fe245868f0e07cf7b"
+    indexed_md5 = "2e0b1c4b7d4bd5c44f0bd1d7dbd0cd33"
+
+    def setUp(self):
+        super().setUp()
+        for md5 in [self.md5, self.indexed_md5]:
+            package_indexes.delete(md5)
+            cache.delete(make_cache_key("index", md5))
+        self.storage.save(
+            "scorm_packages/{}/story_content/data.js".format(self.md5),
+            ContentFile(b"window.data = {};"),
+        )
+
+    def serve(self, path, **headers):
+        request = RequestFactory().get("/", **headers)
+        return scormxblock_serve(request, self.md5, path)
+
+    def test_serve_static(self):
+        path = "static/css/scormxblock.css"
+        content, digest = get_static_resource(path)
+        request = RequestFactory().get("/")
+
+        response = scormxblock_static(request, digest, path)
+        self.assertEqual(response.content, content.encode("utf-8"))
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("immutable", response["Cache-Control"])
+
+        # Stale digests are served during rolling deploys, but not cached
+        response = scormxblock_static(request, "0" * 12, path)
+        self.assertEqual(response.content, content.encode("utf-8"))
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        with self.assertRaises(Http404):
+            scormxblock_static(request, digest, "templates/scorm_player.html")
+
+    def test_serve(self):
+        response = self.serve("story_content/data.js")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"window.data = {};")
+        self.assertIn(
+            response["Content-Type"], ["application/javascript", "text/javascript"]
+        )
+        self.assertEqual(response["Content-Length"], "17")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=", response["Cache-Control"])
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertEqual(
+            response["Last-Modified"],
+            http_date(
+                self.storage.get_modified_time(
+                    "scorm_packages/{}/story_content/data.js".format(self.md5)
+                ).timestamp()
+            ),
+        )
+
+    def test_not_found(self):
+        with self.assertRaises(Http404):
+            self.serve("story_content/missing.js")
+
+    def test_if_none_match(self):
+        etag = self.serve("story_content/data.js")["ETag"]
+
+        with mock.patch(
+            "abstract_scorm_xblock.views.default_storage"
+        ) as default_storage:
+            response = self.serve("story_content/data.js", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(default_storage.method_calls, [])
+
+    def test_if_modified_since(self):
+        last_modified = self.serve("story_content/data.js")["Last-Modified"]
+
+        response = self.serve(
+            "story_content/data.js", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.serve(
+            "story_content/data.js", HTTP_IF_MODIFIED_SINCE=http_date(0)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @ddt.data(
+        ("bytes=0-5", 206, b"window", "bytes 0-5/17"),
+        ("bytes=7-", 206, b"data = {};", "bytes 7-16/17"),
+        ("bytes=-3", 206, b"{};", "bytes 14-16/17"),
+        ("bytes=10-100", 206, b"a = {};", "bytes 10-16/17"),
+        ("bytes=0-1,5-6", 200, b"window.data = {};", None),
+        ("bytes=5-1", 200, b"window.data = {};", None),
+        ("pages=1-2", 200, b"window.data = {};", None),
+    )
+    @ddt.unpack
+    def test_range(self, range_header, status_code, content, content_range):
+        response = self.serve("story_content/data.js", HTTP_RANGE=range_header)
+
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(b"".join(response.streaming_content), content)
+        self.assertEqual(response["Content-Length"], str(len(content)))
+        self.assertEqual(response.get("Content-Range"), content_range)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_unsatisfiable_range(self):
+        response = self.serve("story_content/data.js", HTTP_RANGE="bytes=17-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */17")
+
+    def test_if_range(self):
+        response = self.serve("story_content/data.js")
+        for if_range in [response["ETag"], response["Last-Modified"]]:
+            response = self.serve(
+                "story_content/data.js", HTTP_RANGE="bytes=0-5", HTTP_IF_RANGE=if_range
+            )
+            self.assertEqual(response.status_code, 206)
+
+        response = self.serve(
+            "story_content/data.js", HTTP_RANGE="bytes=0-5", HTTP_IF_RANGE='"other"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @ddt.data(
+        (
+            "x-accel-redirect",
+            "X-Accel-Redirect",
+            "/scorm-internal/scorm_packages/{md5}/story_content/data.js",
+        ),
+        (
+            "reverse-proxy",
+            "X-Accel-Redirect",
+            "/scorm-internal/https/bucket.s3.amazonaws.com/scorm_packages/{md5}/story_content/data.js?Signature=abc",
+        ),
+    )
+    @ddt.unpack
+    def test_delivery_backend(self, backend, header, value):
+        with override_settings(
+            SCORM_DELIVERY_BACKEND=backend,
+            SCORM_DELIVERY_INTERNAL_URL="/scorm-internal/",
+        ), mock.patch(
+            "abstract_scorm_xblock.delivery.default_storage"
+        ) as delivery_storage, mock.patch(
+            "abstract_scorm_xblock.views.default_storage"
+        ) as default_storage:
+            delivery_storage.url.side_effect = lambda path: (
+                "https://bucket.s3.amazonaws.com/" + path + "?Signature=abc"
+            )
+            response = self.serve("story_content/data.js")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response[header], value.format(md5=self.md5))
+        self.assertIn(
+            response["Content-Type"], ["application/javascript", "text/javascript"]
+        )
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(default_storage.method_calls, [])
+
+    @ddt.data("..", "../other/secret.txt", "%2e%2e/secret.txt", "a/../../secret.txt")
+    def test_path_traversal(self, path):
+        with override_settings(SCORM_DELIVERY_BACKEND="x-sendfile"), mock.patch(
+            "abstract_scorm_xblock.views.get_delivery_backend"
+        ) as get_delivery_backend, mock.patch(
+            "abstract_scorm_xblock.views.default_storage"
+        ) as default_storage:
+            with self.assertRaises(Http404):
+                self.serve(path)
+
+        get_delivery_backend.assert_not_called()
+        self.assertEqual(default_storage.method_calls, [])
+
+    @override_settings(SCORM_DELIVERY_BACKEND="x-sendfile")
+    def test_x_sendfile(self):
+        response = self.serve("story_content/data.js")
+
+        self.assertEqual(
+            response["X-Sendfile"],
+            self.storage.path(
+                "scorm_packages/{}/story_content/data.js".format(self.md5)
+            ),
+        )
+
+    def extract_indexed_package(self):
+        files = {
+            "imsmanifest.xml": SCORM_MANIFEST,
+            "story_content/data.js": b"window.data = {};",
+        }
+        extract_scorm_package(
+            io.BytesIO(make_scorm_zipfile(files)),
+            "scorm_packages/{}".format(self.indexed_md5),
+        )
+
+    def serve_indexed(self, path, **headers):
+        request = RequestFactory().get("/", **headers)
+        return scormxblock_serve(request, self.indexed_md5, path)
+
+    def test_storage_calls_per_request(self):
+        """
+        Packages with an index are served with a single storage call,
+        instead of exists, get_modified_time, open and size
+        """
+        self.extract_indexed_package()
+        get_package_index(self.indexed_md5)
+
+        calls = {}
+        for md5 in [self.md5, self.indexed_md5]:
+            with mock.patch(
+                "abstract_scorm_xblock.views.default_storage", wraps=self.storage
+            ) as default_storage:
+                request = RequestFactory().get("/")
+                response = scormxblock_serve(request, md5, "story_content/data.js")
+                self.assertEqual(
+                    b"".join(response.streaming_content), b"window.data = {};"
+                )
+            calls[md5] = [call[0] for call in default_storage.method_calls]
+
+        self.assertEqual(calls[self.md5], ["exists", "get_modified_time", "open"])
+        self.assertEqual(calls[self.indexed_md5], ["open"])
+
+    def test_not_found_in_index(self):
+        self.extract_indexed_package()
+
+        with mock.patch(
+            "abstract_scorm_xblock.views.default_storage"
+        ) as default_storage:
+            with self.assertRaises(Http404):
+                scormxblock_serve(
+                    RequestFactory().get("/"), self.indexed_md5, "missing.js"
+                )
+        self.assertEqual(default_storage.method_calls, [])
+
+    def extract_precompressed_package(self, use_brotli=False):
+        files = {
+            "imsmanifest.xml": SCORM_MANIFEST,
+            "story_content/data.js": b"window.data = {};" * 100,
+            "story_content/small.js": b"var a;",
+        }
+        with override_settings(SCORM_PRECOMPRESS=True), mock.patch(
+            "abstract_scorm_xblock.extraction.brotli", brotli if use_brotli else None
+        ):
+            extract_scorm_package(
+                io.BytesIO(make_scorm_zipfile(files)),
+                "scorm_packages/{}".format(self.indexed_md5),
+            )
+
+    def test_precompressed_variants(self):
+        self.extract_precompressed_package()
+
+        index = get_package_index(self.indexed_md5)
+        self.assertIn("gzip", index["files"]["story_content/data.js"]["encodings"])
+        self.assertNotIn("encodings", index["files"]["story_content/small.js"])
+        self.assertNotIn("encodings", index["files"]["imsmanifest.xml"])
+        with self.storage.open(
+            "scorm_packages/{}.meta/gzip/story_content/data.js".format(self.indexed_md5)
+        ) as f:
+            self.assertEqual(
+                zlib.decompress(f.read(), 16 + zlib.MAX_WBITS),
+                b"window.data = {};" * 100,
+            )
+
+    @ddt.data(
+        ("gzip, deflate", "gzip"),
+        ("*", "gzip"),
+        ("deflate, gzip;q=0", None),
+        ("identity", None),
+        ("", None),
+    )
+    @ddt.unpack
+    def test_accept_encoding(self, accept_encoding, encoding):
+        self.extract_precompressed_package()
+        identity_etag = self.serve_indexed("story_content/data.js")["ETag"]
+
+        response = self.serve_indexed(
+            "story_content/data.js", HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+
+        self.assertEqual(response.get("Content-Encoding"), encoding)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Length"], str(len(content)))
+        if encoding:
+            self.assertNotEqual(response["ETag"], identity_etag)
+            content = zlib.decompress(content, 16 + zlib.MAX_WBITS)
+        self.assertEqual(content, b"window.data = {};" * 100)
+
+    @override_settings(
+        SCORM_DELIVERY_BACKEND="x-accel-redirect",
+        SCORM_DELIVERY_INTERNAL_URL="/scorm-internal/",
+    )
+    def test_precompressed_variants_with_delivery_backend(self):
+        # The web server would send a variant without its Content-Encoding
+        self.extract_precompressed_package()
+        identity_etag = self.serve_indexed("story_content/data.js")["ETag"]
+
+        response = self.serve_indexed(
+            "story_content/data.js", HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/scorm-internal/scorm_packages/{}/story_content/data.js".format(
+                self.indexed_md5
+            ),
+        )
+        self.assertNotIn("Content-Encoding", response)
+        self.assertNotIn("Vary", response)
+        self.assertEqual(response["ETag"], identity_etag)
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        self.extract_precompressed_package(use_brotli=True)
+
+        response = self.serve_indexed(
+            "story_content/data.js", HTTP_ACCEPT_ENCODING="gzip, deflate, br"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(
+            brotli.decompress(b"".join(response.streaming_content)),
+            b"window.data = {};" * 100,
+        )
+
+    def test_compressed_file_has_no_content_encoding(self):
+        self.storage.save(
+            "scorm_packages/{}/story_content/data.json.gz".format(self.md5),
+            ContentFile(b"\x1f\x8b"),
+        )
+
+        response = self.serve("story_content/data.json.gz", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertNotIn("Content-Encoding", response)
+
+    def store_zip_package(self, compression, files=None):
+        files = files or {
+            "imsmanifest.xml": SCORM_MANIFEST,
+            "story_content/data.js": b"window.data = {};",
+        }
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        zip_cache = mock.patch(
+            "abstract_scorm_xblock.zipstore.zip_cache",
+            LocalFileCache(cache_dir, 1024 * 1024),
+        )
+        zip_cache.start()
+        self.addCleanup(zip_cache.stop)
+        store_scorm_package(
+            io.BytesIO(make_scorm_zipfile(files, compression)),
+            "scorm_packages/{}".format(self.indexed_md5),
+        )
+
+    @ddt.data(zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+    def test_zip_mode(self, compression):
+        self.store_zip_package(compression)
+
+        self.assertTrue(
+            self.storage.exists(
+                "scorm_packages/{}.meta/package.zip".format(self.indexed_md5)
+            )
+        )
+        self.assertEqual(
+            self.storage.listdir("scorm_packages/{}".format(self.indexed_md5)),
+            ([], ["imsmanifest.xml"]),
+        )
+
+        response = self.serve_indexed("story_content/data.js")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"window.data = {};")
+        self.assertEqual(response["Content-Length"], "17")
+
+        with mock.patch(
+            "abstract_scorm_xblock.cache.default_storage"
+        ) as default_storage:
+            response = self.serve_indexed(
+                "story_content/data.js", HTTP_RANGE="bytes=7-10"
+            )
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b"".join(response.streaming_content), b"data")
+        # The zip is read from the local cache
+        self.assertEqual(default_storage.method_calls, [])
+
+        with self.assertRaises(Http404):
+            self.serve_indexed("story_content/missing.js")
+
+    def test_zip_mode_deflated_ranges(self):
+        content = "".join(str(i) for i in range(100000)).encode("ascii")
+        self.store_zip_package(
+            zipfile.ZIP_DEFLATED,
+            {"imsmanifest.xml": SCORM_MANIFEST, "story_content/data.js": content},
+        )
+
+        # Deflated members are read without parsing the zip
+        with mock.patch(
+            "abstract_scorm_xblock.zipstore.ZipFile", side_effect=AssertionError
+        ):
+            response = self.serve_indexed("story_content/data.js")
+            self.assertEqual(b"".join(response.streaming_content), content)
+            for start, end in [(0, 0), (7, 10), (100000, 300000), (488880, 488889)]:
+                response = self.serve_indexed(
+                    "story_content/data.js",
+                    HTTP_RANGE="bytes={}-{}".format(start, end),
+                )
+                self.assertEqual(
+                    b"".join(response.streaming_content), content[start : end + 1]
+                )
+
+    def test_asset_cache(self):
+        self.extract_indexed_package()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        asset_cache = LocalFileCache(cache_dir, 1024 * 1024)
+
+        with mock.patch("abstract_scorm_xblock.views.asset_cache", asset_cache):
+            response = self.serve_indexed("story_content/data.js")
+            self.assertEqual(b"".join(response.streaming_content), b"window.data = {};")
+            with mock.patch(
+                "abstract_scorm_xblock.cache.default_storage"
+            ) as default_storage:
+                response = self.serve_indexed(
+                    "story_content/data.js", HTTP_RANGE="bytes=7-10"
+                )
+                self.assertEqual(b"".join(response.streaming_content), b"data")
+            self.assertEqual(default_storage.method_calls, [])
+
+            with override_settings(SCORM_ASSET_CACHE_MAX_FILE_SIZE=10):
+                self.serve_indexed("story_content/data.js")
+
+        self.assertEqual(asset_cache.stats.as_dict(), {"hits": 1, "misses": 1})
+
+    def extract_blob_packages(self):
+        shared = b"var player = {};" * 100
+        for md5, content in [(self.md5, b"var a;"), (self.indexed_md5, b"var b;")]:
+            files = {
+                "imsmanifest.xml": SCORM_MANIFEST,
+                "lib/player.js": shared,
+                "story_content/data.js": content,
+            }
+            with override_settings(SCORM_STORAGE_MODE="blobs"):
+                extract_scorm_package(
+                    io.BytesIO(make_scorm_zipfile(files)),
+                    "scorm_packages/{}".format(md5),
+                )
+
+    def list_blobs(self):
+        blobs = []
+        prefixes, _ = self.storage.listdir("scorm_packages/_blobs")
+        for prefix in prefixes:
+            blobs += self.storage.listdir("scorm_packages/_blobs/" + prefix)[1]
+        return sorted(blobs)
+
+    def test_blob_store(self):
+        self.extract_blob_packages()
+
+        # The shared file is saved once, the manifest isn't saved as a blob
+        self.assertEqual(
+            self.list_blobs(),
+            sorted(
+                hashlib.sha256(data).hexdigest()
+                for data in [b"var player = {};" * 100, b"var a;", b"var b;"]
+            ),
+        )
+        self.assertFalse(
+            self.storage.exists("scorm_packages/{}/lib/player.js".format(self.md5))
+        )
+        for md5, content in [(self.md5, b"var a;"), (self.indexed_md5, b"var b;")]:
+            response = scormxblock_serve(
+                RequestFactory().get("/"), md5, "story_content/data.js"
+            )
+            self.assertEqual(b"".join(response.streaming_content), content)
+        response = self.serve("imsmanifest.xml")
+        self.assertEqual(b"".join(response.streaming_content), SCORM_MANIFEST)
+
+    def test_gc_blobs(self):
+        self.extract_blob_packages()
+        shutil.rmtree(
+            os.path.join(self.storage_dir, "scorm_packages", self.md5 + ".meta")
+        )
+        blobs = self.list_blobs()
+
+        call_command(
+            "scorm_gc_blobs", dry_run=True, grace_period=0, stdout=io.StringIO()
+        )
+        self.assertEqual(self.list_blobs(), blobs)
+
+        call_command("scorm_gc_blobs", stdout=io.StringIO())
+        self.assertEqual(self.list_blobs(), blobs)
+
+        # Blobs reused by extractions are kept until their index is saved
+        for blob in blobs:
+            cache.delete(make_cache_key("blob_in_use", blob))
+        unreferenced = hashlib.sha256(b"var a;").hexdigest()
+        mark_blob_in_use(unreferenced)
+        call_command("scorm_gc_blobs", grace_period=0, stdout=io.StringIO())
+        self.assertEqual(self.list_blobs(), blobs)
+
+        cache.delete(make_cache_key("blob_in_use", unreferenced))
+        call_command("scorm_gc_blobs", grace_period=0, stdout=io.StringIO())
+        self.assertEqual(
+            self.list_blobs(),
+            sorted(
+                hashlib.sha256(data).hexdigest()
+                for data in [b"var player = {};" * 100, b"var b;"]
+            ),
+        )
+
+
+def make_multi_sco_manifest(count):
+    """
+    Builds a SCORM 1.2 manifest with `count` SCOs
+    """
+    items = "".join(
+        '<item identifier="item_{0}" identifierref="sco_{0}">'
+        "<title>SCO {0}</title></item>".format(index)
+        for index in range(count)
+    )
+    resources = "".join(
+        '<resource identifier="sco_{0}" type="webcontent" adlcp:scormtype="sco" '
+        'href="sco_{0}/index.html"><file href="sco_{0}/index.html"/></resource>'.format(
+            index
+        )
+        for index in range(count)
+    )
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<manifest identifier="multi_sco" version="1.0"
+    xmlns="http://www.imsproject.org/xsd/imscp_rootv1p1p2"
+    xmlns:adlcp="http://www.adlnet.org/xsd/adlcp_rootv1p2">
+  <metadata>
+    <schema>ADL SCORM</schema>
+    <schemaversion>1.2</schemaversion>
+  </metadata>
+  <organizations default="org_2">
+    <organization identifier="org_1"><title>Other</title></organization>
+    <organization identifier="org_2"><title>Course</title>{}</organization>
+  </organizations>
+  <resources xml:base="content/">
+    <resource identifier="shared" type="webcontent" adlcp:scormtype="asset"
+        href="shared.js"/>
+    {}
+  </resources>
+</manifest>""".format(
+        items, resources
+    ).encode(
+        "utf-8"
+    )
+
+
+class ScormManifestTests(LocalStorageMixin, unittest.TestCase):
+    md5 = "5e0fd1b5e6a6f2e4d35b4b4bd7c1a3e2"
+
+    def setUp(self):
+        super().setUp()
+        manifest_models.delete(self.md5)
+        cache.delete(make_cache_key("manifest", self.md5))
+
+    def test_parse_manifest(self):
+        model = parse_manifest(make_multi_sco_manifest(3))
+
+        self.assertEqual(model["schema_version"], "1.2")
+        self.assertEqual(model["default_organization"], "org_2")
+        self.assertEqual(
+            [organization["identifier"] for organization in model["organizations"]],
+            ["org_1", "org_2"],
+        )
+        self.assertEqual(len(model["organizations"][1]["items"]), 3)
+        self.assertEqual(model["scos"], ["sco_0", "sco_1", "sco_2"])
+        self.assertEqual(model["resources"][0]["scorm_type"], "asset")
+        self.assertEqual(model["launch_href"], "content/sco_0/index.html")
+
+    def test_parse_scorm_2004_manifest(self):
+        model = parse_manifest(SCORM_MANIFEST)
+
+        self.assertEqual(model["schema_version"], "2004 4th Edition")
+        self.assertEqual(model["launch_href"], "story.html")
+
+    def test_launch_parameters(self):
+        model = parse_manifest(
+            SCORM_MANIFEST.replace(
+                b'identifierref="resource"',
+                b'identifierref="resource" parameters="?lang=en"',
+            )
+        )
+
+        self.assertEqual(model["launch_href"], "story.html")
+        self.assertEqual(model["launch_parameters"], "?lang=en")
+        for url, parameters, launch_url in [
+            ("/story.html", "?lang=en", "/story.html?lang=en"),
+            ("/story.html", "lang=en", "/story.html?lang=en"),
+            ("/story.html?a=1", "?lang=en", "/story.html?a=1&lang=en"),
+            ("/story.html", "#page2", "/story.html#page2"),
+            ("/story.html#page1", "#page2", "/story.html#page1"),
+            ("/story.html", None, "/story.html"),
+        ]:
+            self.assertEqual(add_launch_parameters(url, parameters), launch_url)
+
+    def test_manifest_model_version(self):
+        # Models saved by a previous version are parsed again
+        self.storage.save(
+            "scorm_packages/{}/imsmanifest.xml".format(self.md5),
+            ContentFile(SCORM_MANIFEST),
+        )
+        self.storage.save(
+            get_manifest_json_path(self.md5),
+            ContentFile(b'{"version": 1, "launch_href": "story.html?lang=en"}'),
+        )
+
+        model = get_manifest_model(self.md5)
+
+        self.assertEqual(model["launch_href"], "story.html")
+        with self.storage.open(get_manifest_json_path(self.md5)) as json_file:
+            self.assertEqual(json.loads(json_file.read())["version"], 2)
+
+    def test_parse_invalid_manifest(self):
+        model = parse_manifest(b"<manifest")
+
+        self.assertIsNone(model["schema_version"])
+        self.assertIsNone(model["launch_href"])
+
+    def test_manifest_is_parsed_once(self):
+        """
+        A large multi SCO manifest is read and parsed once, then served from
+        the process memory, or from its JSON model once the process cache
+        is cleared
+        """
+        self.storage.save(
+            "scorm_packages/{}/imsmanifest.xml".format(self.md5),
+            ContentFile(make_multi_sco_manifest(2000)),
+        )
+
+        with mock.patch(
+            "abstract_scorm_xblock.manifest.parse_manifest", wraps=parse_manifest
+        ) as parse_manifest_mock:
+            for _ in range(100):
+                model = get_manifest_model(self.md5)
+            self.assertEqual(len(model["scos"]), 2000)
+            parse_manifest_mock.assert_called_once()
+
+            manifest_models.delete(self.md5)
+            cache.delete(make_cache_key("manifest", self.md5))
+            self.assertEqual(get_manifest_model(self.md5), model)
+            parse_manifest_mock.assert_called_once()
+
+    def test_missing_manifest(self):
+        with self.assertRaises(ScormManifestNotFoundException):
+            get_manifest_model(self.md5)
+
+
+class ScormPackagesGarbageCollectionTests(LocalStorageMixin, unittest.TestCase):
+    def save_package(self, md5, age=None, manifest=True):
+        files = {"story.html": b"<html></html>"}
+        if manifest:
+            files["imsmanifest.xml"] = SCORM_MANIFEST
+        extract_scorm_package(
+            io.BytesIO(make_scorm_zipfile(files)), "scorm_packages/" + md5
+        )
+        if age and manifest:
+            mtime = time.time() - age
+            os.utime(
+                self.storage.path("scorm_packages/{}/imsmanifest.xml".format(md5)),
+                (mtime, mtime),
+            )
+
+    def make_modulestore(self, *branches_md5s):
+        store = mock.MagicMock()
+        store.get_course_summaries.return_value = [mock.Mock(id="course-v1:a+b+c")]
+        store.get_items.side_effect = [
+            [mock.Mock(_scorm_url="/scorm/{}/story.html".format(md5)) for md5 in md5s]
+            for md5s in branches_md5s
+        ]
+        return mock.patch(
+            "abstract_scorm_xblock.management.commands.scorm_gc_packages.modulestore",
+            return_value=store,
+        )
+
+    def test_gc_packages(self):
+        month = 60 * 60 * 24 * 30
+        draft, published, unused, recent, partial = (
+            hashlib.md5(str(index).encode()).hexdigest() for index in range(5)
+        )
+        self.save_package(draft, age=month)
+        self.save_package(published, age=month)
+        self.save_package(unused, age=month)
+        self.save_package(recent)
+        self.save_package(partial, manifest=False)
+        extracted = sorted(self.storage.listdir("scorm_packages")[0])
+
+        with self.make_modulestore([draft], [published]):
+            stdout = io.StringIO()
+            call_command("scorm_gc_packages", dry_run=True, stdout=stdout)
+        self.assertEqual(sorted(self.storage.listdir("scorm_packages")[0]), extracted)
+        self.assertIn("Would delete 2 unused packages of 5 (5 files", stdout.getvalue())
+
+        with self.make_modulestore([draft], [published]):
+            call_command("scorm_gc_packages", batch_size=2, stdout=io.StringIO())
+        # Empty directories left by filesystem storages are ignored
+        with self.make_modulestore([draft], [published]):
+            stdout = io.StringIO()
+            call_command("scorm_gc_packages", stdout=stdout)
+        self.assertIn("Deleted 0 unused packages", stdout.getvalue())
+        self.assertEqual(
+            self.storage.listdir("scorm_packages/{}.meta".format(unused)), ([], [])
+        )
+        self.assertEqual(
+            [
+                sorted(self.storage.listdir("scorm_packages/" + md5)[1])
+                for md5 in [draft, published, unused, recent, partial]
+            ],
+            [
+                ["imsmanifest.xml", "story.html"],
+                ["imsmanifest.xml", "story.html"],
+                [],
+                ["imsmanifest.xml", "story.html"],
+                [],
+            ],
+        )
+
+    def test_gc_packages_used_by_other_processes(self):
+        """
+        Processes which still know a deleted package as extracted extract it
+        again, and don't fail serving its files meanwhile
+        """
+        scorm_data = make_scorm_zipfile(
+            {"imsmanifest.xml": SCORM_MANIFEST, "story.html": b"<html></html>"}
+        )
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        extract_scorm_package(io.BytesIO(scorm_data), "scorm_packages/" + md5)
+        os.utime(
+            self.storage.path("scorm_packages/{}/imsmanifest.xml".format(md5)),
+            (0, 0),
+        )
+        self.assertIsNotNone(get_package_index(md5))
+        with self.make_modulestore([], []):
+            call_command("scorm_gc_packages", stdout=io.StringIO())
+        # Another process still knows the package as extracted, and keeps
+        # its index
+        extracted_packages.set(md5, True)
+        self.assertIsNotNone(package_indexes.get(md5))
+
+        with self.assertRaises(Http404):
+            scormxblock_serve(RequestFactory().get("/"), md5, "story.html")
+        self.assertIsNone(package_indexes.get(md5))
+
+        contentstore = make_contentstore(scorm_data)
+        with mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            extract_scorm_package_once("asset_key", md5)
+        self.assertTrue(self.storage.exists("scorm_packages/{}/story.html".format(md5)))
+
+    def test_lru_cache_timeout(self):
+        lru_cache = LRUCache(2, timeout=60)
+        with mock.patch("abstract_scorm_xblock.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 1000
+            lru_cache.set("md5", True)
+            monotonic.return_value = 1059
+            self.assertIn("md5", lru_cache)
+            monotonic.return_value = 1060
+            self.assertNotIn("md5", lru_cache)
+            self.assertIsNone(lru_cache.get("md5"))
+
+
+def make_student_modules(count, interactions=2):
+    """
+    Fake `export.fetch_student_modules` over `count` synthetic learners,
+    generated on demand
+    """
+    state = json.dumps(
+        {
+            "lesson_score": 0.8,
+            "_lesson_status": "passed",
+            "_scorm_data": {
+                "cmi.core.session_time": "0000:10:00",
+                "cmi.interactions": [
+                    {"id": "q{}".format(i), "result": "correct", "time": "10:00:00"}
+                    for i in range(interactions)
+                ],
+            },
+        }
+    )
+
+    def fetch_student_modules(course_key, categories, after_id, batch_size):
+        return [
+            (id_, "block-v1:org+course+run+type@scorm+block@1", id_, "learner", state)
+            for id_ in range(after_id + 1, min(after_id + batch_size, count) + 1)
+        ]
+
+    return mock.Mock(wraps=fetch_student_modules)
+
+
+class ScormExportTests(unittest.TestCase):
+    def test_export_csv(self):
+        with mock.patch(
+            "abstract_scorm_xblock.export.fetch_student_modules",
+            make_student_modules(2, interactions=2),
+        ):
+            lines = list(iter_export("course", ["abstract_scorm_xblock"]))
+
+        rows = list(csv.reader(lines))
+        self.assertEqual(rows[0][:3], ["block_id", "user_id", "username"])
+        self.assertEqual(len(rows), 1 + 2 * 2)
+        self.assertEqual(
+            rows[2],
+            [
+                "block-v1:org+course+run+type@scorm+block@1",
+                "1",
+                "learner",
+                "passed",
+                "unknown",
+                "0.8",
+                "0000:10:00",
+                "1",
+                "q1",
+                "",
+                "correct",
+                "",
+                "",
+                "10:00:00",
+                "",
+                "",
+            ],
+        )
+
+    def test_export_jsonl(self):
+        with mock.patch(
+            "abstract_scorm_xblock.export.fetch_student_modules",
+            make_student_modules(5),
+        ) as fetch_student_modules:
+            lines = list(
+                iter_export("course", ["abstract_scorm_xblock"], "jsonl", batch_size=2)
+            )
+
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record["user_id"] for record in records], [1, 2, 3, 4, 5])
+        self.assertEqual(records[0]["interactions"][1]["interaction_id"], "q1")
+        # Keyset pagination: each batch starts after the last id of the previous one
+        self.assertEqual(
+            [call[0][2] for call in fetch_student_modules.call_args_list], [0, 2, 4]
+        )
+
+    def test_export_command(self):
+        out = io.StringIO()
+        with mock.patch(
+            "abstract_scorm_xblock.export.fetch_student_modules",
+            make_student_modules(3, interactions=0),
+        ):
+            call_command("scorm_export", "course-v1:org+course+run", stdout=out)
+
+        # Learners without interactions get a single row
+        rows = list(csv.reader(out.getvalue().splitlines()))
+        self.assertEqual(len(rows), 1 + 3)
+        self.assertEqual(rows[3][7:], [""] * 9)
+
+    def test_export_handler(self):
+        xblock = AbstractScormXBlock(
+            mock.MagicMock(user_is_staff=False), DictFieldData({}), mock.MagicMock()
+        )
+        self.assertEqual(xblock.export_scorm_data(mock.Mock()).status_code, 403)
+
+        xblock.runtime.user_is_staff = True
+        with mock.patch(
+            "abstract_scorm_xblock.export.fetch_student_modules",
+            make_student_modules(2),
+        ), mock.patch(
+            "abstract_scorm_xblock.scormxblock.count_student_modules", return_value=2
+        ):
+            response = xblock.export_scorm_data(mock.Mock(params={"format": "jsonl"}))
+            self.assertEqual(response.content_type, "application/x-ndjson")
+            self.assertEqual(len(response.body.splitlines()), 2)
+
+            # Bigger exports are left to the management command
+            with override_settings(SCORM_EXPORT_HANDLER_MAX_ROWS=1):
+                response = xblock.export_scorm_data(mock.Mock(params={}))
+            self.assertEqual(response.status_code, 413)
+            self.assertIn(b"scorm_export", response.body)
+
+    def test_export_memory(self):
+        # 100k learners are streamed with bounded memory
+        learners = 100000
+        with mock.patch(
+            "abstract_scorm_xblock.export.fetch_student_modules",
+            make_student_modules(learners, interactions=1),
+        ):
+            tracemalloc.start()
+            try:
+                size = 0
+                for line in iter_export("course", ["abstract_scorm_xblock"]):
+                    size += len(line)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertGreater(size, learners * 100)
+        self.assertLess(peak, 10 * 1024 * 1024)
+
+
+class InMemoryRescoreRuntime(object):
+    """
+    Stand-in for `rescore.LMSRescoreRuntime`, with the user states of a
+    single block kept in memory
+    """
+
+    def __init__(self, block, states, fail_for=None):
+        self.block = block
+        self.states = states
+        self.fail_for = fail_for
+        self.fetches = []
+        self.published = {}
+        self.lock = threading.Lock()
+
+    def get_block(self, usage_key):
+        return self.block
+
+    def fetch_states(self, usage_key, after_id, batch_size):
+        self.fetches.append(after_id)
+        ids = sorted(id_ for id_ in self.states if id_ > after_id)[:batch_size]
+        return [(id_, mock.Mock(id=id_), self.states[id_]) for id_ in ids]
+
+    def publish_grade(self, block, user, grade):
+        if user.id == self.fail_for:
+            raise IOError("Grades pipeline unavailable")
+        with self.lock:
+            self.published[user.id] = grade
+
+    def save_published_grade(self, state_id, grade):
+        with self.lock:
+            self.states[state_id] = dict(self.states[state_id], _published_grade=grade)
+
+
+class ScormRescoreTests(unittest.TestCase):
+    usage_key = "block-v1:org+course+run+type@abstract_scorm_xblock+block@1"
+
+    def setUp(self):
+        reset_rescore_progress(self.usage_key)
+        self.block = AbstractScormXBlock(
+            mock.MagicMock(), DictFieldData({"weight": 2.0}), mock.MagicMock()
+        )
+
+    def make_states(self, count):
+        # Grades were published with the former weight of 1
+        return {
+            id_: {
+                "lesson_score": 0.5,
+                "_lesson_status": "completed",
+                "_published_grade": {"value": 0.5, "max_value": 1},
+            }
+            for id_ in range(1, count + 1)
+        }
+
+    def test_rescore(self):
+        states = self.make_states(10)
+        # Already rescored, and never graded
+        states[3]["_published_grade"] = {"value": 0.5, "max_value": 2.0}
+        states[4] = {"lesson_score": 0.0, "_lesson_status": "incomplete"}
+        states[5]["_lesson_status"] = "failed"
+        runtime = InMemoryRescoreRuntime(self.block, states)
+
+        with mock.patch("abstract_scorm_xblock.rescore.connections") as connections:
+            progress = rescore_block(self.usage_key, runtime, workers=3, batch_size=4)
+
+        self.assertEqual(sorted(runtime.published), [1, 2, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(
+            states[1]["_published_grade"], {"value": 0.5, "max_value": 2.0}
+        )
+        # The database connections of the threads are closed after each chunk
+        self.assertEqual(connections.close_all.call_count, 6)
+        self.assertEqual(runtime.published[1], {"value": 0.5, "max_value": 2.0})
+        self.assertEqual(runtime.published[5], {"value": 0, "max_value": 2.0})
+        self.assertEqual(runtime.fetches, [0, 4, 8])
+        self.assertEqual(
+            progress, {"after_id": 10, "published": 8, "skipped": 2, "done": True}
+        )
+
+        # The progress of done rescores is deleted, so that the block can be
+        # rescored again, publishing only the grades which changed since
+        self.assertEqual(get_rescore_progress(self.usage_key)["after_id"], 0)
+        runtime.published = {}
+        runtime.fetches = []
+        states[2]["lesson_score"] = 0.75
+        progress = rescore_block(self.usage_key, runtime, batch_size=4)
+        self.assertEqual(runtime.fetches, [0, 4, 8])
+        self.assertEqual(runtime.published, {2: {"value": 0.75, "max_value": 2.0}})
+        self.assertEqual(progress["published"], 1)
+
+    def test_rescore_resume(self):
+        runtime = InMemoryRescoreRuntime(self.block, self.make_states(10), fail_for=6)
+        with self.assertRaises(IOError):
+            rescore_block(self.usage_key, runtime, workers=2, batch_size=4)
+        self.assertEqual(get_rescore_progress(self.usage_key)["after_id"], 4)
+
+        runtime.fail_for = None
+        runtime.fetches = []
+        progress = rescore_block(self.usage_key, runtime, workers=2, batch_size=4)
+
+        self.assertEqual(runtime.fetches, [4, 8])
+        self.assertEqual(sorted(runtime.published), list(range(1, 11)))
+        # The grades published by the interrupted batch aren't published again
+        self.assertEqual(progress["published"], 7)
+
+    def test_rescore_force(self):
+        states = self.make_states(3)
+        for state in states.values():
+            state["_published_grade"] = {"value": 0.5, "max_value": 2.0}
+        runtime = InMemoryRescoreRuntime(self.block, states)
+
+        rescore_block(self.usage_key, runtime)
+        self.assertEqual(runtime.published, {})
+
+        rescore_block(self.usage_key, runtime, force=True)
+        self.assertEqual(sorted(runtime.published), [1, 2, 3])
+
+    def test_rate_limiter(self):
+        clock = mock.Mock(return_value=100.0)
+        sleep = mock.Mock()
+        limiter = RateLimiter(4, clock=clock, sleep=sleep)
+
+        for _ in range(3):
+            limiter.wait()
+
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [0.25, 0.5])
+
+    def test_rescore_command(self):
+        runtime = InMemoryRescoreRuntime(self.block, self.make_states(3))
+        out = io.StringIO()
+        with mock.patch(
+            "abstract_scorm_xblock.management.commands.scorm_rescore.LMSRescoreRuntime",
+            return_value=runtime,
+        ):
+            call_command("scorm_rescore", self.usage_key, "--rate", "0", stdout=out)
+
+        self.assertIn("published 3 grades, skipped 0 learners", out.getvalue())
+
+
+class ScormMetricsTests(LocalStorageMixin, unittest.TestCase):
+    md5 = "09c1735eaa57d78fe245868f0e07cf7b"
+
+    def setUp(self):
+        super().setUp()
+        self.exporter = RecordingExporter()
+        set_exporter(self.exporter)
+        self.addCleanup(set_exporter, None)
+
+    def test_handlers(self):
+        xblock = AbstractScormXBlock(
+            mock.MagicMock(), DictFieldData({}), mock.MagicMock()
+        )
+        values = {"cmi.core.lesson_location": "slide_1", "cmi.location": "slide_1"}
+        request = mock.Mock(
+            method="POST", body=json.dumps({"values": values}).encode("utf-8")
+        )
+        xblock.scorm_commit(request)
+        xblock.scorm_commit(request)
+
+        self.assertEqual(
+            len(
+                self.exporter.get_observations(
+                    "handler_seconds", handler="scorm_commit"
+                )
+            ),
+            2,
+        )
+        self.assertEqual(self.exporter.get_count("cmi_errors"), 2)
+        # Internal counters are exported too
+        self.assertEqual(
+            self.exporter.get_count("runtime_events", event="cmi_writes_skipped"), 1
+        )
+
+    def test_extraction(self):
+        files = {
+            "imsmanifest.xml": SCORM_MANIFEST,
+            "story_content/data.js": b"window.data = {};",
+        }
+        scorm_data = make_scorm_zipfile(files)
+        md5 = hashlib.md5(scorm_data).hexdigest()
+        unmark_package_extracted(md5)
+        contentstore = make_contentstore(scorm_data)
+        with mock.patch("abstract_scorm_xblock.extraction.contentstore", contentstore):
+            extract_scorm_package_once("asset_key", md5)
+
+        self.assertEqual(self.exporter.get_observations("package_files"), [2])
+        self.assertEqual(
+            self.exporter.get_observations("package_bytes"),
+            [sum(len(data) for data in files.values())],
+        )
+        self.assertEqual(
+            len(
+                self.exporter.get_observations(
+                    "package_extraction_seconds", mode="extract"
+                )
+            ),
+            1,
+        )
+
+    def test_serve(self):
+        self.storage.save(
+            "scorm_packages/{}/data.js".format(self.md5),
+            ContentFile(b"window.data = {};"),
+        )
+        package_indexes.delete(self.md5)
+        cache.delete(make_cache_key("index", self.md5))
+
+        scormxblock_serve(RequestFactory().get("/"), self.md5, "data.js")
+
+        self.assertEqual(self.exporter.get_count("served_bytes"), 17)
+        self.assertEqual(len(self.exporter.get_observations("serve_seconds")), 1)
+        self.assertEqual(len(self.exporter.get_observations("storage_open_seconds")), 1)
+
+    def test_noop(self):
+        set_exporter(NoopExporter())
+        with mock.patch("abstract_scorm_xblock.metrics.time") as time_:
+            with span("serve"):
+                pass
+        time_.perf_counter.assert_not_called()
+
+    @override_settings(SCORM_METRICS_STATSD_PORT=9125)
+    def test_statsd(self):
+        exporter = StatsdExporter()
+        with mock.patch.object(exporter, "socket") as socket_:
+            exporter.increment("served_bytes", 17)
+            exporter.observe("handler_seconds", 0.5, {"handler": "scorm_commit"})
+
+        self.assertEqual(
+            socket_.sendto.call_args_list,
+            [
+                mock.call(b"scorm_served_bytes:17|c", ("localhost", 9125)),
+                mock.call(
+                    b"scorm_handler_seconds:0.5|h|#handler:scorm_commit",
+                    ("localhost", 9125),
+                ),
+            ],
+        )
+
+    @unittest.skipIf(prometheus_client is None, "prometheus_client isn't installed")
+    def test_prometheus(self):
+        registry = prometheus_client.CollectorRegistry()
+        exporter = PrometheusExporter(registry)
+        exporter.increment("served_bytes", 17)
+        exporter.observe("handler_seconds", 0.5, {"handler": "scorm_commit"})
+
+        self.assertEqual(registry.get_sample_value("scorm_served_bytes_total"), 17)
+        self.assertEqual(
+            registry.get_sample_value(
+                "scorm_handler_seconds_count", {"handler": "scorm_commit"}
+            ),
+            1,
+        )
+
+
+class LocalFileCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_open(self):
+        local_cache = LocalFileCache(self.directory, 1024)
+        fetch = mock.Mock(side_effect=lambda fileobj: fileobj.write(b"data"))
+
+        for _ in range(2):
+            with local_cache.open("key", fetch) as cached_file:
+                self.assertEqual(cached_file.read(), b"data")
+        fetch.assert_called_once()
+
+    def test_eviction_scans(self):
+        local_cache = LocalFileCache(self.directory, 1000)
+        with mock.patch(
+            "abstract_scorm_xblock.cache.os.scandir", wraps=os.scandir
+        ) as scandir:
+            for index in range(11):
+                key = str(index)
+                local_cache.open(key, lambda fileobj: fileobj.write(b"x" * 100)).close()
+                os.utime(local_cache.get_path(key), (index, index))
+
+        # The directory is scanned on the first miss, to know the cache size,
+        # then only once the estimated size exceeds the maximum size
+        self.assertEqual(scandir.call_count, 2)
+        self.assertEqual(local_cache.stats.get("evictions"), 2)
+        self.assertEqual(local_cache.size, 900)
+        self.assertEqual(len(os.listdir(self.directory)), 9)
+
+    def test_concurrent_misses(self):
+        local_cache = LocalFileCache(self.directory, 1024)
+        barrier = threading.Barrier(10)
+
+        def fetch(fileobj):
+            time.sleep(0.1)
+            fileobj.write(b"data")
+
+        fetch = mock.Mock(side_effect=fetch)
+        results = []
+
+        def open_key():
+            barrier.wait()
+            with local_cache.open("key", fetch) as cached_file:
+                results.append(cached_file.read())
+
+        threads = [threading.Thread(target=open_key) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [b"data"] * 10)
+        fetch.assert_called_once()
+        self.assertEqual(local_cache.stats.as_dict(), {"hits": 9, "misses": 1})
+        self.assertEqual(
+            os.listdir(self.directory), [os.path.basename(local_cache.get_path("key"))]
+        )
+
+    def test_deleted_lock_file(self):
+        # A miss waiting on a lock file deleted by its holder locks the new
+        # lock file, instead of fetching while another miss holds it
+        local_cache = LocalFileCache(self.directory, 1024)
+        path = local_cache.get_path("key")
+        lock_path = os.path.join(self.directory, ".lock" + os.path.basename(path))
+        flock = fcntl.flock
+        locking = threading.Semaphore(0)
+
+        def wait_flock(lock_file, operation):
+            if threading.current_thread() is not threading.main_thread():
+                locking.release()
+            flock(lock_file, operation)
+
+        fetch = mock.Mock()
+        holder = open(lock_path, "a")
+        flock(holder, fcntl.LOCK_EX)
+        with mock.patch("abstract_scorm_xblock.cache.fcntl.flock", wait_flock):
+            thread = threading.Thread(
+                target=lambda: local_cache.open("key", fetch).close()
+            )
+            thread.start()
+            self.assertTrue(locking.acquire(timeout=5))
+            os.unlink(lock_path)
+            new_holder = open(lock_path, "a")
+            flock(new_holder, fcntl.LOCK_EX)
+            holder.close()
+            self.assertTrue(locking.acquire(timeout=5))
+            with open(path, "wb") as cached_file:
+                cached_file.write(b"data")
+            new_holder.close()
+            thread.join()
+
+        fetch.assert_not_called()
+        self.assertEqual(local_cache.stats.as_dict(), {"hits": 1})
+
+    def test_failed_fetch(self):
+        local_cache = LocalFileCache(self.directory, 1024)
+
+        with self.assertRaises(IOError):
+            local_cache.open("key", mock.Mock(side_effect=IOError))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_eviction(self):
+        local_cache = LocalFileCache(self.directory, 250)
+        for index, key in enumerate(["a", "b", "c"]):
+            local_cache.open(key, lambda fileobj: fileobj.write(b"x" * 100)).close()
+            os.utime(local_cache.get_path(key), (index, index))
+
+        self.assertEqual(local_cache.stats.get("evictions"), 1)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted(os.path.basename(local_cache.get_path(key)) for key in "bc"),
+        )
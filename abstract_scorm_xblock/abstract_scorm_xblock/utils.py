@@ -1,7 +1,23 @@
 # -*- coding: utf-8 -*-
+import functools
+import hashlib
+import threading
+from collections import Counter
+
 import pkg_resources
 
+from django.conf import settings
 from django.template import Context, Template
+from django.urls import reverse
+
+from . import metrics
+
+# Files of our kit which can be served by `views.scormxblock_static`
+STATIC_RESOURCES = {
+    "static/css/scormxblock.css",
+    "static/js/src/scormxblock.js",
+    "static/js/src/studio.js",
+}
 
 
 def gettext(text):
@@ -15,7 +31,76 @@ def resource_string(path):
     return pkg_resources.resource_string(__name__, path).decode("utf8")
 
 
+@functools.lru_cache(maxsize=None)
+def get_template(template_path):
+    """
+    Compiled template of our kit. Templates never change while the process
+    runs, so they are compiled once.
+    """
+    return Template(resource_string(template_path))
+
+
 def render_template(template_path, context):
-    template_str = resource_string(template_path)
-    template = Template(template_str)
-    return template.render(Context(context))
+    return get_template(template_path).render(Context(context))
+
+
+@functools.lru_cache(maxsize=None)
+def get_static_resource(path):
+    """
+    Returns the content of a static file of our kit, and its digest
+    """
+    content = resource_string(path)
+    return content, hashlib.md5(content.encode("utf-8")).hexdigest()[:12]
+
+
+def add_static_resource(fragment, path):
+    """
+    Adds a CSS or JS file of our kit to `fragment`. Files are inlined,
+    unless `SCORM_STATIC_URLS` is set: in that case they are referenced by
+    a content hashed URL, so that browsers download them once for all blocks.
+    """
+    content, digest = get_static_resource(path)
+    is_css = path.endswith(".css")
+    if not settings.SCORM_STATIC_URLS:
+        if is_css:
+            fragment.add_css(content)
+        else:
+            fragment.add_javascript(content)
+        return
+    url = reverse(
+        "abstract_scorm_xblock:scorm_static", kwargs={"digest": digest, "path": path}
+    )
+    if is_css:
+        fragment.add_css_url(url)
+    else:
+        fragment.add_javascript_url(url)
+
+
+class Counters(object):
+    """
+    Thread safe named counters, used to expose internal statistics.
+    Increments are exported as the `metric` counter too, tagged with the
+    counter name, if given.
+    """
+
+    def __init__(self, metric=None):
+        self._counter = Counter()
+        self._lock = threading.Lock()
+        self._metric = metric
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counter[name] += value
+        if self._metric:
+            metrics.increment(self._metric, value, {"event": name})
+
+    def get(self, name):
+        return self._counter[name]
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counter)
+
+    def reset(self):
+        with self._lock:
+            self._counter.clear()
@@ -1,40 +1,322 @@
 # -*- coding: utf-8 -*-
-import mimetypes
+import hashlib
 import os
 import posixpath
+import re
 
 from django.conf import settings
-from django.http import FileResponse, Http404
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
 
-from django.utils.http import http_date
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django.utils.six.moves.urllib.parse import unquote
 from django.core.files.storage import default_storage
 from django.conf.urls import url
 
+from .cache import asset_cache
+from .delivery import get_delivery_backend
+from .metrics import increment, span
+from .utils import STATIC_RESOURCES, get_static_resource
+from .index import (
+    PRECOMPRESSED_ENCODINGS,
+    get_blob_path,
+    get_package_index,
+    get_variant_path,
+    guess_content_type,
+    package_indexes,
+)
+from .zipstore import open_zip_member
 
+
+def get_etag(md5, path, encoding=None):
+    """
+    Strong ETag of a file of an extracted SCORM package. Since packages are
+    addressed by md5 their files never change, and the ETag can be computed
+    without looking at the file. Precompressed variants are different
+    representations, and get their own ETag.
+    """
+    key = "{}/{}".format(md5, path)
+    if encoding:
+        key += ";" + encoding
+    return quote_etag(hashlib.md5(key.encode("utf-8")).hexdigest())
+
+
+def set_cache_headers(response, etag):
+    response["ETag"] = etag
+    patch_cache_control(
+        response, public=True, max_age=settings.SCORM_ASSETS_MAX_AGE, immutable=True
+    )
+    return response
+
+
+def set_headers(response, etag, encodings, encoding):
+    if encoding:
+        response["Content-Encoding"] = encoding
+    # Caches must not serve a precompressed variant to the wrong clients
+    if encodings:
+        patch_vary_headers(response, ["Accept-Encoding"])
+    return set_cache_headers(response, etag)
+
+
+def parse_accept_encoding(request):
+    """
+    Returns the quality value of each coding of the Accept-Encoding header
+    """
+    qvalues = {}
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = coding.partition(";")
+        qvalue = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        if coding.strip():
+            qvalues[coding.strip().lower()] = qvalue
+    return qvalues
+
+
+def negotiate_encoding(request, encodings):
+    """
+    Chooses the precompressed variant to serve among `encodings`, preferring
+    brotli on ties. Returns None if the file should be served as is.
+    """
+    qvalues = parse_accept_encoding(request)
+    best, best_qvalue = None, 0.0
+    for encoding in PRECOMPRESSED_ENCODINGS:
+        qvalue = qvalues.get(encoding, qvalues.get("*", 0.0))
+        if encoding in encodings and qvalue > best_qvalue:
+            best, best_qvalue = encoding, qvalue
+    return best
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in etags
+
+
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+
+
+def parse_range(request, size, etag, last_modified):
+    """
+    Parses the Range header of the request, returning the (start, end)
+    inclusive bounds of the requested byte range.
+    Returns None if the whole file should be served: when there is no Range
+    header, when it's malformed or asks for multiple ranges, which we don't
+    support, or when the If-Range precondition fails.
+    Raises ValueError if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(request.META.get("HTTP_RANGE", "").strip())
+    if not match or not (match.group("start") or match.group("end")):
+        return None
+
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range:
+        if_range_date = parse_http_date_safe(if_range)
+        if if_range != etag and if_range_date != last_modified:
+            return None
+
+    if match.group("start"):
+        start = int(match.group("start"))
+        end = int(match.group("end")) if match.group("end") else size - 1
+        if match.group("end") and start > end:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(match.group("end")), 0)
+        end = size - 1
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(file, start, length, chunk_size=FileResponse.block_size):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+@span("storage_open")
+def open_storage_file(fullpath, size):
+    """
+    Opens a file of the default storage, through the local disk cache if
+    it's enabled and the file isn't too big. Since packages are addressed
+    by md5, cached files never need to be invalidated.
+    """
+    if asset_cache is None or size > settings.SCORM_ASSET_CACHE_MAX_FILE_SIZE:
+        return default_storage.open(fullpath)
+    return asset_cache.open_storage_file(fullpath)
+
+
+@span("serve")
 def scormxblock_serve(request, md5, path):
     """
     Proxy files from the Django default storage in order to avoid SAMEORIGIN issues.
+    The actual delivery can be offloaded to the web server, see `delivery`,
+    except for packages stored in zip-direct mode, see `zipstore`.
+    Files of SCORM packages are immutable, so they can be cached forever by
+    browsers and CDNs.
     """
     path = posixpath.normpath(unquote(path)).lstrip("/")
+    # Leading ".." segments are kept by normpath: don't let them out of the
+    # package, even for packages without an index
+    if path == ".." or path.startswith("../"):
+        raise Http404()
     fullpath = os.path.join(settings.STORAGE_SCORM_PATH, md5, path)
+    content_type = guess_content_type(path)
+    encoding = None
 
-    if not default_storage.exists(fullpath):
+    # Packages extracted before indexes were introduced have no index, and
+    # need a few more storage calls
+    index = get_package_index(md5)
+    zip_mode = index is not None and "package" in index
+    delivery_backend = None if zip_mode else get_delivery_backend()
+    entry = None
+    encodings = {}
+    if index is not None:
+        entry = index["files"].get(path)
+        if entry is None:
+            raise Http404()
+        content_type = entry["content_type"]
+        if entry.get("blob"):
+            fullpath = get_blob_path(entry["sha256"])
+        # Web servers drop the Content-Encoding and Vary headers of the
+        # responses delivering a file: precompressed variants are only
+        # served by Django, see `delivery` to compress files in the web server
+        if delivery_backend is None:
+            encodings = entry.get("encodings", {})
+        encoding = negotiate_encoding(request, encodings)
+        if encoding:
+            fullpath = get_variant_path(
+                os.path.join(settings.STORAGE_SCORM_PATH, md5), encoding, path
+            )
+    etag = get_etag(md5, path, encoding)
+
+    # The ETag doesn't depend on the file, so we can answer without even
+    # looking at the storage
+    if etag_matches(request, etag):
+        return set_headers(HttpResponseNotModified(), etag, encodings, encoding)
+
+    # The web server takes care of missing files, ranges and conditional requests
+    if delivery_backend:
+        response = delivery_backend(fullpath, content_type)
+        return set_headers(response, etag, encodings, encoding)
+
+    if entry is not None:
+        last_modified = entry["mtime"]
+    elif default_storage.exists(fullpath):
+        last_modified = int(default_storage.get_modified_time(fullpath).timestamp())
+    else:
         raise Http404()
 
-    content_type, encoding = mimetypes.guess_type(fullpath)
-    content_type = content_type or "application/octet-stream"
-    response_file = default_storage.open(fullpath)
-    response = FileResponse(response_file, content_type=content_type)
-    response["Last-Modified"] = http_date(
-        default_storage.get_modified_time(fullpath).toordinal()
+    if_modified_since = parse_http_date_safe(
+        request.META.get("HTTP_IF_MODIFIED_SINCE", "")
     )
-    response["Content-Length"] = response_file.size
-    if encoding:
-        response["Content-Encoding"] = encoding
+    if (
+        "HTTP_IF_NONE_MATCH" not in request.META
+        and if_modified_since
+        and if_modified_since >= last_modified
+    ):
+        return set_headers(HttpResponseNotModified(), etag, encodings, encoding)
+
+    response_file = None
+    if entry is None:
+        with span("storage_open"):
+            response_file = default_storage.open(fullpath)
+        size = response_file.size
+    elif encoding:
+        size = entry["encodings"][encoding]
+    else:
+        size = entry["size"]
+
+    try:
+        byte_range = parse_range(request, size, etag, last_modified)
+    except ValueError:
+        if response_file:
+            response_file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(size)
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    status = 206 if byte_range else 200
+    if zip_mode:
+        with span("storage_open"):
+            member_file = open_zip_member(md5, path, entry, start, end - start + 1)
+        response = FileResponse(member_file, status=status, content_type=content_type)
+    else:
+        if response_file is None:
+            try:
+                response_file = open_storage_file(fullpath, size)
+            except OSError:
+                # The package was deleted by `scorm_gc_packages` after its
+                # index was cached by this process
+                package_indexes.delete(md5)
+                raise Http404()
+        if byte_range:
+            response = StreamingHttpResponse(
+                iter_file_range(response_file, start, end - start + 1),
+                status=status,
+                content_type=content_type,
+            )
+        else:
+            response = FileResponse(response_file, content_type=content_type)
+    if byte_range:
+        response["Content-Range"] = "bytes {}-{}/{}".format(start, end, size)
+    response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    increment("served_bytes", end - start + 1)
+    response["Last-Modified"] = http_date(last_modified)
+    return set_headers(response, etag, encodings, encoding)
+
+
+def scormxblock_static(request, digest, path):
+    """
+    Serves a CSS or JS file of our kit, referenced by `add_static_resource`
+    with the digest of its content. While a rolling deploy is in progress the
+    digest may not match the content of this node: the current content is
+    served anyway, but it mustn't be cached.
+    """
+    if path not in STATIC_RESOURCES:
+        raise Http404
+    content, current_digest = get_static_resource(path)
+    response = HttpResponse(content, content_type=guess_content_type(path))
+    if digest == current_digest:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.SCORM_ASSETS_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, no_cache=True)
     return response
 
 
 urlpatterns = [
-    url(r"(?P<md5>[a-f0-9]{32})/(?P<path>.*)$", scormxblock_serve, name="scorm_serve")
+    url(
+        r"static/(?P<digest>[a-f0-9]{12})/(?P<path>.*)$",
+        scormxblock_static,
+        name="scorm_static",
+    ),
+    url(r"(?P<md5>[a-f0-9]{32})/(?P<path>.*)$", scormxblock_serve, name="scorm_serve"),
 ]
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Zip-direct storage mode.
+
+Instead of extracting every file of a SCORM package to the default storage,
+the package zip is stored once, next to the package directory, and its files
+are read straight from a copy of the zip cached on the local disk of each
+node. The offset of each member in the zip is recorded in the package index,
+so no central directory parsing is needed to serve stored and deflated
+members.
+"""
+import os
+import struct
+import tempfile
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from django.conf import settings
+
+from .cache import LocalFileCache
+from .index import get_meta_path
+
+
+ZIP_STORAGE_MODE = "zip"
+PACKAGE_FILENAME = "package.zip"
+
+# Signature, versions, flags, compression, time, date, crc, sizes,
+# filename length and extra field length
+LOCAL_FILE_HEADER = struct.Struct("<4s5H3L2H")
+
+zip_cache = LocalFileCache(
+    settings.SCORM_ZIP_CACHE_DIR
+    or os.path.join(tempfile.gettempdir(), "abstract_scorm_xblock", "zip"),
+    settings.SCORM_ZIP_CACHE_MAX_SIZE,
+    "zip_cache",
+)
+
+
+def get_package_zip_path(scorm_path):
+    return os.path.join(get_meta_path(scorm_path), PACKAGE_FILENAME)
+
+
+def get_member_data_offset(scorm_file, zipinfo):
+    """
+    Returns the offset of the data of a zip member, which follows its local
+    header. The local header extra field can differ from the one in the
+    central directory, so the local header has to be read.
+    """
+    scorm_file.seek(zipinfo.header_offset)
+    header = LOCAL_FILE_HEADER.unpack(scorm_file.read(LOCAL_FILE_HEADER.size))
+    filename_length, extra_length = header[-2:]
+    return (
+        zipinfo.header_offset + LOCAL_FILE_HEADER.size + filename_length + extra_length
+    )
+
+
+def make_zip_entry(scorm_file, zipinfo):
+    return {
+        "offset": get_member_data_offset(scorm_file, zipinfo),
+        "compress_type": zipinfo.compress_type,
+        "compress_size": zipinfo.compress_size,
+    }
+
+
+def open_package_zip(md5):
+    """
+    Opens the local copy of the zip of the package identified by `md5`,
+    downloading it from the default storage if needed
+    """
+    return zip_cache.open_storage_file(
+        get_package_zip_path(os.path.join(settings.STORAGE_SCORM_PATH, md5))
+    )
+
+
+class StoredMemberFile(object):
+    """
+    Reads `length` bytes from `offset` of a zip file, i.e. a range of a
+    member stored without compression.
+    `fileno` is exposed, so that WSGI servers implementing
+    `wsgi.file_wrapper` with sendfile (e.g. gunicorn) send the range from
+    the current position of the file, up to the Content-Length of the
+    response, without copying it to userspace.
+    """
+
+    def __init__(self, fileobj, offset, length):
+        self.fileobj = fileobj
+        self.fileobj.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def close(self):
+        self.fileobj.close()
+
+
+class DeflatedMemberFile(object):
+    """
+    Reads `length` bytes from `start` of a deflated zip member, whose
+    `compress_size` bytes of compressed data are at `offset`
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fileobj, offset, compress_size, start, length):
+        self.fileobj = fileobj
+        self.fileobj.seek(offset)
+        self.compressed_remaining = compress_size
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.buffer = b""
+        self.remaining = length
+        while start > 0:
+            data = self.decompress_chunk()
+            if not data:
+                break
+            if len(data) > start:
+                self.buffer = data[start:]
+            start -= len(data)
+
+    def decompress_chunk(self):
+        """
+        Returns the next chunk of decompressed data, or b"" at the end of
+        the member
+        """
+        while True:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                if self.decompressor.eof or not self.compressed_remaining:
+                    return b""
+                data = self.fileobj.read(
+                    min(self.CHUNK_SIZE, self.compressed_remaining)
+                )
+                if not data:
+                    return b""
+                self.compressed_remaining -= len(data)
+            chunk = self.decompressor.decompress(data, self.CHUNK_SIZE)
+            if chunk:
+                return chunk
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        while len(self.buffer) < size:
+            data = self.decompress_chunk()
+            if not data:
+                break
+            self.buffer += data
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+class CompressedMemberFile(object):
+    """
+    Reads `length` bytes from `start` of a zip member compressed with
+    another method than deflate, which requires parsing the zip
+    """
+
+    def __init__(self, fileobj, path, start, length):
+        self.fileobj = fileobj
+        self.zipfile_obj = ZipFile(fileobj)
+        self.member = self.zipfile_obj.open(path)
+        self.member.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.member.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.member.close()
+        self.zipfile_obj.close()
+        self.fileobj.close()
+
+
+def open_zip_member(md5, path, entry, start, length):
+    """
+    Opens the `length` bytes from `start` of the `path` member of the
+    package identified by `md5`, described by the index `entry`
+    """
+    package_file = open_package_zip(md5)
+    try:
+        zip_entry = entry["zip"]
+        if zip_entry["compress_type"] == ZIP_STORED:
+            return StoredMemberFile(package_file, zip_entry["offset"] + start, length)
+        if zip_entry["compress_type"] == ZIP_DEFLATED:
+            return DeflatedMemberFile(
+                package_file,
+                zip_entry["offset"],
+                zip_entry["compress_size"],
+                start,
+                length,
+            )
+        return CompressedMemberFile(package_file, path, start, length)
+    except Exception:
+        package_file.close()
+        raise
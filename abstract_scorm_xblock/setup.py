@@ -13,8 +13,17 @@ setup(
     description="Load SCORM packages into Open edX courses",
     long_description=readme,
     long_description_content_type="text/markdown",
-    packages=["abstract_scorm_xblock"],
+    packages=[
+        "abstract_scorm_xblock",
+        "abstract_scorm_xblock.management",
+        "abstract_scorm_xblock.management.commands",
+    ],
     install_requires=["XBlock"],
+    extras_require={
+        "brotli": ["brotli"],
+        "prometheus": ["prometheus_client"],
+        "tracing": ["opentelemetry-api"],
+    },
     tests_require=["coverage"],
     include_package_data=True,
     keywords=["scorm", "xblock"],